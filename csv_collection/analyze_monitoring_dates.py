@@ -1,35 +1,36 @@
 #!/usr/bin/env python3
 """
 Analyze all CSV files to extract monitoring dates and create a summary report.
+
+Timestamps are parsed with the shared vibeCoding101/PartX_simulation/timestamps.py:
+each column's format is detected once and reused, and repeated values are cached.
+Per-file results are kept in the shared file catalogue
+(vibeCoding101/PartX_simulation/file_catalogue.py), so re-runs only read CSVs
+that are new or changed (in parallel, `--workers`); identical copies are read once.
 """
 
+import argparse
 import csv
+import sys
 from datetime import datetime
 from pathlib import Path
 from collections import defaultdict
 import re
 
-def parse_timestamp(ts_str):
-    """Parse various timestamp formats."""
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'vibeCoding101' / 'PartX_simulation'))
+from content_store import detach  # noqa: E402
+from file_catalogue import FileCatalogue  # noqa: E402
+from parallel_ingest import add_workers_arg  # noqa: E402
+from timestamps import HK_TZ, column_parsers, parse_ts  # noqa: E402
+
+def parse_timestamp(ts_str, parser=parse_ts):
+    """Parse various timestamp formats; None if no known format matches."""
     if not ts_str:
         return None
-    
-    formats = [
-        "%Y-%m-%dT%H:%M:%S%z",
-        "%Y-%m-%dT%H:%M:%S.%f%z",
-        "%Y-%m-%d %H:%M:%S%z",
-        "%Y-%m-%d %H:%M:%S.%f%z",
-        "%Y-%m-%d %H:%M:%S",
-        "%Y-%m-%d",
-    ]
-    
-    for fmt in formats:
-        try:
-            return datetime.strptime(ts_str, fmt)
-        except ValueError:
-            continue
-    
-    return None
+    try:
+        return parser(ts_str)
+    except ValueError:
+        return None
 
 def extract_date_from_filename(filename):
     """Extract date from filename patterns like *_20251124_*.csv"""
@@ -42,11 +43,9 @@ def extract_date_from_filename(filename):
             pass
     return None
 
-def analyze_csv_file(csv_path):
-    """Analyze a single CSV file for monitoring dates."""
+def analyze_csv_content(csv_path):
+    """Dates, time range, rows and columns found in a CSV's content (independent of its name)."""
     info = {
-        'path': str(csv_path),
-        'filename': csv_path.name,
         'dates': set(),
         'min_date': None,
         'max_date': None,
@@ -55,11 +54,8 @@ def analyze_csv_file(csv_path):
         'columns': []
     }
     
-    # Try to extract date from filename first
-    filename_date = extract_date_from_filename(csv_path.name)
-    if filename_date:
-        info['dates'].add(filename_date)
-    
+    # naive timestamps in these files are HK local time; comparable with offset-aware ones
+    parsers = column_parsers(default_tz=HK_TZ)
     try:
         with open(csv_path, 'r', encoding='utf-8') as f:
             reader = csv.DictReader(f)
@@ -80,7 +76,7 @@ def analyze_csv_file(csv_path):
                 # Try to extract dates from timestamp columns
                 for col in timestamp_cols:
                     if col in row and row[col]:
-                        dt = parse_timestamp(row[col])
+                        dt = parse_timestamp(row[col], parsers[col])
                         if dt:
                             date = dt.date()
                             info['dates'].add(date)
@@ -95,7 +91,36 @@ def analyze_csv_file(csv_path):
     
     return info
 
+def content_summary(csv_path):
+    """analyze_csv_content in JSON form, as kept in the file catalogue."""
+    info = analyze_csv_content(Path(csv_path))
+    info['dates'] = sorted(d.isoformat() for d in info['dates'])
+    for key in ('min_date', 'max_date'):
+        info[key] = info[key].isoformat() if info[key] else None
+    return info
+
+def analyze_csv_file(csv_path, summary=None):
+    """Analyze a single CSV file for monitoring dates (from a catalogued content summary if given)."""
+    if summary is None:
+        info = analyze_csv_content(csv_path)
+    else:
+        info = dict(summary)
+        info['dates'] = {datetime.fromisoformat(d).date() for d in summary['dates']}
+        for key in ('min_date', 'max_date'):
+            info[key] = datetime.fromisoformat(summary[key]) if summary[key] else None
+    info['path'] = str(csv_path)
+    info['filename'] = csv_path.name
+    
+    # Try to extract date from filename first
+    filename_date = extract_date_from_filename(csv_path.name)
+    if filename_date:
+        info['dates'].add(filename_date)
+    return info
+
 def main():
+    ap = argparse.ArgumentParser(description='Summarize monitoring dates across all CSVs in the workspace')
+    add_workers_arg(ap)
+    args = ap.parse_args()
     base_dir = Path('/workspaces/GCAP3226AIagents')
     csv_collection_dir = base_dir / 'csv_collection'
     
@@ -113,9 +138,15 @@ def main():
     results = []
     eta_monitoring_files = []
     
+    # only new or changed files are read (in a process pool); the rest come from the file catalogue
+    catalogue = FileCatalogue()
+    counts = catalogue.refresh(all_csvs, workers=args.workers, extras={'monitoring_dates': content_summary})
+    catalogue.save()
+    print(f"Catalogue: {counts}\n")
     for csv_path in sorted(all_csvs):
         print(f"Analyzing: {csv_path.relative_to(base_dir)}")
-        info = analyze_csv_file(csv_path)
+        entry = catalogue.get(csv_path)
+        info = analyze_csv_file(csv_path, entry['extra']['monitoring_dates'] if entry else None)
         results.append(info)
         
         if info['has_eta_data'] and info['dates']:
@@ -123,6 +154,7 @@ def main():
     
     # Create summary report
     summary_path = csv_collection_dir / 'MONITORING_DATES_SUMMARY.md'
+    detach(summary_path)
     with open(summary_path, 'w', encoding='utf-8') as f:
         f.write("# CSV Monitoring Dates Summary\n\n")
         f.write(f"**Analysis Date**: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
@@ -191,6 +223,7 @@ def main():
     
     # Create CSV index
     index_path = csv_collection_dir / 'csv_files_index.csv'
+    detach(index_path)  # never write through a content_store view into a shared object
     with open(index_path, 'w', encoding='utf-8', newline='') as f:
         writer = csv.writer(f)
         writer.writerow(['Path', 'Filename', 'Rows', 'Dates', 'Min_DateTime', 'Max_DateTime', 'Has_ETA_Data', 'Columns'])
@@ -1,39 +1,49 @@
 #!/bin/bash
-# Script to copy all CSV files to csv_collection folder
+# Script to collect all CSV files in the csv_collection folder
+#
+# Each distinct file is stored once in csv_collection/.store (content-addressed by
+# sha256, see vibeCoding101/PartX_simulation/content_store.py); the folders below
+# are views of it (symlinks with the original file names), so identical copies take
+# no extra space and ingestion reads them once. The store is not committed
+# (csv_collection/.gitignore); files git tracks stay plain copies, so no committed
+# file ever links into it.
 
 SOURCE_DIR="/workspaces/GCAP3226AIagents"
 TARGET_DIR="/workspaces/GCAP3226AIagents/csv_collection"
+STORE="$SOURCE_DIR/vibeCoding101/PartX_simulation/content_store.py"
 
-echo "Copying CSV files from presentation/simulation..."
-mkdir -p "$TARGET_DIR/presentation_simulation"
-cp "$SOURCE_DIR/presentation/simulation"/*.csv "$TARGET_DIR/presentation_simulation/" 2>/dev/null
+mirror() {
+    python3 "$STORE" --store "$TARGET_DIR/.store" mirror "$1" "$2"
+}
 
-echo "Copying CSV files from Newdata..."
-mkdir -p "$TARGET_DIR/Newdata"
-cp "$SOURCE_DIR/Newdata"/*.csv "$TARGET_DIR/Newdata/" 2>/dev/null
+echo "Collecting CSV files from presentation/simulation..."
+mirror "$SOURCE_DIR/presentation/simulation" "$TARGET_DIR/presentation_simulation"
 
-echo "Copying CSV files from vibeCoding101/PartX_simulation..."
-mkdir -p "$TARGET_DIR/vibeCoding101_PartX_simulation"
-cp "$SOURCE_DIR/vibeCoding101/PartX_simulation"/*.csv "$TARGET_DIR/vibeCoding101_PartX_simulation/" 2>/dev/null
+echo "Collecting CSV files from Newdata..."
+mirror "$SOURCE_DIR/Newdata" "$TARGET_DIR/Newdata"
 
-echo "Copying CSV files from vibeCoding101/PartX_simulation/presentation/travel_time_comparison..."
-mkdir -p "$TARGET_DIR/vibeCoding101_travel_time_comparison"
-cp "$SOURCE_DIR/vibeCoding101/PartX_simulation/presentation/travel_time_comparison"/*.csv "$TARGET_DIR/vibeCoding101_travel_time_comparison/" 2>/dev/null
+echo "Collecting CSV files from vibeCoding101/PartX_simulation..."
+mirror "$SOURCE_DIR/vibeCoding101/PartX_simulation" "$TARGET_DIR/vibeCoding101_PartX_simulation"
 
-echo "Copying CSV files from vibeCoding101/PartX_simulation/monitor_outputs_until_0830..."
-mkdir -p "$TARGET_DIR/monitor_outputs_until_0830"
-cp "$SOURCE_DIR/vibeCoding101/PartX_simulation/monitor_outputs_until_0830"/*.csv "$TARGET_DIR/monitor_outputs_until_0830/" 2>/dev/null
-cp "$SOURCE_DIR/vibeCoding101/PartX_simulation/monitor_outputs_until_0830/presentation/simulation"/*.csv "$TARGET_DIR/monitor_outputs_until_0830/" 2>/dev/null
+echo "Collecting CSV files from vibeCoding101/PartX_simulation/presentation/travel_time_comparison..."
+mirror "$SOURCE_DIR/vibeCoding101/PartX_simulation/presentation/travel_time_comparison" "$TARGET_DIR/vibeCoding101_travel_time_comparison"
 
-echo "Copying CSV files from vibeCoding101/PartX_simulation/monitor_outputs_60min..."
-mkdir -p "$TARGET_DIR/monitor_outputs_60min"
-cp "$SOURCE_DIR/vibeCoding101/PartX_simulation/monitor_outputs_60min"/*.csv "$TARGET_DIR/monitor_outputs_60min/" 2>/dev/null
+echo "Collecting CSV files from vibeCoding101/PartX_simulation/monitor_outputs_until_0830..."
+mirror "$SOURCE_DIR/vibeCoding101/PartX_simulation/monitor_outputs_until_0830" "$TARGET_DIR/monitor_outputs_until_0830"
+mirror "$SOURCE_DIR/vibeCoding101/PartX_simulation/monitor_outputs_until_0830/presentation/simulation" "$TARGET_DIR/monitor_outputs_until_0830"
 
-echo "Copying CSV files from vibeCoding101/PartX_simulation/monitor_outputs_1hr..."
-mkdir -p "$TARGET_DIR/monitor_outputs_1hr"
-cp "$SOURCE_DIR/vibeCoding101/PartX_simulation/monitor_outputs_1hr"/*.csv "$TARGET_DIR/monitor_outputs_1hr/" 2>/dev/null
+echo "Collecting CSV files from vibeCoding101/PartX_simulation/monitor_outputs_60min..."
+mirror "$SOURCE_DIR/vibeCoding101/PartX_simulation/monitor_outputs_60min" "$TARGET_DIR/monitor_outputs_60min"
+
+echo "Collecting CSV files from vibeCoding101/PartX_simulation/monitor_outputs_1hr..."
+mirror "$SOURCE_DIR/vibeCoding101/PartX_simulation/monitor_outputs_1hr" "$TARGET_DIR/monitor_outputs_1hr"
+
+# drop objects no view shows any more (e.g. earlier versions of changed files)
+python3 "$STORE" --store "$TARGET_DIR/.store" gc
 
 echo ""
-echo "All CSV files copied successfully!"
-echo "Total CSV files copied:"
+echo "All CSV files collected successfully!"
+echo "Total CSV files collected:"
 find "$TARGET_DIR" -name "*.csv" | wc -l
+echo "Distinct files stored:"
+find "$TARGET_DIR/.store/objects" -type f | wc -l
@@ -1,128 +1,189 @@
 #!/usr/bin/env python3
+"""
+Collect every ETA row for the stops in stops_for_merge.csv into all_etas_two_stops.csv.
+
+With `--warehouse [DB]` (or ETA_WAREHOUSE set to the database path) the rows
+come from one indexed query on the SQLite ETA warehouse
+(vibeCoding101/PartX_simulation/eta_warehouse.py; default file if no path is
+given). Otherwise every monitor_summary*.csv in the repo (or under
+ETA_SEARCH_ROOT) is globbed and filtered. Column layouts are cached per file in
+.cache/schema_registry.json (schema_registry.py, keyed by path, size and
+mtime); each file is read in chunks with only the stop/route/eta/snapshot
+columns, and the rows matched for the current stop set are cached next to it,
+so re-runs only read files that are new or changed.
+"""
+import argparse
 import pandas as pd
 import glob
 import os
+import sys
 import json
+import hashlib
 from pathlib import Path
 
-out_dir = Path('presentation/simulation')
-out_dir.mkdir(parents=True, exist_ok=True)
-stops_csv = out_dir / 'stops_for_merge.csv'
-result_csv = out_dir / 'all_etas_two_stops.csv'
-summary_json = out_dir / 'all_etas_two_stops_summary.json'
-
-if not stops_csv.exists():
-    raise SystemExit(f"Stops CSV not found: {stops_csv}")
-
-stops = pd.read_csv(stops_csv, dtype=str)
-stop_ids = set(stops['stop_id'].astype(str).tolist())
-
-# find monitor summary CSVs anywhere in repo
-search_pattern = '/workspaces/GCAP3226AIagents/**/monitor_summary*.csv'
-files = glob.glob(search_pattern, recursive=True)
-files = [f for f in files if os.path.isfile(f)]
-
-rows = []
-file_summaries = []
-for f in files:
-    try:
-        df = pd.read_csv(f, low_memory=False)
-    except Exception as e:
-        file_summaries.append({'file': f, 'error': str(e)})
-        continue
-    cols = set(df.columns.str.lower())
-    # detect stop id column
-    stop_col = None
-    for cand in ['queried_stop_id', 'stop_id', 'stopid', 'queried_stopid']:
-        if cand in cols:
-            # find original column name
-            stop_col = [c for c in df.columns if c.lower() == cand][0]
-            break
-    if stop_col is None:
-        file_summaries.append({'file': f, 'error': 'no stop id column'})
-        continue
-    # detect eta column
-    eta_col = None
-    for cand in ['eta', 'eta_local', 'eta_ts', 'eta_time']:
-        if cand in cols:
-            eta_col = [c for c in df.columns if c.lower() == cand][0]
-            break
-    # snapshot ts
-    snap_col = None
-    for cand in ['snapshot_ts', 'snapshot', 'snapshot_local', 'data_timestamp']:
-        if cand in cols:
-            snap_col = [c for c in df.columns if c.lower() == cand][0]
-            break
-    route_col = None
-    for cand in ['route', 'route_name', 'route_no']:
-        if cand in cols:
-            route_col = [c for c in df.columns if c.lower() == cand][0]
-            break
-
-    # filter rows
-    sel = df[df[stop_col].astype(str).isin(stop_ids)].copy()
-    if sel.empty:
-        file_summaries.append({'file': f, 'matched': 0})
-        continue
-    # keep useful columns
-    keep = [stop_col]
-    if route_col:
-        keep.append(route_col)
-    if eta_col:
-        keep.append(eta_col)
-    if snap_col:
-        keep.append(snap_col)
-    # ensure uniqueness of keep
-    keep = list(dict.fromkeys(keep))
-    sel = sel[keep]
-    # rename to canonical
-    rename_map = {stop_col: 'stop_id'}
-    if route_col:
-        rename_map[route_col] = 'route'
-    if eta_col:
-        rename_map[eta_col] = 'eta'
-    if snap_col:
-        rename_map[snap_col] = 'snapshot_ts'
-    sel = sel.rename(columns=rename_map)
-    # append source file info
-    sel['source_file'] = os.path.relpath(f, start=os.getcwd())
-    rows.append(sel)
-    file_summaries.append({'file': f, 'matched': int(len(sel))})
-
-if rows:
-    all_df = pd.concat(rows, ignore_index=True, sort=False)
-    # deduplicate exact duplicates
-    all_df = all_df.drop_duplicates()
-    # try to parse eta and snapshot_ts as datetime
-    for col in ['eta', 'snapshot_ts']:
-        if col in all_df.columns:
-            try:
-                all_df[col] = pd.to_datetime(all_df[col], utc=False, errors='coerce')
-            except Exception:
-                pass
-    # sort
-    sort_cols = [c for c in ['stop_id', 'eta', 'snapshot_ts', 'route'] if c in all_df.columns]
-    if sort_cols:
-        all_df = all_df.sort_values(by=sort_cols)
-    all_df.to_csv(result_csv, index=False)
-    summary = {
-        'files_searched': len(files),
-        'files_with_matches': sum(1 for s in file_summaries if s.get('matched', 0) > 0),
-        'total_rows': int(len(all_df)),
-        'per_file': file_summaries,
-        'output_csv': str(result_csv)
-    }
-else:
-    summary = {
-        'files_searched': len(files),
-        'files_with_matches': 0,
-        'total_rows': 0,
-        'per_file': file_summaries,
-        'output_csv': str(result_csv)
-    }
-
-with open(summary_json, 'w') as f:
-    json.dump(summary, f, indent=2)
-
-print('Done. Summary written to', summary_json)
-print('If rows found, CSV written to', result_csv)
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / 'vibeCoding101' / 'PartX_simulation'))
+import eta_warehouse  # noqa: E402
+from dedup_keys import first_occurrence_mask, hash_frame  # noqa: E402
+from parallel_ingest import add_workers_arg, map_files  # noqa: E402
+from schema_registry import SchemaRegistry  # noqa: E402
+
+CHUNK_ROWS = 100_000
+
+
+def read_matches(task):
+    """Rows of one CSV whose stop id is in the stop set, columns renamed to canonical names (runs in a worker).
+
+    Fresh reads take only the needed columns in chunks and are cached to extract_csv; reused files are read
+    back from that cache."""
+    f, keep, rename_map, stop_ids, extract_csv, reused = task
+    if reused:
+        return pd.read_csv(extract_csv, dtype=str)
+    stop_col = next(c for c, name in rename_map.items() if name == 'stop_id')
+    parts = [pd.DataFrame(columns=keep, dtype=str)]
+    for chunk in pd.read_csv(f, usecols=keep, dtype=str, chunksize=CHUNK_ROWS):
+        parts.append(chunk[chunk[stop_col].isin(stop_ids)])
+    sel = pd.concat(parts, ignore_index=True)[keep].rename(columns=rename_map)
+    if not sel.empty:
+        sel.to_csv(extract_csv, index=False)
+    return sel
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Collect ETA rows for the stops in stops_for_merge.csv')
+    ap.add_argument('--warehouse', nargs='?', const=eta_warehouse.DEFAULT_DB, default=os.environ.get('ETA_WAREHOUSE'),
+                    help='Read from the SQLite ETA warehouse (default file if no path given; default: $ETA_WAREHOUSE)')
+    add_workers_arg(ap)
+    args = ap.parse_args()
+    workers = args.workers
+
+    out_dir = Path('presentation/simulation')
+    out_dir.mkdir(parents=True, exist_ok=True)
+    stops_csv = out_dir / 'stops_for_merge.csv'
+    result_csv = out_dir / 'all_etas_two_stops.csv'
+    summary_json = out_dir / 'all_etas_two_stops_summary.json'
+    cache_dir = out_dir / '.cache'
+
+    if not stops_csv.exists():
+        raise SystemExit(f"Stops CSV not found: {stops_csv}")
+
+    stops = pd.read_csv(stops_csv, dtype=str)
+    stop_ids = set(stops['stop_id'].astype(str).tolist())
+
+    warehouse_db = args.warehouse
+    use_warehouse = bool(warehouse_db)
+    if use_warehouse and not os.path.exists(warehouse_db):
+        raise SystemExit(f"ETA warehouse not found: {warehouse_db}")
+    csv_files = []
+    if not use_warehouse:
+        # find monitor summary CSVs anywhere in repo
+        search_root = os.environ.get('ETA_SEARCH_ROOT', '/workspaces/GCAP3226AIagents')
+        search_pattern = os.path.join(search_root, '**', 'monitor_summary*.csv')
+        csv_files = glob.glob(search_pattern, recursive=True)
+        csv_files = [f for f in csv_files if os.path.isfile(f)]
+    files = [warehouse_db] if use_warehouse else csv_files
+
+    rows = []
+    file_summaries = []
+    if use_warehouse:
+        with eta_warehouse.connect(warehouse_db, readonly=True) as db:
+            sel = eta_warehouse.query_df(db, stop_ids=sorted(stop_ids), with_source=True)
+        sel = sel.rename(columns={'queried_stop_id': 'stop_id'})[['stop_id', 'route', 'eta', 'snapshot_ts', 'source_file']]
+        sel['source_file'] = sel['source_file'].map(lambda p: os.path.relpath(p, start=os.getcwd()) if p else p)
+        if not sel.empty:
+            rows.append(sel)
+        file_summaries.append({'file': warehouse_db, 'matched': int(len(sel))})
+    stops_key = hashlib.sha1(','.join(sorted(stop_ids)).encode('utf-8')).hexdigest()[:16]
+    if csv_files:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+    registry = SchemaRegistry(str(cache_dir / 'schema_registry.json')) if csv_files else None
+    files_reused = 0
+    bytes_read = 0
+    tasks = []
+    for f in csv_files:
+        try:
+            mapping = registry.lookup(f)['mapping']
+        except Exception as e:
+            file_summaries.append({'file': f, 'error': str(e)})
+            continue
+        if 'stop_id' not in mapping:
+            file_summaries.append({'file': f, 'error': 'no stop id column'})
+            continue
+        # keep useful columns: stop id, route, eta, snapshot ts
+        keep = list(dict.fromkeys(mapping[c] for c in ['stop_id', 'route', 'eta', 'snapshot_ts'] if c in mapping))
+        rename_map = {mapping[c]: c for c in ['stop_id', 'route', 'eta', 'snapshot_ts'] if c in mapping}
+        extract_csv = cache_dir / (hashlib.sha1(os.path.abspath(f).encode('utf-8')).hexdigest()[:16] + '.csv')
+        cached = registry.entries[os.path.abspath(f)].get('extract')
+        if cached and cached['stops'] == stops_key and (cached['matched'] == 0 or extract_csv.exists()):
+            # unchanged file, same stops: reuse the rows matched last time
+            files_reused += 1
+            if cached['matched'] == 0:
+                file_summaries.append({'file': f, 'matched': 0})
+                continue
+            tasks.append((f, keep, rename_map, stop_ids, str(extract_csv), True))
+        else:
+            tasks.append((f, keep, rename_map, stop_ids, str(extract_csv), False))
+    # files are read in a process pool; results come back in file order
+    for task, sel, error in map_files(read_matches, tasks, workers=workers):
+        f, reused = task[0], task[5]
+        if error:
+            file_summaries.append({'file': f, 'error': error})
+            continue
+        if not reused:
+            bytes_read += os.path.getsize(f)
+            registry.annotate(f, extract={'stops': stops_key, 'matched': int(len(sel))})
+        if sel.empty:
+            file_summaries.append({'file': f, 'matched': 0})
+            continue
+        # append source file info
+        sel['source_file'] = os.path.relpath(f, start=os.getcwd())
+        rows.append(sel)
+        file_summaries.append({'file': f, 'matched': int(len(sel))})
+    if registry is not None:
+        registry.prune()
+        registry.save()
+
+    if rows:
+        all_df = pd.concat(rows, ignore_index=True, sort=False)
+        # deduplicate exact duplicates via one 64-bit hash per row
+        all_df = all_df[first_occurrence_mask(hash_frame(all_df))]
+        # try to parse eta and snapshot_ts as datetime
+        for col in ['eta', 'snapshot_ts']:
+            if col in all_df.columns:
+                try:
+                    all_df[col] = pd.to_datetime(all_df[col], utc=False, errors='coerce')
+                except Exception:
+                    pass
+        # sort
+        sort_cols = [c for c in ['stop_id', 'eta', 'snapshot_ts', 'route'] if c in all_df.columns]
+        if sort_cols:
+            all_df = all_df.sort_values(by=sort_cols)
+        all_df.to_csv(result_csv, index=False)
+        summary = {
+            'files_searched': len(files),
+            'files_with_matches': sum(1 for s in file_summaries if s.get('matched', 0) > 0),
+            'total_rows': int(len(all_df)),
+            'files_reused': files_reused,
+            'bytes_read': bytes_read,
+            'per_file': file_summaries,
+            'output_csv': str(result_csv)
+        }
+    else:
+        summary = {
+            'files_searched': len(files),
+            'files_with_matches': 0,
+            'total_rows': 0,
+            'files_reused': files_reused,
+            'bytes_read': bytes_read,
+            'per_file': file_summaries,
+            'output_csv': str(result_csv)
+        }
+
+    with open(summary_json, 'w') as f:
+        json.dump(summary, f, indent=2)
+
+    print('Done. Summary written to', summary_json)
+    print('If rows found, CSV written to', result_csv)
+
+
+if __name__ == '__main__':
+    main()
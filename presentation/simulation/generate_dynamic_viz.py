@@ -5,7 +5,11 @@ for selected stops using ETA CSV data.
 
 Behavior:
 - Default input: `presentation/simulation/all_etas_two_stops.csv` (if present)
-- Fallback: glob over monitor_summary CSVs under `vibeCoding101/PartX_simulation/monitor_outputs_*/`.
+- `--warehouse [DB]`: query the SQLite ETA warehouse (`vibeCoding101/PartX_simulation/eta_warehouse.py`)
+  for just `--stop-ids` / `--start`..`--end` instead of reading CSVs.
+- Fallback: glob over monitor_summary CSVs under `vibeCoding101/PartX_simulation/monitor_outputs_*/`;
+  with `--stop-ids` / `--start` / `--end`, files the file catalogue (`file_catalogue.py`) rules out are skipped.
+- `--stop-ids` / `--start` / `--end` select the same rows from CSV input as from the warehouse.
 - For each ETA entry we create an arrival event; departure = arrival + DWELL_SEC.
 - Animation: for each timestep show active buses at each stop and a bar chart of queue lengths.
 
@@ -16,6 +20,7 @@ Output:
 Requirements: pandas, numpy, matplotlib, pillow
 """
 import os
+import sys
 import glob
 import math
 import argparse
@@ -27,6 +32,11 @@ matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 from matplotlib.animation import FuncAnimation, PillowWriter
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'vibeCoding101', 'PartX_simulation'))
+import eta_warehouse  # noqa: E402
+from file_catalogue import FileCatalogue  # noqa: E402
+from timestamps import HK_TZ, TimestampParser, parse_ts  # noqa: E402
+
 # Defaults (can be overridden with CLI args)
 OUTDIR = os.path.dirname(__file__)
 DEFAULT_ETA_CSV = os.path.join(OUTDIR, 'all_etas_two_stops.csv')
@@ -39,7 +49,14 @@ DEFAULT_SNAP = os.path.join(OUTDIR, 'dynamic_buses_snapshot.png')
 
 # Helper: read ETA CSV (expected columns: stop_id, route, eta, snapshot_ts ...)
 
-def read_eta_source(eta_csv=None, monitor_glob=None):
+def read_eta_source(eta_csv=None, monitor_glob=None, warehouse=None, stop_ids=None, start=None, end=None):
+    if warehouse and not eta_csv:
+        print(f"Querying ETA warehouse: {warehouse}")
+        with eta_warehouse.connect(warehouse, readonly=True) as db:
+            df = eta_warehouse.query_df(db, stop_ids=stop_ids, start=start, end=end)
+        if df.empty:
+            raise FileNotFoundError(f'No warehouse rows for stops={stop_ids} start={start} end={end}')
+        return df.rename(columns={'queried_stop_id': 'stop_id'})
     # prefer default extracted CSV
     csv_path = eta_csv or DEFAULT_ETA_CSV
     if os.path.exists(csv_path):
@@ -52,6 +69,12 @@ def read_eta_source(eta_csv=None, monitor_glob=None):
         files = sorted(glob.glob(monitor_pattern))
         if not files:
             raise FileNotFoundError('No ETA CSV or monitor_summary files found')
+        if stop_ids or start or end:
+            # skip files whose catalogued stops / snapshot_ts range cannot match
+            catalogue = FileCatalogue()
+            files = catalogue.select(files, start=start, end=end, stop_ids=stop_ids)
+            catalogue.save()
+            print(f"File catalogue: {len(files)} monitor_summary CSVs may match stops={stop_ids} start={start} end={end}")
         pieces = []
         for f in files:
             try:
@@ -62,6 +85,28 @@ def read_eta_source(eta_csv=None, monitor_glob=None):
         if not pieces:
             raise FileNotFoundError('No readable monitor_summary CSVs found')
         df = pd.concat(pieces, ignore_index=True)
+    return filter_rows(df, stop_ids=stop_ids, start=start, end=end)
+
+
+def filter_rows(df, stop_ids=None, start=None, end=None):
+    """Rows of the given stops with start <= snapshot_ts <= end (naive = HK time), as the warehouse query selects."""
+    if stop_ids:
+        col = 'stop_id' if 'stop_id' in df.columns else 'queried_stop_id'
+        if col in df.columns:
+            df = df[df[col].astype(str).isin([str(s) for s in stop_ids])]
+    if (start or end) and 'snapshot_ts' in df.columns:
+        ts = TimestampParser(default_tz=HK_TZ)
+        lo = parse_ts(start, HK_TZ) if start else None
+        hi = parse_ts(end, HK_TZ) if end else None
+
+        def in_window(value):
+            try:
+                t = ts(str(value))
+            except ValueError:
+                return False
+            return (lo is None or t >= lo) and (hi is None or t <= hi)
+
+        df = df[df['snapshot_ts'].map(in_window).astype(bool)]
     return df
 
 
@@ -179,6 +224,11 @@ def main(args=None):
     parser = argparse.ArgumentParser(description='Generate dynamic bus arrival visualization')
     parser.add_argument('--eta-csv', help='Path to ETA CSV to use (overrides default)')
     parser.add_argument('--monitor-glob', help='Glob pattern for monitor_summary CSV fallback')
+    parser.add_argument('--warehouse', nargs='?', const=eta_warehouse.DEFAULT_DB,
+                        help='Read from the SQLite ETA warehouse (default file if no path given)')
+    parser.add_argument('--stop-ids', nargs='+', help='Only these stops')
+    parser.add_argument('--start', help='Earliest snapshot_ts (ISO, naive = HK time)')
+    parser.add_argument('--end', help='Latest snapshot_ts (ISO, naive = HK time)')
     parser.add_argument('--dwell', type=int, default=DEFAULT_DWELL, help='Dwell time in seconds')
     parser.add_argument('--step', type=int, default=DEFAULT_STEP, help='Frame step in seconds')
     parser.add_argument('--fps', type=int, default=DEFAULT_FPS, help='GIF frames-per-second')
@@ -186,7 +236,8 @@ def main(args=None):
     parser.add_argument('--out-snap', default=DEFAULT_SNAP, help='Output snapshot PNG path')
     ns = parser.parse_args(args=args)
 
-    df = read_eta_source(eta_csv=ns.eta_csv, monitor_glob=ns.monitor_glob)
+    df = read_eta_source(eta_csv=ns.eta_csv, monitor_glob=ns.monitor_glob, warehouse=ns.warehouse,
+                         stop_ids=ns.stop_ids, start=ns.start, end=ns.end)
     # notebook has stop ids for two stations; we can optionally restrict to those
     # try to infer stop_id column
     if 'stop_id' not in df.columns:
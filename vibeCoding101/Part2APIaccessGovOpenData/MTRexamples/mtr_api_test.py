@@ -20,14 +20,16 @@ class MTRAPIClient:
     
     BASE_URL = "https://rt.data.gov.hk/v1/transport/mtr/getSchedule.php"
     
-    def __init__(self, language: str = "EN"):
+    def __init__(self, language: str = "EN", base_url: str = None):
         """
         Initialize the MTR API client
         
         Args:
             language: Response language (EN, TC, or SC)
+            base_url: Override the getSchedule.php URL (e.g. a local replay server)
         """
         self.language = language
+        self.base_url = base_url or self.BASE_URL
         
     def get_next_train(self, line: str, station: str) -> Dict[str, Any]:
         """
@@ -47,7 +49,7 @@ class MTRAPIClient:
         }
         
         try:
-            response = requests.get(self.BASE_URL, params=params, timeout=10)
+            response = requests.get(self.base_url, params=params, timeout=10)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
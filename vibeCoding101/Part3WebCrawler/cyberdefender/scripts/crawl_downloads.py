@@ -35,6 +35,7 @@ def main():
     
     crawler.save_results(results)
     crawler.log_summary()
+    crawler.close()
 
 if __name__ == '__main__':
     main()
@@ -6,6 +6,10 @@ GCAP3226 - Web Crawling for Policy Analysis
 This script crawls cyberdefender.hk to extract pages and files containing
 quantitative data for policy analysis.
 
+Logging goes through the buffered writer in PartX_simulation/event_log.py:
+the text log and a per-request CSV (url, kind, status, latency_ms, bytes,
+error) stay open for the whole crawl and are flushed every second.
+
 Author: GCAP3226 Course Team
 Date: October 13, 2025
 """
@@ -21,6 +25,12 @@ from pathlib import Path
 from datetime import datetime
 from urllib.parse import urljoin, urlparse
 import hashlib
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[3] / 'PartX_simulation'))
+from event_log import EventLogWriter  # noqa: E402
+
+REQUEST_LOG_FIELDS = ['ts', 'kind', 'url', 'status', 'latency_ms', 'bytes', 'error']
 
 class CyberDefenderCrawler:
     """Web crawler for cyberdefender.hk with quantitative data detection"""
@@ -43,7 +53,11 @@ class CyberDefenderCrawler:
             directory.mkdir(parents=True, exist_ok=True)
         
         # Initialize logging
-        self.log_file = self.logs_dir / f"crawl_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
+        run_ts = datetime.now().strftime('%Y%m%d_%H%M%S')
+        self.log_file = self.logs_dir / f"crawl_{run_ts}.log"
+        self.request_log_file = self.logs_dir / f"crawl_{run_ts}_requests.csv"
+        self._log = EventLogWriter(self.log_file)
+        self._request_log = EventLogWriter(self.request_log_file, fields=REQUEST_LOG_FIELDS)
         self.stats = {
             'urls_visited': 0,
             'pages_with_data': 0,
@@ -57,8 +71,28 @@ class CyberDefenderCrawler:
         timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         log_message = f"[{timestamp}] [{level}] {message}"
         print(log_message)
-        with open(self.log_file, 'a', encoding='utf-8') as f:
-            f.write(log_message + '\n')
+        self._log.write_line(log_message)
+    
+    def fetch(self, url, kind, timeout):
+        """GET a URL, recording status and latency in the request log"""
+        record = {'ts': datetime.now().isoformat(), 'kind': kind, 'url': url}
+        t0 = time.perf_counter()
+        try:
+            response = self.session.get(url, timeout=timeout)
+            record.update(status=response.status_code, bytes=len(response.content))
+            response.raise_for_status()
+            return response
+        except Exception as e:
+            record['error'] = str(e)
+            raise
+        finally:
+            record['latency_ms'] = round((time.perf_counter() - t0) * 1000, 1)
+            self._request_log.write(record)
+    
+    def close(self):
+        """Flush and close the crawl logs"""
+        self._log.close()
+        self._request_log.close()
     
     def fetch_sitemaps(self):
         """Fetch and parse all sitemaps"""
@@ -66,8 +100,7 @@ class CyberDefenderCrawler:
         sitemap_index_url = f"{self.base_url}/sitemap_index.xml"
         
         try:
-            response = self.session.get(sitemap_index_url, timeout=10)
-            response.raise_for_status()
+            response = self.fetch(sitemap_index_url, 'sitemap', timeout=10)
             
             # Save sitemap index
             with open(self.sitemaps_dir / "sitemap_index.xml", 'w', encoding='utf-8') as f:
@@ -106,8 +139,7 @@ class CyberDefenderCrawler:
             sitemap_name = urlparse(sitemap_url).path.split('/')[-1]
             self.log(f"Fetching {sitemap_name}...")
             
-            response = self.session.get(sitemap_url, timeout=10)
-            response.raise_for_status()
+            response = self.fetch(sitemap_url, 'sitemap', timeout=10)
             
             # Save sitemap
             with open(self.sitemaps_dir / sitemap_name, 'w', encoding='utf-8') as f:
@@ -212,8 +244,7 @@ class CyberDefenderCrawler:
             self.log(f"Crawling: {url}")
             self.stats['urls_visited'] += 1
             
-            response = self.session.get(url, timeout=15)
-            response.raise_for_status()
+            response = self.fetch(url, 'page', timeout=15)
             
             # Parse HTML
             soup = BeautifulSoup(response.content, 'html.parser')
@@ -279,8 +310,7 @@ class CyberDefenderCrawler:
             
             try:
                 self.log(f"  → Downloading file: {file_url}")
-                response = self.session.get(file_url, timeout=30)
-                response.raise_for_status()
+                response = self.fetch(file_url, 'file', timeout=30)
                 
                 # Get filename
                 filename = os.path.basename(urlparse(file_url).path)
@@ -357,7 +387,10 @@ class CyberDefenderCrawler:
         self.log(f"Files downloaded: {self.stats['files_downloaded']}")
         self.log(f"Errors encountered: {self.stats['errors']}")
         self.log(f"Success rate: {(self.stats['pages_with_data'] / max(self.stats['urls_visited'], 1)) * 100:.1f}%")
+        self.log(f"Request log: {self.request_log_file}")
         self.log("=" * 80)
+        self._log.flush()
+        self._request_log.flush()
 
 
 def main():
@@ -371,7 +404,10 @@ def main():
     args = parser.parse_args()
     
     crawler = CyberDefenderCrawler(output_dir=args.output_dir)
-    crawler.crawl_site(max_pages=args.max_pages)
+    try:
+        crawler.crawl_site(max_pages=args.max_pages)
+    finally:
+        crawler.close()
 
 
 if __name__ == '__main__':
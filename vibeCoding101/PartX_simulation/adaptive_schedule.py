@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+adaptive_schedule.py
+
+Per-stop adaptive polling for `monitor_two_stations.monitor_loop --adaptive`.
+
+The loop ticks on a fine grid (`min_interval_sec`); on each tick only the stops
+that are due are polled. After every poll a stop's next due time is derived
+from its nearest `eta_seq=1` arrival:
+
+ - arrival within `near_sec` (default 3 min): poll again after `min_interval_sec`
+ - arrival further out: wait half the time until it enters that window,
+   clamped to [min_interval_sec, max_interval_sec]
+ - no arrival reported: back off to `max_interval_sec`
+
+`budget_per_min` caps requests over any sliding 60 s window across all stops;
+when more stops are due than the budget allows, the most imminent arrivals go
+first and the rest wait for the next tick.
+
+Usage:
+    sched = AdaptivePollSchedule(stop_ids, min_interval_sec=10, max_interval_sec=120, budget_per_min=30)
+    for sid in sched.due():
+        rows = fetch(sid)
+        sched.update(sid, rows)
+    print(sched.stats())
+"""
+from __future__ import annotations
+import math
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List
+
+
+def seconds_to_next_arrival(rows: List[Dict[str, Any]], now: datetime) -> float | None:
+    """Seconds from `now` to the earliest eta_seq=1 ETA in rows (None when there is none)."""
+    best = None
+    for r in rows:
+        if str(r.get('eta_seq')) != '1' or not r.get('eta'):
+            continue
+        try:
+            eta_dt = datetime.fromisoformat(r['eta'])
+        except (TypeError, ValueError):
+            continue
+        secs = (eta_dt - now).total_seconds()
+        if best is None or secs < best:
+            best = secs
+    return best
+
+
+class AdaptivePollSchedule:
+    def __init__(self, stop_ids: List[str], min_interval_sec: float = 10, max_interval_sec: float = 120,
+                 near_sec: float = 180, budget_per_min: int | None = None, clock=time.monotonic):
+        if min_interval_sec <= 0 or max_interval_sec < min_interval_sec:
+            raise ValueError('need 0 < min_interval_sec <= max_interval_sec')
+        self.stop_ids = list(stop_ids)
+        self.min_interval = float(min_interval_sec)
+        self.max_interval = float(max_interval_sec)
+        self.near_sec = float(near_sec)
+        self.budget = budget_per_min
+        self.clock = clock
+        self._next_due = {sid: 0.0 for sid in self.stop_ids}
+        self._next_eta = {sid: None for sid in self.stop_ids}
+        self._sent = deque()
+        self._started = None
+        self._tick = None
+        self.polls = {sid: 0 for sid in self.stop_ids}
+        self.deferred = 0
+
+    def interval_for(self, secs_to_arrival: float | None) -> float:
+        if secs_to_arrival is None:
+            return self.max_interval
+        if secs_to_arrival <= self.near_sec:
+            return self.min_interval
+        return min(self.max_interval, max(self.min_interval, (secs_to_arrival - self.near_sec) / 2))
+
+    def due(self) -> List[str]:
+        """Stops to poll now, most imminent arrival first, trimmed to the remaining request budget."""
+        now = self.clock()
+        if self._started is None:
+            self._started = now
+        self._tick = now
+        ready = [sid for sid in self.stop_ids if self._next_due[sid] <= now]
+        ready.sort(key=lambda sid: (self._next_eta[sid] if self._next_eta[sid] is not None else math.inf,
+                                    self._next_due[sid]))
+        if self.budget is not None:
+            while self._sent and now - self._sent[0] >= 60:
+                self._sent.popleft()
+            allowed = max(0, self.budget - len(self._sent))
+            self.deferred += max(0, len(ready) - allowed)
+            ready = ready[:allowed]
+        self._sent.extend([now] * len(ready))
+        return ready
+
+    def update(self, stop_id: str, rows: List[Dict[str, Any]], now: datetime | None = None) -> float:
+        """Record a poll of stop_id and schedule its next one; returns the chosen interval.
+
+        The next due time counts from the start of the tick that polled the stop (not from when the fetch
+        finished), so a stop on min_interval_sec is due again on the very next tick."""
+        now = now or datetime.now().astimezone()
+        secs = seconds_to_next_arrival(rows, now)
+        interval = self.interval_for(secs)
+        self._next_eta[stop_id] = secs
+        start = self._tick if self._tick is not None else self.clock()
+        self._next_due[stop_id] = start + interval
+        self.polls[stop_id] += 1
+        return interval
+
+    def stats(self) -> Dict[str, Any]:
+        """Requests sent vs what fixed polling at min_interval_sec would have sent over the same time."""
+        elapsed = 0.0 if self._started is None else self.clock() - self._started
+        fixed = len(self.stop_ids) * (int(elapsed // self.min_interval) + 1) if self._started is not None else 0
+        return {
+            'requests': sum(self.polls.values()),
+            'fixed_min_interval_requests': fixed,
+            'deferred_by_budget': self.deferred,
+            'polls_per_stop': dict(self.polls),
+        }
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+compressed_io.py
+
+Transparent compression for snapshot files and the CSV/JSON(L) readers that
+consume them. The codec is chosen by the file suffix:
+
+ - `.gz`: gzip (standard library)
+ - `.zst`: Zstandard, via the optional `zstandard` package (`pip install zstandard`)
+ - anything else: plain file
+
+Readers stream: `open_text('x.csv.gz')` decompresses while `csv.DictReader`
+iterates, so nothing is unpacked to disk. `iter_records` yields dict rows from
+CSV or JSONL files in any of these codecs. Writers pick the suffix with
+`compressed_path(path, 'gzip')` and then `open_text(..., 'w')` or `write_bytes`.
+
+Usage:
+    with open_text('monitor_summary.csv.gz') as f:
+        for row in csv.DictReader(f): ...
+    for row in iter_records('eta_log_20251124_063000.jsonl.zst'): ...
+    path = compressed_path('snapshot_20251124_070000.json', 'gzip')
+    with open_text(path, 'w') as f:
+        json.dump(snapshot, f)
+"""
+from __future__ import annotations
+import csv
+import gzip
+import io
+import json
+from typing import Any, Dict, Iterator
+
+CODEC_SUFFIXES = {'gzip': '.gz', 'zstd': '.zst'}
+COMPRESSED_SUFFIXES = tuple(CODEC_SUFFIXES.values())
+COMPRESS_CHOICES = ['none'] + list(CODEC_SUFFIXES)
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError('reading/writing .zst files needs the zstandard package (pip install zstandard)')
+    return zstandard
+
+
+def codec_for(path) -> str | None:
+    """'gzip' / 'zstd' for a compressed file name, else None."""
+    name = str(path)
+    for codec, suffix in CODEC_SUFFIXES.items():
+        if name.endswith(suffix):
+            return codec
+    return None
+
+
+def strip_compression(path) -> str:
+    """File name without its compression suffix (`a.csv.gz` -> `a.csv`)."""
+    name = str(path)
+    codec = codec_for(name)
+    return name[:-len(CODEC_SUFFIXES[codec])] if codec else name
+
+
+def has_data_suffix(path, *suffixes: str) -> bool:
+    """True if path ends with one of suffixes, optionally followed by a compression suffix."""
+    return strip_compression(path).endswith(tuple(suffixes))
+
+
+def compressed_path(path, codec: str | None):
+    """Append the codec's suffix to path (no-op for None/'none'); returns the same type it was given."""
+    if not codec or codec == 'none':
+        return path
+    new = str(path) + CODEC_SUFFIXES[codec]
+    return new if isinstance(path, str) else type(path)(new)
+
+
+def open_binary(path, mode: str = 'rb', level: int | None = None):
+    """Open path for binary reading ('rb') or writing ('wb'/'ab'), compressing by suffix."""
+    codec = codec_for(path)
+    if codec == 'gzip':
+        return gzip.open(path, mode, compresslevel=level or 6)
+    if codec == 'zstd':
+        zstandard = _zstd()
+        if mode.startswith('r'):
+            return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+        return zstandard.ZstdCompressor(level=level or 3).stream_writer(open(path, mode), closefd=True)
+    return open(path, mode)
+
+
+def open_text(path, mode: str = 'r', encoding: str = 'utf-8', newline: str | None = None, level: int | None = None):
+    """Text-mode counterpart of open_binary ('r', 'w' or 'a'); plain files use the built-in open."""
+    if codec_for(path) is None:
+        return open(path, mode, encoding=encoding, newline=newline)
+    raw = open_binary(path, mode.replace('t', '') + 'b', level=level)
+    return io.TextIOWrapper(raw, encoding=encoding, newline=newline)
+
+
+def write_bytes(path, data: bytes, level: int | None = None):
+    with open_binary(path, 'wb', level=level) as f:
+        f.write(data)
+
+
+def iter_records(path) -> Iterator[Dict[str, Any]]:
+    """Stream dict rows from a CSV (header row) or JSONL file, plain or compressed."""
+    if has_data_suffix(path, '.jsonl', '.ndjson'):
+        with open_text(path) as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        with open_text(path, newline='') as f:
+            yield from csv.DictReader(f)
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+content_store.py
+
+Content-addressed store for collected data files, so the same monitor CSV
+mirrored into several folders (csv_collection/copy_all_csv.sh) exists once on
+disk and is read once by ingestion.
+
+Each distinct file content is kept once as `{store}/objects/ab/<sha256>`
+(read-only, no suffix, so `**/*.csv` globs never pick objects up). A folder of
+copies becomes a *view*: the same file names as symlinks to the objects
+(hard links, or plain copies as a last resort, where symlinks are not
+allowed). `manifest.json` records every view and the object it shows, which
+`gc` uses to drop objects no view points to any more.
+
+ - `mirror SRC VIEW`: put SRC's files into the store and link them into VIEW
+   (what copy_all_csv.sh used `cp` for; tracked VIEW files get a plain copy)
+ - `absorb DIR...`: turn the regular files already in DIR (a mirrored data
+   folder) into views; generated files (GENERATED_FILES, e.g. the
+   csv_files_index.csv that analyze_monitoring_dates rewrites) are left alone
+ - `gc`: forget views that are gone or replaced, delete unreferenced objects
+
+Files git tracks are never turned into views: a symlink into the (untracked)
+store would dangle in every other clone, and git already keeps identical
+blobs once. `mirror` writes plain copies over tracked view files and `absorb`
+leaves tracked files alone; both report them as `tracked`.
+
+Views share their object, so a script that rewrites a file which may be a view
+must call `detach(path)` first: it removes the link, and the write then creates
+a new regular file instead of going through to the object (which, read-only or
+not, other views show too).
+
+`distinct_files(paths)` is the ingestion side: it keeps the first path of each
+distinct content, in input order, and reports the rest as duplicates. Views of
+the same object are recognised by their link target and files of a size no
+other file has are never hashed; only same-size candidates are hashed
+(sha256, as in file_catalogue).
+
+Usage:
+    python3 content_store.py --store ../../csv_collection/.store mirror monitor_outputs_1hr ../../csv_collection/monitor_outputs_1hr
+    python3 content_store.py --store ../../csv_collection/.store absorb ../../csv_collection/monitor_outputs_1hr ../../csv_collection/Newdata
+    python3 content_store.py --store ../../csv_collection/.store gc
+
+    kept, duplicates = distinct_files(input_files)
+"""
+from __future__ import annotations
+import argparse
+import fnmatch
+import json
+import os
+import re
+import shutil
+import stat
+import subprocess
+from typing import Dict, Iterable, List, Tuple
+
+from file_catalogue import file_hash, is_data_file
+from parallel_ingest import DEFAULT_WORKERS, map_files
+
+DEFAULT_STORE = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'csv_collection', '.store'))
+STORE_VERSION = 1
+DIGEST_RE = re.compile(r'^[0-9a-f]{64}$')
+# outputs the collection scripts rewrite in place; never turned into views
+GENERATED_FILES = {'csv_files_index.csv'}
+
+
+def object_digest(path: str) -> str | None:
+    """The sha256 a store object is named by, or None if path is not (a link to) a store object."""
+    real = os.path.realpath(path)
+    name = os.path.basename(real)
+    shard = os.path.dirname(real)
+    if (DIGEST_RE.match(name) and os.path.basename(shard) == name[:2]
+            and os.path.basename(os.path.dirname(shard)) == 'objects'):
+        return name
+    return None
+
+
+def detach(path) -> bool:
+    """Remove path if it is a view (a link to a store object, or a hard link), so it can be rewritten safely."""
+    if os.path.islink(path):
+        if object_digest(path) is None:
+            return False
+    elif not (os.path.isfile(path) and os.stat(path).st_nlink > 1):
+        return False
+    os.remove(path)
+    return True
+
+
+def git_tracked(directory: str) -> set:
+    """Absolute paths of the files under directory that git tracks (empty outside a work tree or without git)."""
+    if not os.path.isdir(directory):
+        return set()
+    try:
+        out = subprocess.run(['git', '-C', directory, 'ls-files', '-z', '--', '.'],
+                             capture_output=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return set()
+    return {os.path.abspath(os.path.join(directory, p)) for p in out.decode('utf-8').split('\0') if p}
+
+
+def distinct_files(paths: Iterable, workers: int | None = DEFAULT_WORKERS) -> Tuple[List, List[Tuple]]:
+    """(first path of each distinct content in input order, [(duplicate path, kept path with the same content)])."""
+    paths = list(paths)
+    real = [os.path.realpath(p) for p in paths]
+    by_size: Dict[int, set] = {}
+    for r in set(real):
+        by_size.setdefault(os.path.getsize(r), set()).add(r)
+    # a file whose size no other file has is its own content id; store objects are named by their hash
+    ids = {r: object_digest(r) or r for r in real}
+    to_hash = sorted(r for group in by_size.values() if len(group) > 1 for r in group if object_digest(r) is None)
+    for r, digest, error in map_files(file_hash, to_hash, workers=workers):
+        if not error:
+            ids[r] = digest
+    first: Dict[str, object] = {}
+    kept, duplicates = [], []
+    for p, r in zip(paths, real):
+        if ids[r] in first:
+            duplicates.append((p, first[ids[r]]))
+        else:
+            first[ids[r]] = p
+            kept.append(p)
+    return kept, duplicates
+
+
+def _copy(src: str, dst: str):
+    """Replace dst with a writable plain copy of src (never writing through a link dst may be)."""
+    tmp = dst + '.cs-tmp'
+    shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+
+
+def _place(target: str, view_path: str):
+    """Make view_path show target: a relative symlink, else a hard link, else a copy (replacing what was there)."""
+    tmp = view_path + '.cs-tmp'
+    if os.path.lexists(tmp):
+        os.remove(tmp)
+    try:
+        os.symlink(os.path.relpath(target, os.path.dirname(os.path.abspath(view_path))), tmp)
+    except OSError:
+        try:
+            os.link(target, tmp)
+        except OSError:
+            shutil.copy2(target, tmp)
+    os.replace(tmp, view_path)
+
+
+class ContentStore:
+    def __init__(self, root: str = DEFAULT_STORE):
+        self.root = os.path.abspath(root)
+        self.manifest_path = os.path.join(self.root, 'manifest.json')
+        self.views: Dict[str, str] = {}
+        if os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('version') == STORE_VERSION:
+                    self.views = data.get('views', {})
+            except (OSError, ValueError):
+                pass
+
+    def object_path(self, digest: str) -> str:
+        return os.path.join(self.root, 'objects', digest[:2], digest)
+
+    def put(self, path: str, digest: str | None = None) -> Tuple[str, bool]:
+        """(digest, stored) for path's content; stored is False when the object already existed."""
+        digest = digest or object_digest(path) or file_hash(path)
+        obj = self.object_path(digest)
+        if os.path.exists(obj):
+            return digest, False
+        os.makedirs(os.path.dirname(obj), exist_ok=True)
+        tmp = obj + '.tmp'
+        shutil.copy2(path, tmp)
+        # objects are shared by every view: read-only, so writing through a view fails instead of changing them all
+        os.chmod(tmp, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+        os.replace(tmp, obj)
+        return digest, True
+
+    def link(self, digest: str, view_path: str):
+        view_path = os.path.abspath(view_path)
+        os.makedirs(os.path.dirname(view_path), exist_ok=True)
+        if os.path.realpath(view_path) != self.object_path(digest):
+            _place(self.object_path(digest), view_path)
+        self.views[view_path] = digest
+
+    def shows(self, view_path: str, digest: str) -> bool:
+        """True if view_path still shows the object (link to it, or, for a copy, same content)."""
+        obj = self.object_path(digest)
+        if not (os.path.exists(view_path) and os.path.exists(obj)):
+            return False
+        return os.path.samefile(view_path, obj) or file_hash(view_path) == digest
+
+    def _add(self, files: List[str], view_for, workers: int | None, tracked: set) -> Dict[str, int]:
+        counts = {'files': 0, 'stored': 0, 'deduplicated': 0, 'tracked': 0, 'failed': 0}
+        for f in [f for f in files if os.path.abspath(view_for(f)) in tracked]:
+            # git-tracked: keep (or make) a plain file, never a link into the store
+            view = os.path.abspath(view_for(f))
+            if view != os.path.abspath(f) and (os.path.islink(view) or not os.path.isfile(view)
+                                               or file_hash(view) != file_hash(f)):
+                _copy(f, view)
+            self.views.pop(view, None)
+            counts['tracked'] += 1
+        files = [f for f in files if os.path.abspath(view_for(f)) not in tracked]
+        known = [f for f in files if object_digest(f)]
+        todo = [f for f in files if not object_digest(f)]
+        results = [(f, object_digest(f), None) for f in known]
+        results.extend(map_files(file_hash, todo, workers=workers))
+        for f, digest, error in results:
+            if error:
+                counts['failed'] += 1
+                print(f'Failed to hash {f}: {error}')
+                continue
+            _, stored = self.put(f, digest)
+            self.link(digest, view_for(f))
+            counts['files'] += 1
+            counts['stored' if stored else 'deduplicated'] += 1
+        return counts
+
+    def mirror(self, src_dir: str, view_dir: str, pattern: str = '*.csv',
+               workers: int | None = DEFAULT_WORKERS) -> Dict[str, int]:
+        """Store the files in src_dir matching pattern (not recursive) and show them in view_dir under the same names."""
+        files = sorted(os.path.join(src_dir, n) for n in os.listdir(src_dir)
+                       if fnmatch.fnmatch(n, pattern) and os.path.isfile(os.path.join(src_dir, n)))
+        return self._add(files, lambda f: os.path.join(view_dir, os.path.basename(f)), workers, git_tracked(view_dir))
+
+    def absorb(self, directory: str, workers: int | None = DEFAULT_WORKERS) -> Dict[str, int]:
+        """Replace the untracked data files under directory (recursively, outside the store, except
+        GENERATED_FILES) by views of stored objects."""
+        files = []
+        for root, dirs, names in os.walk(directory):
+            dirs[:] = [d for d in dirs if os.path.abspath(os.path.join(root, d)) != self.root]
+            files.extend(os.path.join(root, n) for n in names if is_data_file(n) and n not in GENERATED_FILES)
+        return self._add(sorted(files), lambda f: f, workers, git_tracked(directory))
+
+    def gc(self) -> Dict[str, int]:
+        """Forget views that no longer show their object, then delete objects without views."""
+        stale = [v for v, d in self.views.items() if not self.shows(v, d)]
+        for v in stale:
+            del self.views[v]
+        live = set(self.views.values())
+        removed = 0
+        objects = os.path.join(self.root, 'objects')
+        for root, _, names in os.walk(objects):
+            for n in names:
+                if DIGEST_RE.match(n) and n not in live:
+                    os.remove(os.path.join(root, n))
+                    removed += 1
+        return {'views_dropped': len(stale), 'objects_removed': removed, 'objects': len(live)}
+
+    def save(self):
+        os.makedirs(self.root, exist_ok=True)
+        tmp = self.manifest_path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'version': STORE_VERSION, 'views': self.views}, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.manifest_path)
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description='Content-addressed store with per-directory views of data files')
+    p.add_argument('--store', default=DEFAULT_STORE, help='Store directory (default: csv_collection/.store)')
+    p.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='Processes for hashing files')
+    sub = p.add_subparsers(dest='cmd', required=True)
+    pm = sub.add_parser('mirror', help="Store SRC's files and link them into VIEW")
+    pm.add_argument('src')
+    pm.add_argument('view')
+    pm.add_argument('--pattern', default='*.csv', help='File name pattern in SRC (default: *.csv)')
+    pa = sub.add_parser('absorb', help='Turn data files already in the directories into views')
+    pa.add_argument('dirs', nargs='+')
+    sub.add_parser('gc', help='Drop stale views and unreferenced objects')
+    args = p.parse_args(argv)
+
+    store = ContentStore(args.store)
+    if args.cmd == 'mirror':
+        if not os.path.isdir(args.src):
+            print(f'Source directory not found: {args.src}')
+            return
+        counts = store.mirror(args.src, args.view, pattern=args.pattern, workers=args.workers)
+        print(f'{args.src} -> {args.view}: {counts}')
+    elif args.cmd == 'absorb':
+        for d in args.dirs:
+            print(f'{d}: {store.absorb(d, workers=args.workers)}')
+    else:
+        print(store.gc())
+    store.save()
+
+
+if __name__ == '__main__':
+    main()
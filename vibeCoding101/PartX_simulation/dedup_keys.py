@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+dedup_keys.py
+
+Compact deduplication for ETA rows. Instead of keeping tuples of five strings
+(several hundred bytes each) in a `set`, the canonical key fields are hashed to
+one 64-bit integer:
+
+ - `key_hash(*fields)`: blake2b-64 of the fields joined by a separator
+ - `KeySet`: sorted NumPy uint64 array (8 bytes per key). `add_many(hashes)`
+   returns a mask of the hashes that are new (not seen before and first in
+   the batch); lookups and merges are vectorized, so this is the fast path
+   when rows arrive a file or chunk at a time.
+ - `hash_frame(df, cols)` + `first_occurrence_mask(hashes)`: vectorized
+   drop_duplicates for pandas frames via a sorted NumPy array of hashes.
+
+A 64-bit hash can collide: with 10^8 distinct keys the chance of any collision
+is about 3 in 10,000, so the odds of dropping even a single row are small.
+
+Usage:
+    seen = KeySet()
+    hashes = np.fromiter((key_hash(*k) for k in keys), dtype=np.uint64, count=len(keys))
+    new = seen.add_many(hashes)
+    df = df[first_occurrence_mask(hash_frame(df))]
+"""
+from __future__ import annotations
+import hashlib
+
+import numpy as np
+
+
+def key_hash(*fields) -> int:
+    """64-bit hash of the key fields (None and '' hash alike); never 0."""
+    data = '\x1f'.join('' if f is None else str(f) for f in fields).encode('utf-8')
+    h = int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'little')
+    return h or 1
+
+
+class KeySet:
+    def __init__(self):
+        self._keys = np.empty(0, dtype=np.uint64)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, h: int) -> bool:
+        h = np.uint64(h)
+        i = np.searchsorted(self._keys, h)
+        return bool(i < len(self._keys) and self._keys[i] == h)
+
+    def add_many(self, hashes) -> np.ndarray:
+        """Add a batch of hashes; boolean mask of those not seen before (first occurrence within the batch)."""
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        new = first_occurrence_mask(hashes)
+        if len(self._keys):
+            pos = np.searchsorted(self._keys, hashes).clip(max=len(self._keys) - 1)
+            new &= self._keys[pos] != hashes
+        if new.any():
+            self._keys = np.union1d(self._keys, hashes[new])
+        return new
+
+    def nbytes(self) -> int:
+        return self._keys.nbytes
+
+
+def hash_frame(df, cols=None) -> np.ndarray:
+    """uint64 hash per row of df[cols] (all columns by default); NaN hashes consistently."""
+    import pandas as pd
+    sub = df if cols is None else df[list(cols)]
+    return pd.util.hash_pandas_object(sub, index=False).to_numpy(dtype=np.uint64)
+
+
+def first_occurrence_mask(hashes: np.ndarray) -> np.ndarray:
+    """Boolean mask keeping the first row of every distinct hash (same rows as drop_duplicates(keep='first'))."""
+    _, first = np.unique(hashes, return_index=True)
+    mask = np.zeros(len(hashes), dtype=bool)
+    mask[first] = True
+    return mask
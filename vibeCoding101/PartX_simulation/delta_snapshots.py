@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+delta_snapshots.py
+
+Delta storage for monitor snapshots. Instead of one pretty-printed
+`snapshot_*.json` per tick, each tick appends one compact JSON line to
+`snapshot_deltas_{YYYYMMDD}.jsonl` holding only the ETA rows (keyed by stop,
+route, direction, service_type, eta_seq) whose eta (or any other field but
+`data_timestamp` and the `_`-prefixed bookkeeping ones) changed since the
+previous tick, the keys that disappeared, and a content hash of the full
+snapshot (`content_hash`), which readers check after rebuilding it. The API
+stamps every row of a stop with the same `data_timestamp`, which moves on
+every poll; it is stored once per stop and tick (`data_ts`) and put back on
+the rows when the snapshot is rebuilt, so it costs no re-stored rows. Every
+`keyframe_every` ticks (and at the start of each file) a keyframe line holds
+the full snapshot, so a reader never has to replay more than one keyframe
+interval.
+
+Keyframe byte offsets are kept in a `.keyframes` sidecar (`timestamp<TAB>offset`)
+so a single snapshot can be reconstructed without scanning the whole file.
+
+Usage:
+    writer = DeltaSnapshotWriter(out_dir, keyframe_every=20)
+    writer.write(snapshot)                     # snapshot dict as built by monitor_two_stations
+    for snap in iter_snapshots(path): ...      # full snapshots, in order
+    snap = load_snapshot(path, '2025-11-24T07:00:00+08:00')
+"""
+from __future__ import annotations
+import bisect
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterator, List
+
+DELTA_PREFIX = 'snapshot_deltas_'
+
+
+def row_key(row: Dict[str, Any]) -> str:
+    """Identity of an ETA row within one stop: route|direction|service_type|eta_seq."""
+    direction = row.get('dir') or row.get('direction') or row.get('bound') or ''
+    return f"{row.get('route') or ''}|{direction}|{row.get('service_type') or ''}|{row.get('eta_seq') or ''}"
+
+
+def row_content(row: Dict[str, Any]) -> Dict[str, Any]:
+    """The row without `_`-prefixed bookkeeping fields: what change detection and the hash compare."""
+    return {k: v for k, v in row.items() if not k.startswith('_')}
+
+
+def common_data_ts(rows: List[Dict[str, Any]]):
+    """The data_timestamp all rows share, or None if they have none or differ."""
+    values = {r.get('data_timestamp') for r in rows}
+    return values.pop() if len(values) == 1 and rows and 'data_timestamp' in rows[0] else None
+
+
+def stored_row(row: Dict[str, Any], data_ts) -> Dict[str, Any]:
+    """The row as kept in a delta file: without data_timestamp when the stop's data_ts carries it."""
+    if data_ts is None:
+        return row
+    return {k: v for k, v in row.items() if k != 'data_timestamp'}
+
+
+def snapshot_hash(stops: Dict[str, Dict[str, Dict[str, Any]]]) -> str:
+    """Content hash over {stop_id: {row_key: row}} (order-independent, `_` fields ignored)."""
+    h = hashlib.sha1()
+    for sid in sorted(stops):
+        for key in sorted(stops[sid]):
+            content = json.dumps(row_content(stops[sid][key]), sort_keys=True, ensure_ascii=False)
+            h.update(f"{sid}\x1f{key}\x1f{content}\x1e".encode('utf-8'))
+    return h.hexdigest()
+
+
+def delta_path_for(out_dir: str, when: datetime) -> str:
+    return os.path.join(out_dir, f"{DELTA_PREFIX}{when.strftime('%Y%m%d')}.jsonl")
+
+
+class DeltaSnapshotWriter:
+    def __init__(self, out_dir: str, keyframe_every: int = 20):
+        self.out_dir = out_dir
+        self.keyframe_every = max(1, keyframe_every)
+        self._path = None
+        self._prev_rows: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._since_keyframe = 0
+        self.bytes_written = 0
+
+    def write(self, snapshot: Dict[str, Any]) -> str:
+        """Append the delta (or keyframe) for `snapshot` and return the file path."""
+        when = datetime.fromisoformat(snapshot['timestamp'])
+        path = delta_path_for(self.out_dir, when)
+        if path != self._path:
+            # new file (first write or day rollover) always starts with a keyframe
+            self._path = path
+            self._prev_rows = {}
+            self._since_keyframe = self.keyframe_every
+
+        full_rows = {
+            stop['stop_id']: {row_key(r): r for r in stop.get('rows', [])}
+            for stop in snapshot.get('stops', [])
+        }
+        data_ts = {}
+        for stop in snapshot.get('stops', []):
+            ts = common_data_ts(stop.get('rows', []))
+            if ts is not None:
+                data_ts[stop['stop_id']] = ts
+        cur_rows = {sid: {k: stored_row(r, data_ts.get(sid)) for k, r in rows.items()}
+                    for sid, rows in full_rows.items()}
+        record = {k: v for k, v in snapshot.items() if k != 'stops'}
+        record['content_hash'] = snapshot_hash(full_rows)
+        record['stop_ids'] = [stop['stop_id'] for stop in snapshot.get('stops', [])]
+        record['data_ts'] = data_ts
+
+        keyframe = self._since_keyframe >= self.keyframe_every
+        if keyframe:
+            record['keyframe'] = True
+            record['upserts'] = {sid: list(rows.values()) for sid, rows in cur_rows.items()}
+            self._since_keyframe = 1
+        else:
+            upserts, removes = {}, {}
+            for sid, rows in cur_rows.items():
+                prev = self._prev_rows.get(sid, {})
+                changed = [r for k, r in rows.items() if k not in prev or row_content(prev[k]) != row_content(r)]
+                gone = [k for k in prev if k not in rows]
+                if changed:
+                    upserts[sid] = changed
+                if gone:
+                    removes[sid] = gone
+            for sid in self._prev_rows:
+                if sid not in cur_rows and self._prev_rows[sid]:
+                    removes[sid] = list(self._prev_rows[sid])
+            record['keyframe'] = False
+            record['upserts'] = upserts
+            record['removes'] = removes
+            self._since_keyframe += 1
+        self._prev_rows = cur_rows
+
+        os.makedirs(self.out_dir, exist_ok=True)
+        line = json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n'
+        data = line.encode('utf-8')
+        with open(path, 'ab') as f:
+            offset = f.tell()
+            f.write(data)
+        if keyframe:
+            with open(path + '.keyframes', 'a', encoding='utf-8') as f:
+                f.write(f"{snapshot['timestamp']}\t{offset}\n")
+        self.bytes_written += len(data)
+        return path
+
+    def close(self):
+        """Nothing is held open between writes; present for a uniform store interface."""
+        self._path = None
+
+
+def _apply(state: Dict[str, Dict[str, Dict[str, Any]]], record: Dict[str, Any]):
+    if record.get('keyframe'):
+        state.clear()
+    for sid, keys in record.get('removes', {}).items():
+        rows = state.get(sid, {})
+        for k in keys:
+            rows.pop(k, None)
+    for sid, rows in record.get('upserts', {}).items():
+        target = state.setdefault(sid, {})
+        for r in rows:
+            target[row_key(r)] = r
+
+
+def _rebuild(state, record) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """{stop_id: {row_key: row}} of the record's stops, with the tick's data_ts put back on the rows."""
+    data_ts = record.get('data_ts', {})
+    out = {}
+    for sid in record.get('stop_ids', []):
+        rows = state.get(sid, {})
+        if sid in data_ts:
+            rows = {k: dict(r, data_timestamp=data_ts[sid]) for k, r in rows.items()}
+        out[sid] = rows
+    return out
+
+
+def _verify(stops, record, path: str):
+    """Raise ValueError if the rebuilt stops do not match the record's content_hash."""
+    expected = record.get('content_hash')
+    if expected is None:
+        raise ValueError(f"{path}: snapshot {record.get('timestamp')} has no content hash")
+    if snapshot_hash(stops) != expected:
+        raise ValueError(f"{path}: snapshot {record.get('timestamp')} does not match its content hash")
+
+
+def _materialize(stops, record) -> Dict[str, Any]:
+    snap = {k: v for k, v in record.items()
+            if k not in ('upserts', 'removes', 'keyframe', 'content_hash', 'stop_ids', 'data_ts')}
+    snap['stops'] = [
+        {'stop_id': sid, 'rows': sorted(rows.values(), key=lambda r: (r.get('route') or '', r.get('eta_seq') or 0))}
+        for sid, rows in stops.items()
+    ]
+    return snap
+
+
+def iter_snapshots(path: str, start_offset: int = 0) -> Iterator[Dict[str, Any]]:
+    """Yield every full snapshot reconstructed from a delta file (from a keyframe offset)."""
+    state: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    with open(path, 'rb') as f:
+        f.seek(start_offset)
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            _apply(state, record)
+            stops = _rebuild(state, record)
+            _verify(stops, record, path)
+            yield _materialize(stops, record)
+
+
+def iter_snapshots_from(path: str, consumed: int = 0) -> Iterator[tuple]:
+    """Yield (end_offset, snapshot) for every complete line ending after byte `consumed`.
+
+    Replays from the last keyframe at or before `consumed` so the state is exact;
+    a partially written last line is left for the next call.
+    """
+    start = 0
+    for _, off in _keyframe_offsets(path):
+        if off <= consumed:
+            start = off
+    state: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    pos = start
+    with open(path, 'rb') as f:
+        f.seek(start)
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            pos += len(line)
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            _apply(state, record)
+            if pos > consumed:
+                stops = _rebuild(state, record)
+                _verify(stops, record, path)
+                yield pos, _materialize(stops, record)
+
+
+def _keyframe_offsets(path: str) -> List[tuple]:
+    idx = path + '.keyframes'
+    out = []
+    if os.path.exists(idx):
+        with open(idx, 'r', encoding='utf-8') as f:
+            for line in f:
+                ts, _, off = line.rstrip('\n').partition('\t')
+                if off:
+                    out.append((datetime.fromisoformat(ts), int(off)))
+    return out
+
+
+def load_snapshot(path: str, timestamp: str) -> Dict[str, Any] | None:
+    """Reconstruct the latest snapshot taken at or before `timestamp` (ISO string)."""
+    target = datetime.fromisoformat(timestamp)
+    offsets = _keyframe_offsets(path)
+    start = 0
+    if offsets:
+        i = bisect.bisect_right([ts for ts, _ in offsets], target) - 1
+        if i >= 0:
+            start = offsets[i][1]
+    found = None
+    for snap in iter_snapshots(path, start_offset=start):
+        if datetime.fromisoformat(snap['timestamp']) > target:
+            break
+        found = snap
+    return found
+
+
+def list_delta_files(out_dir: str) -> List[str]:
+    return sorted(
+        os.path.join(out_dir, f) for f in os.listdir(out_dir)
+        if f.startswith(DELTA_PREFIX) and f.endswith('.jsonl')
+    )
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+eta_dataset.py
+
+Columnar copy of the ETA history: a date-partitioned Parquet (or Arrow IPC)
+dataset, so analysis scripts load typed columns instead of re-parsing CSV
+strings on every run. Needs the optional `pyarrow` package
+(`pip install pyarrow`); nothing else in the folder depends on it.
+
+Layout: `{root}/date=YYYY-MM-DD/part-0.parquet`, one partition per HK-local
+snapshot date. Columns are ETA_FIELDS with native types:
+
+ - snapshot_ts, eta, data_timestamp: timestamp[us, Asia/Hong_Kong] (naive
+   inputs are taken as HK time, as everywhere else)
+ - queried_stop_id, route, direction: dictionary-encoded strings
+ - eta_seq: int16
+
+`export` normalizes CSV / JSONL / snapshot inputs (anything eta_warehouse can
+ingest) or a warehouse, drops duplicate (snapshot_ts, stop, route, eta_seq,
+eta) rows, and merges them into the partitions they touch, so exporting the
+same files again changes nothing. Rows without a parseable snapshot_ts are
+skipped. Readers filter by date partition, stop ids, routes and snapshot_ts
+window before anything is decoded.
+
+Usage:
+    python3 eta_dataset.py export monitor_outputs_1hr ../../Newdata/realtime_monitoring.csv
+    python3 eta_dataset.py export --warehouse eta_warehouse.sqlite --format arrow --out eta_dataset_ipc
+    python3 eta_dataset.py info
+
+    df = read_dataset('eta_dataset', stop_ids=['3F24CFF9046300D9'], start='2025-11-24T06:30')
+    for row in iter_rows('eta_dataset', start=..., end=...): ...
+"""
+from __future__ import annotations
+import argparse
+import glob
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List
+
+import pandas as pd
+
+from compressed_io import has_data_suffix
+from dedup_keys import first_occurrence_mask, hash_frame
+from eta_warehouse import ETA_FIELDS, expand_paths, file_rows
+from timestamps import HK_TZ, parse_ts
+
+DEFAULT_DATASET = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'eta_dataset')
+FORMATS = {'parquet': '.parquet', 'arrow': '.arrow'}
+HK_ZONE = 'Asia/Hong_Kong'
+TS_COLUMNS = ['snapshot_ts', 'eta', 'data_timestamp']
+CATEGORY_COLUMNS = ['queried_stop_id', 'route', 'direction']
+KEY_COLUMNS = ['snapshot_ts', 'queried_stop_id', 'route', 'eta_seq', 'eta']
+PARTITION = 'date'
+
+
+def _arrow():
+    try:
+        import pyarrow
+        import pyarrow.dataset
+    except ImportError:
+        raise RuntimeError('Parquet/Arrow datasets need the pyarrow package (pip install pyarrow)')
+    return pyarrow, pyarrow.dataset
+
+
+def arrow_schema():
+    pa, _ = _arrow()
+    ts = pa.timestamp('us', tz=HK_ZONE)
+    cat = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ('snapshot_ts', ts),
+        ('queried_stop_id', cat),
+        ('route', cat),
+        ('direction', cat),
+        ('eta', ts),
+        ('eta_seq', pa.int16()),
+        ('data_timestamp', ts),
+        (PARTITION, pa.string()),
+    ])
+
+
+def _partitioning():
+    pa, ds = _arrow()
+    return ds.partitioning(pa.schema([(PARTITION, pa.string())]), flavor='hive')
+
+
+def dataset_format(root: str) -> str:
+    """'arrow' if the dataset under root holds .arrow files, else 'parquet'."""
+    return 'arrow' if glob.glob(os.path.join(root, '*', '*' + FORMATS['arrow'])) else 'parquet'
+
+
+def is_dataset(path) -> bool:
+    path = str(path)
+    return os.path.isdir(path) and any(glob.glob(os.path.join(path, f'{PARTITION}=*', '*' + s)) for s in FORMATS.values())
+
+
+def _to_hk(values: pd.Series) -> pd.Series:
+    """ISO strings -> tz-aware HK timestamps (naive = HK time; unparseable -> NaT), parsing each distinct value once."""
+    parsed = {}
+    for v in values.dropna().unique():
+        try:
+            parsed[v] = parse_ts(str(v), HK_TZ)
+        except ValueError:
+            parsed[v] = None
+    return pd.to_datetime(values.map(parsed), utc=True).dt.tz_convert(HK_ZONE)
+
+
+def normalize_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """ETA_FIELDS (+ date partition) with native types from a summary/merged/realtime frame; duplicates dropped."""
+    df = df.rename(columns={'stop_id': 'queried_stop_id', 'dir': 'direction', 'bound': 'direction'})
+    df = df.loc[:, ~df.columns.duplicated()]
+    out = pd.DataFrame({c: (df[c] if c in df.columns else pd.Series(pd.NA, index=df.index)) for c in ETA_FIELDS})
+    for c in ('queried_stop_id', 'route', 'eta'):
+        out = out[out[c].notna() & (out[c].astype(str) != '')]
+    for c in TS_COLUMNS:
+        out[c] = _to_hk(out[c].astype('string'))
+    out = out[out['snapshot_ts'].notna() & out['eta'].notna()]
+    for c in CATEGORY_COLUMNS:
+        out[c] = out[c].astype('string').fillna('').astype('category')
+    out['eta_seq'] = pd.to_numeric(out['eta_seq'], errors='coerce').astype('Int16')
+    out[PARTITION] = out['snapshot_ts'].dt.strftime('%Y-%m-%d')
+    out = out[first_occurrence_mask(hash_frame(out, KEY_COLUMNS))]
+    return out.reset_index(drop=True)
+
+
+def load_frame(path: str) -> pd.DataFrame:
+    """Raw rows of one input file (CSV via pandas, everything else via eta_warehouse.file_rows)."""
+    name = os.path.basename(path)
+    if has_data_suffix(name, '.csv') and not name.startswith('snapshot_'):
+        return pd.read_csv(path, dtype=str)
+    return pd.DataFrame(list(file_rows(path)))
+
+
+def write_frame(frame: pd.DataFrame, root: str = DEFAULT_DATASET, fmt: str | None = None) -> Dict[str, int]:
+    """Merge normalized rows into the date partitions they touch; returns {date: rows in partition}."""
+    pa, ds = _arrow()
+    if is_dataset(root):
+        existing = dataset_format(root)
+        if fmt and fmt != existing:
+            raise ValueError(f'{root} is a {existing} dataset; cannot add {fmt} partitions to it')
+        fmt = existing
+    fmt = fmt or 'parquet'
+    counts = {}
+    for date, part in frame.groupby(PARTITION, sort=True, observed=True):
+        if is_dataset(root):
+            old = read_dataset(root, dates=[date])
+            if not old.empty:
+                old[PARTITION] = date
+                part = pd.concat([old, part], ignore_index=True)
+                for c in CATEGORY_COLUMNS:
+                    part[c] = part[c].astype('string').fillna('').astype('category')
+                part['eta_seq'] = part['eta_seq'].astype('Int16')
+                part = part[first_occurrence_mask(hash_frame(part, KEY_COLUMNS))]
+        part = part.sort_values(['snapshot_ts', 'queried_stop_id', 'route', 'eta_seq'], kind='stable')
+        table = pa.Table.from_pandas(part, schema=arrow_schema(), preserve_index=False)
+        ds.write_dataset(table, root, format='ipc' if fmt == 'arrow' else 'parquet', partitioning=_partitioning(),
+                         basename_template='part-{i}' + FORMATS[fmt], existing_data_behavior='delete_matching')
+        counts[date] = len(part)
+    return counts
+
+
+def _filter(start=None, end=None, stop_ids=None, routes=None, dates=None):
+    pa, ds = _arrow()
+    ts_type = pa.timestamp('us', tz=HK_ZONE)
+    conds = []
+    if dates is not None:
+        conds.append(ds.field(PARTITION).isin(list(dates)))
+    if start:
+        s = parse_ts(start, HK_TZ) if isinstance(start, str) else start
+        conds.append(ds.field(PARTITION) >= s.astimezone(HK_TZ).date().isoformat())
+        conds.append(ds.field('snapshot_ts') >= pa.scalar(s, type=ts_type))
+    if end:
+        e = parse_ts(end, HK_TZ) if isinstance(end, str) else end
+        conds.append(ds.field(PARTITION) <= e.astimezone(HK_TZ).date().isoformat())
+        conds.append(ds.field('snapshot_ts') <= pa.scalar(e, type=ts_type))
+    if stop_ids:
+        conds.append(ds.field('queried_stop_id').isin(list(stop_ids)))
+    if routes:
+        conds.append(ds.field('route').isin(list(routes)))
+    expr = None
+    for c in conds:
+        expr = c if expr is None else expr & c
+    return expr
+
+
+def open_dataset(root: str = DEFAULT_DATASET):
+    _, ds = _arrow()
+    fmt = dataset_format(root)
+    return ds.dataset(root, format='ipc' if fmt == 'arrow' else 'parquet', partitioning=_partitioning())
+
+
+def read_dataset(root: str = DEFAULT_DATASET, columns: List[str] | None = None, **filters) -> pd.DataFrame:
+    """ETA rows as a DataFrame (categorical stop/route/direction, tz-aware HK timestamps).
+
+    filters: start / end (ISO string, naive = HK, or datetime), stop_ids, routes, dates ('YYYY-MM-DD' partitions)."""
+    table = open_dataset(root).to_table(columns=columns or ETA_FIELDS, filter=_filter(**filters))
+    return table.to_pandas()
+
+
+def iter_rows(root: str = DEFAULT_DATASET, columns: List[str] | None = None, **filters) -> Iterator[Dict[str, Any]]:
+    """Stream rows as dicts (datetime / str / int values, None when missing), batch by batch."""
+    for batch in open_dataset(root).to_batches(columns=columns or ETA_FIELDS, filter=_filter(**filters)):
+        yield from batch.to_pylist()
+
+
+def export(paths: Iterable[str] = (), root: str = DEFAULT_DATASET, fmt: str | None = None,
+           warehouse: str | None = None, verbose: bool = True) -> Dict[str, int]:
+    """Normalize the input files (and/or a warehouse) and merge them into the dataset at root."""
+    frames = []
+    for path in expand_paths(paths):
+        try:
+            frames.append(normalize_frame(load_frame(path)))
+        except Exception as e:
+            print(f'Failed to read {path}: {e}')
+            continue
+        if verbose:
+            print(f'Read {path}: {len(frames[-1])} rows')
+    if warehouse:
+        import eta_warehouse
+        with eta_warehouse.connect(warehouse, readonly=True) as db:
+            frames.append(normalize_frame(eta_warehouse.query_df(db)))
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return {}
+    frame = pd.concat(frames, ignore_index=True)
+    for c in CATEGORY_COLUMNS:
+        frame[c] = frame[c].astype('string').astype('category')
+    frame = frame[first_occurrence_mask(hash_frame(frame, KEY_COLUMNS))]
+    return write_frame(frame, root, fmt)
+
+
+def info(root: str = DEFAULT_DATASET) -> Dict[str, Any]:
+    parts = {}
+    for d in sorted(glob.glob(os.path.join(root, f'{PARTITION}=*'))):
+        files = [f for f in glob.glob(os.path.join(d, '*')) if os.path.isfile(f)]
+        parts[os.path.basename(d).split('=', 1)[1]] = sum(os.path.getsize(f) for f in files)
+    rows = open_dataset(root).count_rows() if parts else 0
+    return {'format': dataset_format(root), 'rows': rows, 'partitions': len(parts), 'bytes': sum(parts.values()),
+            'dates': list(parts)}
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description='Date-partitioned Parquet/Arrow dataset of ETA rows')
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--out', default=DEFAULT_DATASET,
+                        help='Dataset directory (default: eta_dataset next to this script)')
+    sub = p.add_subparsers(dest='cmd', required=True)
+    pe = sub.add_parser('export', parents=[common],
+                        help='Merge CSV/JSON/JSONL files or directories (recursively) into the dataset')
+    pe.add_argument('paths', nargs='*')
+    pe.add_argument('--warehouse', help='Also export every row of this SQLite ETA warehouse')
+    pe.add_argument('--format', choices=list(FORMATS), default=None,
+                    help='File format for a new dataset (default: parquet, or whatever the dataset already uses; '
+                         'must match an existing dataset)')
+    sub.add_parser('info', parents=[common], help='Rows, partitions and size on disk')
+    args = p.parse_args(argv)
+
+    if args.cmd == 'export':
+        if not args.paths and not args.warehouse:
+            p.error('export needs input paths and/or --warehouse')
+        t0 = datetime.now()
+        try:
+            counts = export(args.paths, args.out, args.format, warehouse=args.warehouse)
+        except ValueError as e:
+            p.error(str(e))
+        print(f'Wrote {len(counts)} partitions ({sum(counts.values())} rows) to {args.out} '
+              f'in {(datetime.now() - t0).total_seconds():.1f}s')
+    else:
+        print(info(args.out))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+eta_warehouse.py
+
+Local SQLite warehouse for collected ETA rows, so analysis scripts can pull the
+slice they need with one indexed query instead of globbing and re-reading every
+monitor CSV.
+
+One canonical table `eta` (snapshot_ts, queried_stop_id, route, direction, eta,
+eta_seq, data_timestamp, source_id), indexed on (queried_stop_id, route,
+snapshot_ts) and on snapshot_ts. Timestamps are stored as ISO strings converted
+to +08:00 (naive inputs are taken as HK time), so text comparison is
+chronological and window queries use the index. Rows are deduplicated on
+(queried_stop_id, route, snapshot_ts, eta_seq, eta), the key merge_all_eta_data
+uses (a missing eta_seq is stored as 0).
+
+Ingestion reads CSVs with ETA columns (monitor summaries, merged/realtime
+exports, plain or .gz/.zst), per-tick `snapshot_*.json` files, delta logs
+(`snapshot_deltas_*.jsonl`) and log segments (`eta_log_*.jsonl[.gz]`).
+Directories are walked recursively. The `sources` table remembers each file's
+size, mtime and sha256: unchanged files are skipped on re-ingest, and a file
+with the same content as one already ingested (a copy, or a content_store
+view) is recorded without being read again.
+
+Usage:
+  python3 eta_warehouse.py ingest monitor_outputs_1hr ../../Newdata/realtime_monitoring.csv
+  python3 eta_warehouse.py query --stop-ids 3F24CFF9046300D9 --routes 272A \
+    --start 2025-11-24T06:30 --end 2025-11-24T08:30 --out slice.csv
+  python3 eta_warehouse.py stats
+
+From Python:
+    with connect(readonly=True) as db:
+        rows = query(db, stop_ids=['3F24CFF9046300D9'], start='2025-11-24T06:30')
+"""
+from __future__ import annotations
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List
+from urllib.request import pathname2url
+
+from compressed_io import has_data_suffix, iter_records, open_text
+from delta_snapshots import DELTA_PREFIX, iter_snapshots
+from file_catalogue import file_hash
+from snapshot_log import LOG_PREFIX, iter_segment, snapshot_rows
+from timestamps import HK_TZ, parse_ts
+
+DEFAULT_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'eta_warehouse.sqlite')
+ETA_FIELDS = ['snapshot_ts', 'queried_stop_id', 'route', 'direction', 'eta', 'eta_seq', 'data_timestamp']
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS sources (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    size INTEGER,
+    mtime REAL,
+    rows INTEGER,
+    ingested_at TEXT,
+    sha256 TEXT
+);
+CREATE TABLE IF NOT EXISTS eta (
+    snapshot_ts TEXT NOT NULL,
+    queried_stop_id TEXT NOT NULL,
+    route TEXT NOT NULL,
+    direction TEXT,
+    eta TEXT NOT NULL,
+    eta_seq INTEGER,
+    data_timestamp TEXT,
+    source_id INTEGER REFERENCES sources(id)
+);
+CREATE UNIQUE INDEX IF NOT EXISTS eta_stop_route_ts
+    ON eta (queried_stop_id, route, snapshot_ts, eta_seq, eta);
+CREATE INDEX IF NOT EXISTS eta_ts ON eta (snapshot_ts);
+CREATE INDEX IF NOT EXISTS sources_sha256 ON sources (sha256);
+'''
+
+
+@contextmanager
+def connect(path: str = DEFAULT_DB, readonly: bool = False) -> Iterator[sqlite3.Connection]:
+    """Open the warehouse, commit on success and close it on exit.
+
+    readonly=True is for readers: a missing file raises FileNotFoundError instead of creating an empty
+    warehouse, and the schema is not touched."""
+    if readonly:
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f'ETA warehouse not found: {path}')
+        db = sqlite3.connect(f'file:{pathname2url(os.path.abspath(path))}?mode=ro', uri=True)
+    else:
+        db = sqlite3.connect(path)
+    try:
+        db.row_factory = sqlite3.Row
+        if not readonly:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.executescript(SCHEMA)
+        with db:
+            yield db
+    finally:
+        db.close()
+
+
+def canonical_ts(s: str | None) -> str:
+    """ISO string in +08:00 (naive = HK time); unparseable values are kept as given."""
+    if not s:
+        return ''
+    try:
+        return parse_ts(s, HK_TZ).astimezone(HK_TZ).isoformat()
+    except ValueError:
+        return s
+
+
+def canonical_row(row: Dict[str, Any]) -> tuple | None:
+    """ETA_FIELDS tuple from a summary/merged/realtime row, or None without stop, route and eta."""
+    stop_id = row.get('queried_stop_id') or row.get('stop_id') or ''
+    route = row.get('route') or ''
+    eta = row.get('eta') or ''
+    if not (stop_id and route and eta):
+        return None
+    try:
+        seq = int(float(row.get('eta_seq')))
+    except (TypeError, ValueError):
+        seq = 0
+    return (
+        canonical_ts(row.get('snapshot_ts') or row.get('timestamp')),
+        str(stop_id),
+        str(route),
+        row.get('direction') or row.get('dir') or row.get('bound') or '',
+        canonical_ts(eta),
+        seq,
+        canonical_ts(row.get('data_timestamp')),
+    )
+
+
+def file_rows(path: str) -> Iterator[Dict[str, Any]]:
+    """Summary-style rows from any supported file type."""
+    name = os.path.basename(path)
+    if name.startswith(LOG_PREFIX):
+        yield from iter_segment(path)
+    elif name.startswith(DELTA_PREFIX):
+        for snap in iter_snapshots(path):
+            yield from snapshot_rows(snap)
+    elif name.startswith('snapshot_') and has_data_suffix(name, '.json'):
+        with open_text(path) as f:
+            yield from snapshot_rows(json.load(f))
+    else:
+        yield from iter_records(path)
+
+
+def is_ingestible(path: str) -> bool:
+    name = os.path.basename(path)
+    if name.startswith(LOG_PREFIX) or name.startswith(DELTA_PREFIX):
+        return has_data_suffix(name, '.jsonl')
+    if name.startswith('snapshot_'):
+        return has_data_suffix(name, '.json')
+    return has_data_suffix(name, '.csv')
+
+
+def expand_paths(paths: Iterable[str]) -> List[str]:
+    out = []
+    for p in paths:
+        if os.path.isdir(p):
+            for root, _, files in os.walk(p):
+                out.extend(os.path.join(root, f) for f in files if is_ingestible(f))
+        elif os.path.exists(p):
+            out.append(p)
+    return sorted(set(os.path.abspath(p) for p in out))
+
+
+def ingest_file(db: sqlite3.Connection, path: str, force: bool = False) -> int | None:
+    """Load one file; returns rows inserted, or None when it is unchanged since the last ingest or has the
+    same content (sha256) as a file already ingested."""
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    prev = db.execute('SELECT id, size, mtime FROM sources WHERE path = ?', (path,)).fetchone()
+    if prev and not force and prev['size'] == st.st_size and prev['mtime'] == st.st_mtime:
+        return None
+    digest = file_hash(path)
+    twin = db.execute('SELECT id FROM sources WHERE sha256 = ? AND path != ? AND rows IS NOT NULL',
+                      (digest, path)).fetchone()
+    with db:
+        if prev:
+            source_id = prev['id']
+        else:
+            source_id = db.execute('INSERT INTO sources (path) VALUES (?)', (path,)).lastrowid
+        if twin and not force:
+            # a copy of a file already loaded (e.g. a csv_collection mirror): its rows are all there
+            db.execute('UPDATE sources SET size = ?, mtime = ?, sha256 = ?, rows = COALESCE(rows, 0) WHERE id = ?',
+                       (st.st_size, st.st_mtime, digest, source_id))
+            return None
+        before = db.total_changes
+        batch = []
+        for row in file_rows(path):
+            rec = canonical_row(row)
+            if rec is not None:
+                batch.append(rec + (source_id,))
+            if len(batch) >= 5000:
+                db.executemany('INSERT OR IGNORE INTO eta VALUES (?, ?, ?, ?, ?, ?, ?, ?)', batch)
+                batch = []
+        db.executemany('INSERT OR IGNORE INTO eta VALUES (?, ?, ?, ?, ?, ?, ?, ?)', batch)
+        inserted = db.total_changes - before
+        db.execute('UPDATE sources SET size = ?, mtime = ?, sha256 = ?, rows = COALESCE(rows, 0) + ?, ingested_at = ? '
+                   'WHERE id = ?', (st.st_size, st.st_mtime, digest, inserted, datetime.now().astimezone().isoformat(),
+                                    source_id))
+    return inserted
+
+
+def ingest(db: sqlite3.Connection, paths: Iterable[str], force: bool = False, verbose: bool = True) -> Dict[str, int]:
+    """Ingest files and directories (recursively); returns counts of files loaded/skipped/failed and rows."""
+    counts = {'files': 0, 'skipped': 0, 'failed': 0, 'rows': 0}
+    for path in expand_paths(paths):
+        try:
+            n = ingest_file(db, path, force=force)
+        except Exception as e:
+            counts['failed'] += 1
+            print(f'Failed to ingest {path}: {e}', file=sys.stderr)
+            continue
+        if n is None:
+            counts['skipped'] += 1
+            continue
+        counts['files'] += 1
+        counts['rows'] += n
+        if verbose:
+            print(f'Ingested {path}: {n} new rows')
+    return counts
+
+
+def query(db: sqlite3.Connection, stop_ids: Iterable[str] | None = None, routes: Iterable[str] | None = None,
+          start: str | None = None, end: str | None = None, with_source: bool = False) -> List[Dict[str, Any]]:
+    """ETA rows for the given stops/routes with start <= snapshot_ts <= end, ordered by snapshot_ts."""
+    cols = ', '.join(f'e.{c}' for c in ETA_FIELDS)
+    sql = f'SELECT {cols}' + (', s.path AS source_file' if with_source else '') + ' FROM eta e'
+    if with_source:
+        sql += ' LEFT JOIN sources s ON s.id = e.source_id'
+    where, args = [], []
+    if stop_ids:
+        stop_ids = list(stop_ids)
+        where.append(f"e.queried_stop_id IN ({', '.join('?' * len(stop_ids))})")
+        args.extend(stop_ids)
+    if routes:
+        routes = list(routes)
+        where.append(f"e.route IN ({', '.join('?' * len(routes))})")
+        args.extend(routes)
+    if start:
+        where.append('e.snapshot_ts >= ?')
+        args.append(canonical_ts(start))
+    if end:
+        where.append('e.snapshot_ts <= ?')
+        args.append(canonical_ts(end))
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    sql += ' ORDER BY e.snapshot_ts, e.queried_stop_id, e.route, e.eta_seq'
+    return [dict(r) for r in db.execute(sql, args)]
+
+
+def query_df(db: sqlite3.Connection, **filters):
+    """`query` as a pandas DataFrame (columns ETA_FIELDS, plus source_file with with_source=True)."""
+    import pandas as pd
+    rows = query(db, **filters)
+    cols = ETA_FIELDS + (['source_file'] if filters.get('with_source') else [])
+    return pd.DataFrame(rows, columns=cols)
+
+
+def stats(db: sqlite3.Connection) -> Dict[str, Any]:
+    row = db.execute("SELECT COUNT(*) AS n, MIN(NULLIF(snapshot_ts, '')) AS first, MAX(snapshot_ts) AS last, "
+                     'COUNT(DISTINCT queried_stop_id) AS stops, COUNT(DISTINCT route) AS routes FROM eta').fetchone()
+    out = dict(row)
+    out['sources'] = db.execute('SELECT COUNT(*) FROM sources').fetchone()[0]
+    return out
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description='Local SQLite warehouse of collected ETA rows')
+    p.add_argument('--db', default=DEFAULT_DB, help='Warehouse file (default: eta_warehouse.sqlite next to this script)')
+    sub = p.add_subparsers(dest='cmd', required=True)
+    pi = sub.add_parser('ingest', help='Load CSV/JSON/JSONL files or directories (recursively)')
+    pi.add_argument('paths', nargs='+')
+    pi.add_argument('--force', action='store_true', help='Re-read files even if unchanged since the last ingest')
+    pq = sub.add_parser('query', help='Print or export a slice of the ETA table')
+    pq.add_argument('--stop-ids', nargs='+')
+    pq.add_argument('--routes', nargs='+')
+    pq.add_argument('--start', help='Earliest snapshot_ts (ISO; naive = HK time)')
+    pq.add_argument('--end', help='Latest snapshot_ts (ISO; naive = HK time)')
+    pq.add_argument('--out', help='Write the rows to this CSV instead of printing a count')
+    sub.add_parser('stats', help='Row count, time span and number of stops/routes/sources')
+    args = p.parse_args(argv)
+    if args.cmd != 'ingest' and not os.path.isfile(args.db):
+        p.error(f'ETA warehouse not found: {args.db}')
+
+    with connect(args.db, readonly=args.cmd != 'ingest') as db:
+        if args.cmd == 'ingest':
+            counts = ingest(db, args.paths, force=args.force)
+            print(f'Done: {counts}; warehouse: {stats(db)}')
+        elif args.cmd == 'query':
+            rows = query(db, stop_ids=args.stop_ids, routes=args.routes, start=args.start, end=args.end)
+            if args.out:
+                with open(args.out, 'w', encoding='utf-8', newline='') as f:
+                    w = csv.DictWriter(f, fieldnames=ETA_FIELDS)
+                    w.writeheader()
+                    w.writerows(rows)
+                print(f'Wrote {len(rows)} rows to {args.out}')
+            else:
+                print(f'{len(rows)} rows')
+                for r in rows[:20]:
+                    print(r)
+        else:
+            print(stats(db))
+
+
+if __name__ == '__main__':
+    main()
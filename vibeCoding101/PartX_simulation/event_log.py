@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+event_log.py
+
+Buffered structured event log shared by `tools/run_monitor_window.py`
+(`monitor_log.csv`) and the cyberdefender crawler (Part3WebCrawler).
+
+The file is opened once and kept open. Records are buffered in memory and
+written out when the buffer reaches `flush_bytes`, when `flush_interval_sec`
+has passed (a small background thread makes sure idle buffers still reach
+disk), and on `close()` / interpreter exit. High-frequency monitors and crawls
+therefore stop paying an open/append/close per event.
+
+Formats, chosen from the file suffix unless `fmt` is given:
+ - `.csv`: header written once; fields quoted properly (error messages with commas stay in one column)
+ - `.jsonl`: one JSON object per line
+ - anything else (e.g. `.log`): plain text lines via `write_line`
+
+If an existing CSV has a different header, it is moved aside to
+`{stem}.{YYYYmmdd_HHMMSS}{suffix}` and a fresh file is started, so columns never
+shift under old rows.
+
+Usage:
+    log = EventLogWriter('monitor_log.csv', fields=['ts', 'url', 'status', 'latency_ms'])
+    log.write({'ts': ts, 'url': u, 'status': 200, 'latency_ms': 41.7})
+    log.close()
+"""
+from __future__ import annotations
+import atexit
+import csv
+import io
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Any, Dict, List
+
+
+class EventLogWriter:
+    def __init__(self, path, fields: List[str] | None = None, fmt: str | None = None,
+                 flush_interval_sec: float | None = 1.0, flush_bytes: int = 64 * 1024):
+        self.path = str(path)
+        suffix = os.path.splitext(self.path)[1].lower()
+        self.fmt = fmt or {'.csv': 'csv', '.jsonl': 'jsonl'}.get(suffix, 'text')
+        if self.fmt == 'csv' and not fields:
+            raise ValueError('CSV event logs need a field list')
+        self.fields = list(fields or [])
+        self.flush_interval = flush_interval_sec
+        self.flush_bytes = flush_bytes
+        self._buf: List[str] = []
+        self._buf_bytes = 0
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self.records = 0
+        self.flushes = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        if self.fmt == 'csv':
+            self._rotate_if_header_changed()
+        new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        self._fh = open(self.path, 'a', encoding='utf-8', newline='')
+        if self.fmt == 'csv' and new_file:
+            self._append(self._csv_line(self.fields))
+
+        atexit.register(self.close)
+        self._flusher = None
+        if flush_interval_sec:
+            self._flusher = threading.Thread(target=self._flush_periodically, daemon=True)
+            self._flusher.start()
+
+    def _rotate_if_header_changed(self):
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return
+        with open(self.path, 'r', encoding='utf-8', newline='') as f:
+            header = next(csv.reader(f), [])
+        if header != self.fields:
+            stem, suffix = os.path.splitext(self.path)
+            os.replace(self.path, f"{stem}.{datetime.now().strftime('%Y%m%d_%H%M%S')}{suffix}")
+
+    def _csv_line(self, values) -> str:
+        out = io.StringIO()
+        csv.writer(out).writerow(values)
+        return out.getvalue()
+
+    def _append(self, line: str):
+        with self._lock:
+            self._buf.append(line)
+            self._buf_bytes += len(line)
+            self.records += 1
+            if self._buf_bytes >= self.flush_bytes:
+                self._flush_locked()
+
+    def write(self, record: Dict[str, Any]):
+        """Buffer one structured record (CSV: missing fields are left empty, extra ones dropped)."""
+        if self.fmt == 'csv':
+            self._append(self._csv_line(['' if record.get(k) is None else record.get(k) for k in self.fields]))
+        elif self.fmt == 'jsonl':
+            self._append(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+        else:
+            self._append(' '.join(f'{k}={v}' for k, v in record.items()) + '\n')
+
+    def write_line(self, text: str):
+        """Buffer one plain text line."""
+        self._append(text + '\n')
+
+    def _flush_locked(self):
+        if self._buf and not self._fh.closed:
+            self._fh.write(''.join(self._buf))
+            self._fh.flush()
+            self.flushes += 1
+        self._buf = []
+        self._buf_bytes = 0
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_periodically(self):
+        while not self._closed.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        with self._lock:
+            self._flush_locked()
+            self._fh.close()
+        atexit.unregister(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -9,39 +9,27 @@ Usage example:
     --provider kmb
 
 Outputs JSON and CSV files into the same folder with a timestamp.
+
+Any number of stop ids may be given; the ETAs are fetched with the fewest
+stop-eta / route-eta calls that cover every (stop, route) pair (poll_planner.py).
 """
 import argparse
-import requests
 import os
 import json
 from datetime import datetime
 import pandas as pd
 
-BASES = {
-    'kmb': 'https://data.etabus.gov.hk',
-    'citybus': 'https://rt.data.gov.hk'
-}
+from poll_planner import build_plan, execute_plan, plan_summary
+from transit_client import get_client, normalize_eta_row
 
 
 def fetch_stop_meta(stop_id, provider='kmb'):
-    if provider == 'kmb':
-        url = f"{BASES['kmb']}/v1/transport/kmb/stop/{stop_id}"
-    else:
-        url = f"{BASES['citybus']}/v1/transport/citybus-nwfb/stop/{stop_id}"
-    r = requests.get(url, timeout=10)
-    r.raise_for_status()
-    return r.json().get('data')
+    return get_client(provider).stop(stop_id)
 
 
 def fetch_stop_eta(stop_id, provider='kmb'):
-    if provider == 'kmb':
-        url = f"{BASES['kmb']}/v1/transport/kmb/stop-eta/{stop_id}"
-    else:
-        # Citybus ETA endpoints sometimes require route parameters; we'll try the stop-eta path
-        url = f"{BASES['citybus']}/v1/transport/citybus-nwfb/stop-eta/{stop_id}"
-    r = requests.get(url, timeout=10)
-    r.raise_for_status()
-    return r.json().get('data', [])
+    # Citybus ETA endpoints sometimes require route parameters; we'll try the stop-eta path
+    return get_client(provider).stop_eta(stop_id)
 
 
 def filter_routes(eta_rows, routes):
@@ -56,7 +44,7 @@ def filter_routes(eta_rows, routes):
 
 def main():
     p = argparse.ArgumentParser()
-    p.add_argument('--stop-ids', nargs=2, required=True, help='Two stop ids to compare')
+    p.add_argument('--stop-ids', nargs='+', required=True, help='Stop ids to compare (two or more)')
     p.add_argument('--routes', nargs='+', required=True, help='One or more route numbers to filter (e.g. 272A)')
     p.add_argument('--provider', choices=['kmb','citybus'], default='kmb')
     p.add_argument('--outdir', default=os.path.dirname(__file__))
@@ -65,6 +53,15 @@ def main():
     out_rows = []
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
 
+    client = get_client(args.provider)
+    try:
+        plan = build_plan(client, args.stop_ids, args.routes, provider=args.provider)
+        print(f'Poll plan: {plan_summary(plan)}')
+        planned = execute_plan(client, plan)
+    except Exception as e:
+        print(f'Warning: failed to plan route-level requests ({e}); fetching stop by stop')
+        planned = None
+
     for sid in args.stop_ids:
         try:
             meta = fetch_stop_meta(sid, provider=args.provider)
@@ -72,28 +69,31 @@ def main():
             print(f'Warning: failed to fetch metadata for {sid}: {e}')
             meta = None
 
-        try:
-            etas = fetch_stop_eta(sid, provider=args.provider)
-        except Exception as e:
-            print(f'Warning: failed to fetch ETA for {sid}: {e}')
-            etas = []
-
-        filtered = filter_routes(etas, args.routes)
+        if planned is not None:
+            filtered = planned[sid]
+        else:
+            try:
+                etas = fetch_stop_eta(sid, provider=args.provider)
+            except Exception as e:
+                print(f'Warning: failed to fetch ETA for {sid}: {e}')
+                etas = []
+            filtered = filter_routes(etas, args.routes)
         for row in filtered:
+            norm = normalize_eta_row(row, sid)
             out = {
                 'queried_stop_id': sid,
                 'stop_name_en': meta.get('name_en') if meta else None,
                 'stop_name_tc': meta.get('name_tc') if meta else None,
-                'route': row.get('route'),
-                'direction': row.get('dir') or row.get('direction') or row.get('bound'),
-                'eta': row.get('eta'),
-                'eta_seq': row.get('eta_seq'),
-                'data_timestamp': row.get('data_timestamp')
+                'route': norm['route'],
+                'direction': norm['direction'],
+                'eta': norm['eta'],
+                'eta_seq': norm['eta_seq'],
+                'data_timestamp': norm['data_timestamp']
             }
             out_rows.append(out)
 
     if not out_rows:
-        print('No ETA rows found for the specified routes at the two stops.')
+        print('No ETA rows found for the specified routes at the given stops.')
         return
 
     out_json = os.path.join(args.outdir, f'route_pair_eta_{timestamp}.json')
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+file_catalogue.py
+
+Self-maintaining catalogue of ETA data files (CSV / JSONL, plain or .gz/.zst)
+with per-file statistics, so analysis tools can skip files that cannot hold
+rows for a requested time window or stop set without opening them.
+
+Each entry (keyed by absolute path, stored in `.cache/file_catalogue.json`)
+records size, mtime, sha256 content hash, row count, columns, min/max
+snapshot_ts (ISO, +08:00; naive values are HK time), and the sorted stop ids
+and routes seen. `refresh(paths)` brings entries up to date incrementally:
+
+ - size and mtime unchanged: nothing is read
+ - changed or new: the file is hashed; if another catalogued file has the same
+   content (e.g. the csv_collection copies) its statistics are reused,
+   otherwise the file is scanned once
+ - hashing and scanning run in a process pool (parallel_ingest.map_files)
+
+Tools can also keep their own per-file results in an entry (`extras`, computed
+by a function of the path during the same refresh and cleared when the file
+changes), e.g. analyze_monitoring_dates' date summary. Like the statistics,
+extras are shared between files with the same content, so they must not
+depend on the file's name or location.
+
+`select(start=, end=, stop_ids=, routes=)` returns the catalogued files that
+may hold matching rows. A file is dropped only when its statistics rule it
+out; a file without the filtered column cannot match that filter.
+
+Usage:
+    python3 file_catalogue.py scan monitor_outputs_1hr ../../Newdata
+    python3 file_catalogue.py select --start 2025-11-24T06:30 --end 2025-11-24T08:30 --stop-ids 3F24CFF9046300D9
+
+    cat = FileCatalogue()
+    cat.refresh(paths)
+    paths = cat.select(paths, start='2025-11-24T06:30', stop_ids=['3F24CFF9046300D9'])
+    cat.save()
+"""
+from __future__ import annotations
+import argparse
+import hashlib
+import json
+import os
+from typing import Any, Callable, Dict, Iterable, List
+
+from compressed_io import has_data_suffix, iter_records
+from parallel_ingest import DEFAULT_WORKERS, map_files
+from schema_registry import resolve_columns
+from timestamps import HK_TZ, TimestampParser, parse_ts
+
+DEFAULT_CATALOGUE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'file_catalogue.json')
+CATALOGUE_VERSION = 1
+STAT_FIELDS = ['rows', 'columns', 'min_ts', 'max_ts', 'stops', 'routes']
+
+
+def file_hash(path: str, chunk_size: int = 1 << 20) -> str:
+    """sha256 hex digest of the file's bytes (as stored, i.e. of the compressed file)."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def is_data_file(path: str) -> bool:
+    return has_data_suffix(os.path.basename(path), '.csv', '.jsonl')
+
+
+def expand_paths(paths: Iterable[str]) -> List[str]:
+    """Absolute paths of the data files given directly or found (recursively) in the given directories."""
+    out = []
+    for p in paths:
+        if os.path.isdir(p):
+            for root, _, files in os.walk(p):
+                out.extend(os.path.join(root, f) for f in files if is_data_file(f))
+        elif os.path.exists(p):
+            out.append(p)
+    return sorted(set(os.path.abspath(p) for p in out))
+
+
+def scan_file(path: str) -> Dict[str, Any]:
+    """STAT_FIELDS for one file, from a single streaming pass."""
+    rows = 0
+    columns: List[str] = []
+    mapping: Dict[str, str] = {}
+    stops, routes = set(), set()
+    lo = hi = None
+    ts = TimestampParser(default_tz=HK_TZ)
+    for rec in iter_records(path):
+        if rows == 0:
+            columns = list(rec.keys())
+            mapping = resolve_columns(columns)
+        rows += 1
+        if 'stop_id' in mapping and rec.get(mapping['stop_id']):
+            stops.add(str(rec[mapping['stop_id']]))
+        if 'route' in mapping and rec.get(mapping['route']):
+            routes.add(str(rec[mapping['route']]))
+        if 'snapshot_ts' in mapping and rec.get(mapping['snapshot_ts']):
+            try:
+                dt = ts(str(rec[mapping['snapshot_ts']]))
+            except ValueError:
+                continue
+            if lo is None or dt < lo:
+                lo = dt
+            if hi is None or dt > hi:
+                hi = dt
+    return {
+        'rows': rows,
+        'columns': columns,
+        'min_ts': lo.astimezone(HK_TZ).isoformat() if lo else None,
+        'max_ts': hi.astimezone(HK_TZ).isoformat() if hi else None,
+        'stops': sorted(stops) if 'stop_id' in mapping else None,
+        'routes': sorted(routes) if 'route' in mapping else None,
+    }
+
+
+def _scan_task(task):
+    path, with_stats, extras = task
+    out = scan_file(path) if with_stats else {}
+    out['extra'] = {name: func(path) for name, func in extras}
+    return out
+
+
+class FileCatalogue:
+    def __init__(self, path: str = DEFAULT_CATALOGUE):
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self._dirty = False
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('version') == CATALOGUE_VERSION:
+                    self.entries = data.get('files', {})
+            except (OSError, ValueError):
+                pass
+
+    def get(self, path: str) -> Dict[str, Any] | None:
+        return self.entries.get(os.path.abspath(path))
+
+    def is_current(self, path: str, extras: Iterable[str] = ()) -> bool:
+        entry = self.get(path)
+        if entry is None:
+            return False
+        st = os.stat(path)
+        return (entry['size'] == st.st_size and entry['mtime'] == st.st_mtime
+                and all(name in entry['extra'] for name in extras))
+
+    def refresh(self, paths: Iterable[str], workers: int | None = DEFAULT_WORKERS,
+                extras: Dict[str, Callable[[str], Any]] | None = None) -> Dict[str, int]:
+        """Bring the entries for paths (files or directories) up to date; returns counts of what was done.
+
+        extras maps a name to a module-level function of the path whose (JSON-serializable) result is
+        stored in entry['extra'][name]."""
+        extras = extras or {}
+        counts = {'unchanged': 0, 'reused': 0, 'scanned': 0, 'failed': 0}
+        stale = []
+        for p in expand_paths(paths):
+            if self.is_current(p, extras):
+                counts['unchanged'] += 1
+            else:
+                stale.append(p)
+        by_hash = {e['sha256']: e for e in self.entries.values() if 'rows' in e}
+        todo, pending, copies = [], {}, {}
+        for p, digest, error in map_files(file_hash, stale, workers=workers):
+            if error:
+                counts['failed'] += 1
+                continue
+            st = os.stat(p)
+            old = self.entries.get(p)
+            twin = old if old is not None and old.get('sha256') == digest and 'rows' in old else by_hash.get(digest)
+            entry = {'size': st.st_size, 'mtime': st.st_mtime, 'sha256': digest, 'extra': {}}
+            if twin is not None:
+                entry.update({k: twin[k] for k in STAT_FIELDS})
+                entry['extra'] = dict(twin.get('extra', {}))
+            missing = tuple((name, func) for name, func in extras.items() if name not in entry['extra'])
+            if twin is None and digest in copies:
+                # same content as a file already queued in this refresh: copy its results afterwards
+                copies[digest].append((p, entry))
+            elif twin is None or missing:
+                copies.setdefault(digest, [])
+                todo.append((p, twin is None, missing))
+                pending[p] = entry
+            else:
+                counts['reused'] += 1
+                self.entries[p] = entry
+                by_hash[digest] = entry
+            self._dirty = True
+        for (p, _, _), result, error in map_files(_scan_task, todo, workers=workers):
+            if error:
+                counts['failed'] += 1
+                continue
+            entry = pending[p]
+            extra = result.pop('extra')
+            entry.update(result)
+            entry['extra'].update(extra)
+            self.entries[p] = entry
+            by_hash[entry['sha256']] = entry
+            counts['scanned'] += 1
+            for q, copy in copies.get(entry['sha256'], []):
+                copy.update({k: entry[k] for k in STAT_FIELDS})
+                copy['extra'] = dict(entry['extra'])
+                self.entries[q] = copy
+                counts['reused'] += 1
+        return counts
+
+    def may_match(self, entry: Dict[str, Any], start=None, end=None, stop_ids=None, routes=None) -> bool:
+        """False only if the entry's statistics rule out rows for the filters."""
+        if start is not None or end is not None:
+            if entry.get('min_ts') is None:
+                return False
+            if start is not None and parse_ts(entry['max_ts']) < start:
+                return False
+            if end is not None and parse_ts(entry['min_ts']) > end:
+                return False
+        if stop_ids is not None and not set(stop_ids).intersection(entry.get('stops') or ()):
+            return False
+        if routes is not None and not set(routes).intersection(entry.get('routes') or ()):
+            return False
+        return True
+
+    def select(self, paths: Iterable[str] | None = None, start: str | None = None, end: str | None = None,
+               stop_ids: Iterable[str] | None = None, routes: Iterable[str] | None = None,
+               workers: int | None = DEFAULT_WORKERS) -> List[str]:
+        """Files (from paths, refreshed first, or else the whole catalogue) that may hold matching rows."""
+        if paths is not None:
+            self.refresh(paths, workers=workers)
+            candidates = expand_paths(paths)
+        else:
+            candidates = sorted(self.entries)
+        start_dt = parse_ts(start, HK_TZ) if start else None
+        end_dt = parse_ts(end, HK_TZ) if end else None
+        stop_ids = set(stop_ids) if stop_ids is not None else None
+        routes = set(routes) if routes is not None else None
+        return [p for p in candidates
+                if p in self.entries and self.may_match(self.entries[p], start_dt, end_dt, stop_ids, routes)]
+
+    def prune(self) -> int:
+        """Forget files that no longer exist; returns how many were dropped."""
+        gone = [p for p in self.entries if not os.path.exists(p)]
+        for p in gone:
+            del self.entries[p]
+        self._dirty = self._dirty or bool(gone)
+        return len(gone)
+
+    def save(self):
+        if not self._dirty:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'version': CATALOGUE_VERSION, 'files': self.entries}, f)
+        os.replace(tmp, self.path)
+        self._dirty = False
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description='Catalogue of ETA data files with per-file statistics')
+    p.add_argument('--catalogue', default=DEFAULT_CATALOGUE, help='Catalogue file (default: .cache/file_catalogue.json)')
+    p.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='Processes for hashing/scanning files')
+    sub = p.add_subparsers(dest='cmd', required=True)
+    ps = sub.add_parser('scan', help='Add or update files / directories (recursively)')
+    ps.add_argument('paths', nargs='+')
+    pl = sub.add_parser('select', help='List catalogued files that may hold rows for the filters')
+    pl.add_argument('paths', nargs='*', help='Limit to these files / directories (refreshed first)')
+    pl.add_argument('--start', help='Earliest snapshot_ts (ISO; naive = HK time)')
+    pl.add_argument('--end', help='Latest snapshot_ts (ISO; naive = HK time)')
+    pl.add_argument('--stop-ids', nargs='+')
+    pl.add_argument('--routes', nargs='+')
+    args = p.parse_args(argv)
+
+    cat = FileCatalogue(args.catalogue)
+    if args.cmd == 'scan':
+        counts = cat.refresh(args.paths, workers=args.workers)
+        dropped = cat.prune()
+        print(f'Done: {counts}, {dropped} missing files dropped; {len(cat.entries)} files catalogued')
+    else:
+        selected = cat.select(args.paths or None, start=args.start, end=args.end, stop_ids=args.stop_ids,
+                              routes=args.routes, workers=args.workers)
+        for path in selected:
+            print(path)
+        print(f'{len(selected)} of {len(cat.entries)} catalogued files may match')
+    cat.save()
+
+
+if __name__ == '__main__':
+    main()
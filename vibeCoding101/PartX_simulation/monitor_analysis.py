@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 """產生監控資料的分析圖表
 
-輸入：monitor_outputs_60min/monitor_summary_*.csv
+輸入：monitor_outputs_60min/monitor_summary_*.csv（或 --dataset 指定的 eta_dataset 目錄，需 pyarrow）
 輸出：monitor_outputs_60min/analysis/
 
 會產生：
@@ -12,22 +12,41 @@
  - analysis_summary.json
 """
 from pathlib import Path
+import argparse
 import pandas as pd
 import matplotlib.pyplot as plt
 import json
 
+from eta_dataset import read_dataset
+
 BASE = Path(__file__).parent / 'monitor_outputs_60min'
 ANALYSIS_DIR = BASE / 'analysis'
 ANALYSIS_DIR.mkdir(parents=True, exist_ok=True)
 
-# 找最新的 monitor_summary CSV
-csvs = sorted(BASE.glob('monitor_summary_*.csv'))
-if not csvs:
-    raise SystemExit('No monitor_summary CSV found in ' + str(BASE))
-csv_path = csvs[-1]
-print('Using', csv_path.name)
+ap = argparse.ArgumentParser(description='Charts and summary for monitored ETA data')
+ap.add_argument('--dataset', help='Read an eta_dataset directory (Parquet/Arrow, needs pyarrow) instead of the latest CSV')
+ap.add_argument('--stop-ids', nargs='+', help='Dataset only: restrict to these stops')
+ap.add_argument('--start', help='Dataset only: earliest snapshot_ts (ISO; naive = HK time)')
+ap.add_argument('--end', help='Dataset only: latest snapshot_ts (ISO; naive = HK time)')
+args = ap.parse_args()
+
+if args.dataset:
+    # typed columns: timestamps are already tz-aware, no parsing needed
+    df = read_dataset(args.dataset, stop_ids=args.stop_ids, start=args.start, end=args.end)
+    if df.empty:
+        raise SystemExit('No rows in dataset ' + args.dataset)
+    df['queried_stop_id'] = df['queried_stop_id'].astype(str)
+    df['eta_seq'] = df['eta_seq'].astype('float64')
+    print('Using dataset', args.dataset)
+else:
+    # 找最新的 monitor_summary CSV
+    csvs = sorted(BASE.glob('monitor_summary_*.csv'))
+    if not csvs:
+        raise SystemExit('No monitor_summary CSV found in ' + str(BASE))
+    csv_path = csvs[-1]
+    print('Using', csv_path.name)
 
-df = pd.read_csv(csv_path, parse_dates=['snapshot_ts','eta','data_timestamp'])
+    df = pd.read_csv(csv_path, parse_dates=['snapshot_ts','eta','data_timestamp'])
 # ensure tz-aware
 if df['snapshot_ts'].dt.tz is None:
     df['snapshot_ts'] = pd.to_datetime(df['snapshot_ts']).dt.tz_localize('UTC')
@@ -39,8 +58,13 @@ df['snapshot_local'] = df['snapshot_ts'].dt.tz_convert('Asia/Hong_Kong')
 df['eta_local'] = df['eta'].dt.tz_convert('Asia/Hong_Kong')
 
 df['wait_s'] = (df['eta_local'] - df['snapshot_local']).dt.total_seconds()
-# floor snapshot to minute for per-minute aggregation
-df['snapshot_min'] = df['snapshot_local'].dt.floor('T')
+# floor snapshot to minute for per-minute aggregation; snapshots taken on the
+# TickScheduler grid carry `tick_ts`, which is evenly spaced even when fetches ran late
+bucket_ts = df['snapshot_local']
+if 'tick_ts' in df.columns and df['tick_ts'].notna().any():
+    tick_local = pd.to_datetime(df['tick_ts'], utc=True, errors='coerce').dt.tz_convert('Asia/Hong_Kong')
+    bucket_ts = tick_local.fillna(df['snapshot_local'])
+df['snapshot_min'] = bucket_ts.dt.floor('T')
 
 summary = {}
 # per-stop analyses
@@ -2,7 +2,7 @@
 """
 monitor_two_stations.py
 
-Continuously poll KMB (or Citybus) stop-eta endpoints for two stops and
+Continuously poll KMB (or Citybus) stop-eta endpoints for two (or more) stops and
 capture snapshots of the realtime ETA situation for the next hour (or user-provided horizon).
 
 The script saves:
@@ -17,99 +17,309 @@ Usage (example):
     --interval-sec 30
 
 For quick tests use smaller horizon/interval (e.g. --horizon-min 1 --interval-sec 5).
+
+To monitor many stops per tick, pass any number of ids and enable the asyncio
+fan-out mode, which fetches all stops concurrently over one keep-alive pool
+(the shared `transit_client.TransitClient`):
+  python3 monitor_two_stations.py --stop-ids ID1 ID2 ID3 ... --concurrency 16
+
+For corridor studies, `--routes 272A 272X` keeps only those routes and polls
+through a plan that mixes stop-eta and route-eta calls so that each tick makes
+the fewest upstream requests covering every (stop, route) pair (poll_planner.py).
+
+`--adaptive` polls each stop on its own schedule: every `--interval-sec` while its
+next bus (eta_seq=1) is within `--near-min` minutes, backing off towards
+`--max-interval-sec` when nothing is due, optionally capped by `--budget-per-min`
+requests across all stops (adaptive_schedule.py).
+
+All requests go through the per-host rate limiter and circuit breaker in
+transit_client.py; while the breaker is open a stop costs no network call, and
+its state is recorded in the `breaker` column of `tick_log.csv`.
+
+`--base-url` points the poller at a local stand-in server for testing.
+
+`--storage delta` appends only the ETA rows that changed since the previous tick
+(plus periodic keyframes) to `snapshot_deltas_{date}.jsonl` instead of writing a
+full JSON file per tick. `--storage log` appends one record per ETA row to
+size/time-rotated `eta_log_*.jsonl` segments, gzip-compressed once closed.
+`consolidate_snapshots` reads all three layouts. `--incremental` appends only new
+rows to a stable `monitor_summary.csv` (see `consolidate_incremental`), and
+`--consolidate-every-min N` does so periodically during a live monitor.
+
+`--compress gzip` (or `zstd`, needs the `zstandard` package) writes the per-tick
+files as `snapshot_{ts}.json.gz` / `.json.zst` (see compressed_io.py);
+consolidation reads plain and compressed files alike.
 """
 from __future__ import annotations
 import argparse
+import asyncio
 import os
-import time
+import csv
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-import requests
-from dateutil import parser as dateparser
 import pandas as pd
 
-BASES = {
-    'kmb': 'https://data.etabus.gov.hk',
-    'citybus': 'https://rt.data.gov.hk'
-}
+from adaptive_schedule import AdaptivePollSchedule
+from compressed_io import COMPRESS_CHOICES, compressed_path, has_data_suffix, open_text
+from delta_snapshots import DeltaSnapshotWriter, iter_snapshots, iter_snapshots_from, list_delta_files
+from poll_planner import build_plan, execute_plan, execute_plan_async, plan_summary
+from snapshot_log import (SUMMARY_FIELDS, SnapshotLogWriter, iter_log_records, iter_segment_from, list_segments,
+                          segment_key, snapshot_rows)
+from tick_scheduler import TickScheduler
+from timestamps import parse_ts
+from transit_client import TransitClient, get_client
 
 
-def fetch_stop_eta(stop_id: str, provider: str = 'kmb'):
+def fetch_stop_eta(stop_id: str, provider: str = 'kmb', base_url: str | None = None):
     """Return list of ETA rows (may be empty)."""
-    if provider == 'kmb':
-        url = f"{BASES['kmb']}/v1/transport/kmb/stop-eta/{stop_id}"
-    else:
-        url = f"{BASES['citybus']}/v1/transport/citybus-nwfb/stop-eta/{stop_id}"
     try:
-        r = requests.get(url, timeout=10)
-        r.raise_for_status()
-        j = r.json()
-        return j.get('data', [])
+        return get_client(provider, base_url).stop_eta(stop_id)
     except Exception as e:
         print(f"Error fetching ETA for {stop_id}: {e}")
         return []
 
 
-def snapshot_two_stops(stop_ids, provider, horizon_min, out_dir):
-    """Take one snapshot: fetch ETAs for each stop, filter to horizon, and save JSON."""
-    # use timezone-aware now
-    now = datetime.now().astimezone()
-    horizon_dt = now + timedelta(minutes=horizon_min)
-    snapshot = {'timestamp': now.isoformat(), 'horizon_min': horizon_min, 'stops': []}
+async def fetch_stop_eta_async(client: TransitClient, semaphore: asyncio.Semaphore, stop_id: str):
+    """Fetch one stop's ETA rows on a worker thread of the loop's default executor.
 
-    for sid in stop_ids:
-        rows = fetch_stop_eta(sid, provider=provider)
-        filtered = []
-        for r in rows:
-            eta = r.get('eta')
-            if not eta:
-                continue
-            try:
-                eta_dt = dateparser.parse(eta)
-            except Exception:
-                continue
-            if eta_dt < now or eta_dt > horizon_dt:
-                continue
-            # annotate with parsed datetime for downstream
-            r['_eta_dt'] = eta_dt.isoformat()
-            filtered.append(r)
+    The blocking request holds `semaphore` for its duration, so the executor
+    should have at least as many workers as the semaphore allows.
+    """
+    loop = asyncio.get_running_loop()
+    async with semaphore:
+        try:
+            return await loop.run_in_executor(None, client.stop_eta, stop_id)
+        except Exception as e:
+            print(f"Error fetching ETA for {stop_id}: {e}")
+            return []
+
+
+def filter_rows_to_horizon(rows, now, horizon_dt):
+    """Keep rows whose ETA lies within [now, horizon_dt], annotated with `_eta_dt`."""
+    filtered = []
+    for r in rows:
+        eta = r.get('eta')
+        if not eta:
+            continue
+        try:
+            eta_dt = parse_ts(eta)
+        except Exception:
+            continue
+        if eta_dt < now or eta_dt > horizon_dt:
+            continue
+        # annotate with parsed datetime for downstream
+        r['_eta_dt'] = eta_dt.isoformat()
+        filtered.append(r)
+    return filtered
 
-        snapshot['stops'].append({'stop_id': sid, 'rows': filtered})
 
-    # save snapshot JSON
+def partial_path(path):
+    """Hidden name a snapshot is written under before being renamed into place (same suffix, so same codec)."""
+    return os.path.join(os.path.dirname(path), '.' + os.path.basename(path))
+
+
+def write_snapshot(snapshot, now, out_dir, store=None):
+    """Save one snapshot dict as `snapshot_{ts}.json` in out_dir and return the path.
+
+    With a `store` (DeltaSnapshotWriter / SnapshotLogWriter) the snapshot is handed to it instead.
+    """
+    if store is not None:
+        path = store.write(snapshot)
+        print(f"Stored snapshot in {path} (stop rows: {[len(s['rows']) for s in snapshot['stops']]})")
+        return path
     ts = now.strftime('%Y%m%d_%H%M%S')
     os.makedirs(out_dir, exist_ok=True)
     path = os.path.join(out_dir, f'snapshot_{ts}.json')
-    with open(path, 'w', encoding='utf-8') as f:
+    with open(partial_path(path), 'w', encoding='utf-8') as f:
         json.dump(snapshot, f, ensure_ascii=False, indent=2)
+    os.replace(partial_path(path), path)
     print(f"Saved snapshot {path} (stop rows: {[len(s['rows']) for s in snapshot['stops']]})")
+    return path
+
+
+class JsonSnapshotStore:
+    """Per-tick `snapshot_{ts}.json` files compressed with `codec` ('gzip' -> `.json.gz`, 'zstd' -> `.json.zst`)."""
+
+    def __init__(self, out_dir, codec):
+        self.out_dir = out_dir
+        self.codec = codec
+        os.makedirs(out_dir, exist_ok=True)
+
+    def write(self, snapshot):
+        ts = datetime.fromisoformat(snapshot['timestamp']).strftime('%Y%m%d_%H%M%S')
+        path = compressed_path(os.path.join(self.out_dir, f'snapshot_{ts}.json'), self.codec)
+        with open_text(partial_path(path), 'w') as f:
+            json.dump(snapshot, f, ensure_ascii=False)
+        os.replace(partial_path(path), path)
+        return path
+
+    def close(self):
+        pass
+
+
+def is_snapshot_file(name):
+    """Per-tick snapshot file, plain or compressed (delta logs are `snapshot_deltas_*.jsonl`)."""
+    return name.startswith('snapshot_') and has_data_suffix(name, '.json')
+
+
+def new_snapshot(now, horizon_min, tick=None):
+    """Return an empty snapshot dict; `tick` (from TickScheduler) adds its grid stamp and lateness."""
+    snapshot = {'timestamp': now.isoformat(), 'horizon_min': horizon_min, 'stops': []}
+    if tick is not None:
+        snapshot['tick_ts'] = tick['tick_ts']
+        snapshot['tick_lateness_s'] = tick['lateness_s']
     return snapshot
 
 
-def consolidate_snapshots(out_dir, summary_path):
-    """Read all snapshot JSON files in out_dir and write a consolidated CSV of ETA rows."""
-    files = sorted([f for f in os.listdir(out_dir) if f.startswith('snapshot_') and f.endswith('.json')])
-    all_rows = []
+def snapshot_two_stops(stop_ids, provider, horizon_min, out_dir, base_url=None, tick=None, store=None, plan=None):
+    """Take one snapshot: fetch ETAs for each stop, filter to horizon, and save JSON.
+
+    With a `plan` (poll_planner.build_plan) the plan's stop/route requests are
+    executed instead of one stop-eta call per stop.
+    """
+    # use timezone-aware now
+    now = datetime.now().astimezone()
+    horizon_dt = now + timedelta(minutes=horizon_min)
+    snapshot = new_snapshot(now, horizon_min, tick)
+
+    planned = execute_plan(get_client(provider, base_url), plan) if plan else None
+    for sid in stop_ids:
+        rows = planned[sid] if planned is not None else fetch_stop_eta(sid, provider=provider, base_url=base_url)
+        snapshot['stops'].append({'stop_id': sid, 'rows': filter_rows_to_horizon(rows, now, horizon_dt)})
+
+    write_snapshot(snapshot, now, out_dir, store=store)
+    return snapshot
+
+
+async def snapshot_stops_async(client, semaphore, stop_ids, horizon_min, out_dir, tick=None, store=None, plan=None):
+    """Take one snapshot of all stops concurrently; same output format as `snapshot_two_stops`.
+
+    Every request is in flight at once (bounded by `semaphore`), so a tick costs
+    about as long as the slowest stop rather than the sum over all stops.
+    """
+    now = datetime.now().astimezone()
+    horizon_dt = now + timedelta(minutes=horizon_min)
+    snapshot = new_snapshot(now, horizon_min, tick)
+
+    if plan:
+        planned = await execute_plan_async(client, semaphore, plan)
+        results = [planned[sid] for sid in stop_ids]
+    else:
+        results = await asyncio.gather(*[
+            fetch_stop_eta_async(client, semaphore, sid)
+            for sid in stop_ids
+        ])
+    for sid, rows in zip(stop_ids, results):
+        snapshot['stops'].append({'stop_id': sid, 'rows': filter_rows_to_horizon(rows, now, horizon_dt)})
+
+    write_snapshot(snapshot, now, out_dir, store=store)
+    return snapshot
+
+
+def iter_saved_snapshots(out_dir):
+    """Yield every snapshot dict in out_dir: per-tick JSON files, then delta-log files."""
+    files = sorted(f for f in os.listdir(out_dir) if is_snapshot_file(f))
     for fn in files:
         fp = os.path.join(out_dir, fn)
         try:
-            with open(fp, 'r', encoding='utf-8') as f:
-                s = json.load(f)
-        except Exception:
+            with open_text(fp) as f:
+                yield json.load(f)
+        except Exception as e:
+            print(f"Skipping unreadable snapshot {fp}: {e}")
             continue
-        snap_ts = s.get('timestamp')
-        for stop in s.get('stops', []):
-            sid = stop.get('stop_id')
-            for r in stop.get('rows', []):
-                all_rows.append({
-                    'snapshot_ts': snap_ts,
-                    'queried_stop_id': sid,
-                    'route': r.get('route'),
-                    'direction': r.get('dir') or r.get('direction') or r.get('bound'),
-                    'eta': r.get('eta'),
-                    'eta_seq': r.get('eta_seq'),
-                    'data_timestamp': r.get('data_timestamp')
-                })
+    for fp in list_delta_files(out_dir):
+        try:
+            yield from iter_snapshots(fp)
+        except Exception as e:
+            print(f"Failed to read delta snapshots {fp}: {e}")
+
+
+def load_manifest(manifest_path):
+    if not os.path.exists(manifest_path):
+        return None
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+
+def save_manifest(manifest, manifest_path):
+    tmp = manifest_path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, manifest_path)
+
+
+def consolidate_incremental(out_dir, summary_path):
+    """Append only rows not yet ingested into summary_path, tracked by `{summary_path}.manifest.json`.
+
+    The manifest keeps a high-water mark for per-tick JSON files (their names sort
+    by time), and byte offsets for delta files and log segments. Cost therefore
+    scales with new data rather than total history. Without a manifest the
+    summary is rebuilt from scratch.
+    """
+    manifest_path = summary_path + '.manifest.json'
+    manifest = load_manifest(manifest_path)
+    fresh = manifest is None or not os.path.exists(summary_path)
+    if fresh:
+        manifest = {'json_last': '', 'delta_offsets': {}, 'log_offsets': {}, 'rows_written': 0}
+
+    new_rows = []
+    files = sorted(f for f in os.listdir(out_dir) if is_snapshot_file(f) and f > manifest['json_last'])
+    for fn in files:
+        fp = os.path.join(out_dir, fn)
+        # snapshots are renamed into place once complete, so an unreadable file stays that way: skip it as full mode does
+        try:
+            with open_text(fp) as f:
+                new_rows.extend(snapshot_rows(json.load(f)))
+        except Exception as e:
+            print(f"Skipping unreadable snapshot {fp}: {e}")
+        manifest['json_last'] = fn
+    for fp in list_delta_files(out_dir):
+        name = os.path.basename(fp)
+        try:
+            for end, s in iter_snapshots_from(fp, manifest['delta_offsets'].get(name, 0)):
+                new_rows.extend(snapshot_rows(s))
+                manifest['delta_offsets'][name] = end
+        except Exception as e:
+            print(f"Failed to read delta snapshots {fp}: {e}")
+    for fp in list_segments(out_dir):
+        key = segment_key(fp)
+        try:
+            for end, rec in iter_segment_from(fp, manifest['log_offsets'].get(key, 0)):
+                new_rows.append(rec)
+                manifest['log_offsets'][key] = end
+        except Exception as e:
+            print(f"Failed to read log segment {fp}: {e}")
+
+    with open(summary_path, 'w' if fresh else 'a', encoding='utf-8', newline='') as f:
+        w = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS, extrasaction='ignore')
+        if fresh:
+            w.writeheader()
+        w.writerows(new_rows)
+    manifest['rows_written'] += len(new_rows)
+    manifest['updated'] = datetime.now().astimezone().isoformat()
+    save_manifest(manifest, manifest_path)
+    print(f'Appended {len(new_rows)} new rows to {summary_path} ({manifest["rows_written"]} total)')
+    return summary_path
+
+
+def consolidate_snapshots(out_dir, summary_path, incremental=False):
+    """Read all snapshot JSON/delta files and ETA log segments in out_dir and write a consolidated CSV.
+
+    With `incremental=True` only rows added since the previous run are appended
+    (see `consolidate_incremental`).
+    """
+    if incremental:
+        return consolidate_incremental(out_dir, summary_path)
+    all_rows = []
+    for s in iter_saved_snapshots(out_dir):
+        all_rows.extend(snapshot_rows(s))
+    # append-only log segments already hold one summary row per record
+    all_rows.extend(iter_log_records(out_dir))
 
     if not all_rows:
         print('No rows to consolidate.')
@@ -120,43 +330,210 @@ def consolidate_snapshots(out_dir, summary_path):
     return summary_path
 
 
-def monitor_loop(stop_ids, provider, horizon_min, interval_sec, duration_min, out_dir):
-    """Run polling loop for duration_min minutes, taking snapshots every interval_sec seconds."""
-    start = datetime.now()
-    end = start + timedelta(minutes=duration_min)
+def finish_ticks(scheduler, out_dir):
+    """Append the scheduler's per-tick lateness/fetch log to out_dir/tick_log.csv and print a summary."""
+    scheduler.write_log(os.path.join(out_dir, 'tick_log.csv'))
+    print(f"Tick summary: {scheduler.summary()}")
+
+
+def make_store(storage, out_dir, keyframe_every=20, log_max_mb=64, log_max_age_min=60, compress=None):
+    """Return the snapshot store for a `--storage` choice (None = one plain JSON file per tick)."""
+    if storage == 'json' and compress and compress != 'none':
+        return JsonSnapshotStore(out_dir, compress)
+    if storage == 'delta':
+        return DeltaSnapshotWriter(out_dir, keyframe_every=keyframe_every)
+    if storage == 'log':
+        return SnapshotLogWriter(out_dir, max_bytes=int(log_max_mb * 1024 * 1024), max_age_sec=log_max_age_min * 60)
+    return None
+
+
+def close_store(store):
+    if store is not None:
+        store.close()
+
+
+def make_live_consolidator(out_dir, summary_path, every_min):
+    """Return a callable that runs incremental consolidation at most every `every_min` minutes."""
+    if not summary_path or not every_min:
+        return lambda: None
+    state = {'last': time.monotonic()}
+
+    def maybe_consolidate():
+        if time.monotonic() - state['last'] >= every_min * 60:
+            try:
+                consolidate_snapshots(out_dir, summary_path, incremental=True)
+            except Exception as e:
+                # a consolidation problem must not stop polling; it is retried at the next interval
+                print(f"Live consolidation failed: {e}")
+            state['last'] = time.monotonic()
+    return maybe_consolidate
+
+
+def make_plan(client, stop_ids, routes, provider):
+    """Build the poll plan for stop_ids x routes (None when no routes are given)."""
+    if not routes:
+        return None
+    plan = build_plan(client, stop_ids, routes, provider=provider)
+    print(f"Poll plan: {plan_summary(plan)}")
+    return plan
+
+
+def update_adaptive(adaptive, snapshot):
+    """Feed each polled stop's rows back into the adaptive schedule."""
+    now = datetime.fromisoformat(snapshot['timestamp'])
+    for stop in snapshot['stops']:
+        adaptive.update(stop['stop_id'], stop['rows'], now)
+
+
+def monitor_loop(stop_ids, provider, horizon_min, interval_sec, duration_min, out_dir,
+                 concurrency=None, base_url=None, late_policy='skip', storage='json',
+                 summary_path=None, consolidate_every_min=None, routes=None, adaptive=None, **store_opts):
+    """Run polling loop for duration_min minutes, taking snapshots every interval_sec seconds.
+
+    Snapshots fire on absolute tick boundaries (see tick_scheduler.py), so fetch
+    latency does not push later samples off the grid. With `concurrency` set,
+    each snapshot uses the asyncio fan-out poller instead. `storage='delta'`
+    appends changed rows only (see delta_snapshots.py) and `storage='log'` appends
+    one record per ETA row to rotated segments (see snapshot_log.py) instead of a
+    JSON file per tick. With `summary_path` and `consolidate_every_min`, new rows
+    are appended to the summary every few minutes while monitoring. With
+    `routes`, only those routes are kept and each tick executes a
+    request-minimizing plan over stop-eta / route-eta calls (see poll_planner.py).
+    With an `adaptive` AdaptivePollSchedule, ticks run every `interval_sec` but
+    each one only polls the stops that schedule reports as due.
+    """
+    if concurrency:
+        asyncio.run(monitor_loop_async(stop_ids, provider, horizon_min, interval_sec, duration_min, out_dir,
+                                       concurrency=concurrency, base_url=base_url, late_policy=late_policy,
+                                       storage=storage, summary_path=summary_path,
+                                       consolidate_every_min=consolidate_every_min, routes=routes, adaptive=adaptive,
+                                       **store_opts))
+        return
     print(f"Monitoring {stop_ids} with provider={provider} for {duration_min} minutes (interval {interval_sec}s)")
-    i = 0
-    while datetime.now() < end:
-        i += 1
-        print(f"Snapshot {i} at {datetime.now().isoformat()}")
-        snapshot_two_stops(stop_ids, provider, horizon_min, out_dir)
-        # sleep until next interval or until end
-        t_remain = (end - datetime.now()).total_seconds()
-        if t_remain <= 0:
-            break
-        sleep_for = min(interval_sec, t_remain)
-        time.sleep(sleep_for)
+    plan = make_plan(get_client(provider, base_url), stop_ids, routes, provider)
+    scheduler = TickScheduler(interval_sec, duration_sec=duration_min * 60, late_policy=late_policy)
+    store = make_store(storage, out_dir, **store_opts)
+    maybe_consolidate = make_live_consolidator(out_dir, summary_path, consolidate_every_min)
+    try:
+        for tick in scheduler.ticks():
+            poll_ids = adaptive.due() if adaptive else stop_ids
+            if not poll_ids:
+                continue
+            print(f"Snapshot {tick['tick'] + 1} at {tick['fired_ts']} (late {tick['lateness_s']}s)")
+            snapshot = snapshot_two_stops(poll_ids, provider, horizon_min, out_dir, base_url=base_url, tick=tick,
+                                          store=store, plan=plan)
+            if adaptive:
+                update_adaptive(adaptive, snapshot)
+            tick['breaker'] = get_client(provider, base_url).breaker_state()
+            maybe_consolidate()
+    finally:
+        close_store(store)
+        finish_ticks(scheduler, out_dir)
+        if adaptive:
+            print(f"Adaptive polling: {adaptive.stats()}")
+        print(f"HTTP client stats: {get_client(provider, base_url).stats()}")
+
+
+async def monitor_loop_async(stop_ids, provider, horizon_min, interval_sec, duration_min, out_dir,
+                             concurrency=16, base_url=None, late_policy='skip', storage='json',
+                             summary_path=None, consolidate_every_min=None, routes=None, adaptive=None,
+                             **store_opts):
+    """Asyncio variant of `monitor_loop` fanning out up to `concurrency` requests per snapshot."""
+    print(f"Monitoring {len(stop_ids)} stops with provider={provider} for {duration_min} minutes "
+          f"(interval {interval_sec}s, concurrency {concurrency})")
+    semaphore = asyncio.Semaphore(concurrency)
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=concurrency))
+    scheduler = TickScheduler(interval_sec, duration_sec=duration_min * 60, late_policy=late_policy)
+    store = make_store(storage, out_dir, **store_opts)
+    maybe_consolidate = make_live_consolidator(out_dir, summary_path, consolidate_every_min)
+    with TransitClient(provider, base_url=base_url, pool_size=concurrency) as client:
+        plan = make_plan(client, stop_ids, routes, provider)
+        try:
+            async for tick in scheduler.aticks():
+                poll_ids = adaptive.due() if adaptive else stop_ids
+                if not poll_ids:
+                    continue
+                print(f"Snapshot {tick['tick'] + 1} at {tick['fired_ts']} (late {tick['lateness_s']}s)")
+                snapshot = await snapshot_stops_async(client, semaphore, poll_ids, horizon_min, out_dir, tick=tick,
+                                                      store=store, plan=plan)
+                if adaptive:
+                    update_adaptive(adaptive, snapshot)
+                tick['breaker'] = client.breaker_state()
+                maybe_consolidate()
+        finally:
+            close_store(store)
+            finish_ticks(scheduler, out_dir)
+            if adaptive:
+                print(f"Adaptive polling: {adaptive.stats()}")
+            print(f"HTTP client stats: {client.stats()}")
 
 
 def parse_args():
     p = argparse.ArgumentParser()
-    p.add_argument('--stop-ids', nargs=2, required=True, help='Two stop ids to monitor')
+    p.add_argument('--stop-ids', nargs='+', required=True, help='Stop ids to monitor (two or more)')
     p.add_argument('--provider', choices=['kmb', 'citybus'], default='kmb')
     p.add_argument('--horizon-min', type=int, default=60, help='Look-ahead horizon (minutes) for ETA filtering')
     p.add_argument('--interval-sec', type=int, default=30, help='Polling interval in seconds')
     p.add_argument('--duration-min', type=int, default=60, help='Total monitoring duration in minutes')
     p.add_argument('--out-dir', default=os.path.join(os.path.dirname(__file__), 'monitor_outputs'))
+    p.add_argument('--concurrency', type=int, default=None,
+                   help='Enable asyncio fan-out mode with at most this many requests in flight')
+    p.add_argument('--base-url', default=None, help='Override the API host (e.g. http://127.0.0.1:8000 for a stand-in server)')
+    p.add_argument('--routes', nargs='+', default=None,
+                   help='Only keep these routes and poll via a request-minimizing stop-eta/route-eta plan')
+    p.add_argument('--adaptive', action='store_true',
+                   help='Poll each stop every --interval-sec while a bus is near, backing off when none is due')
+    p.add_argument('--max-interval-sec', type=float, default=120, help='Adaptive mode: longest gap between polls of a stop')
+    p.add_argument('--near-min', type=float, default=3,
+                   help='Adaptive mode: poll at the fastest rate while the next eta_seq=1 arrival is within this many minutes')
+    p.add_argument('--budget-per-min', type=int, default=None,
+                   help='Adaptive mode: at most this many requests per minute across all stops')
+    p.add_argument('--late-policy', choices=['skip', 'coalesce'], default='skip',
+                   help='What to do with ticks overrun by a slow fetch: skip them or fire one catch-up tick')
+    p.add_argument('--storage', choices=['json', 'delta', 'log'], default='json',
+                   help='json: one snapshot file per tick; delta: append changed rows to a daily delta log; '
+                        'log: append one record per ETA row to rotated, gzip-compressed segments')
+    p.add_argument('--keyframe-every', type=int, default=20, help='Delta storage: write a full keyframe every N ticks')
+    p.add_argument('--log-max-mb', type=float, default=64, help='Log storage: rotate a segment after this many MB')
+    p.add_argument('--log-max-age-min', type=float, default=60, help='Log storage: rotate a segment after this many minutes')
+    p.add_argument('--compress', choices=COMPRESS_CHOICES, default='none',
+                   help='JSON storage: write snapshot_{ts}.json.gz (gzip) or .json.zst (zstd, needs zstandard)')
+    p.add_argument('--incremental', action='store_true',
+                   help='Append only new rows to a stable monitor_summary.csv (tracked by a manifest) '
+                        'instead of rewriting a timestamped summary')
+    p.add_argument('--consolidate-every-min', type=float, default=None,
+                   help='Also consolidate incrementally every N minutes while monitoring (implies --incremental)')
     return p.parse_args()
 
 
 def main():
     args = parse_args()
+    if args.adaptive and args.routes:
+        raise SystemExit('--adaptive schedules stops individually and cannot be combined with a --routes plan')
+    if args.compress != 'none' and args.storage != 'json':
+        raise SystemExit('--compress applies to --storage json (log segments are gzip-compressed once closed)')
     os.makedirs(args.out_dir, exist_ok=True)
-    monitor_loop(args.stop_ids, args.provider, args.horizon_min, args.interval_sec, args.duration_min, args.out_dir)
+    adaptive = None
+    if args.adaptive:
+        adaptive = AdaptivePollSchedule(args.stop_ids, min_interval_sec=args.interval_sec,
+                                        max_interval_sec=max(args.interval_sec, args.max_interval_sec),
+                                        near_sec=args.near_min * 60, budget_per_min=args.budget_per_min)
+    incremental = args.incremental or bool(args.consolidate_every_min)
+    if incremental:
+        summary_path = os.path.join(args.out_dir, 'monitor_summary.csv')
+    else:
+        summary_path = None
+    monitor_loop(args.stop_ids, args.provider, args.horizon_min, args.interval_sec, args.duration_min, args.out_dir,
+                 concurrency=args.concurrency, base_url=args.base_url, late_policy=args.late_policy,
+                 storage=args.storage, summary_path=summary_path, consolidate_every_min=args.consolidate_every_min,
+                 routes=args.routes, adaptive=adaptive,
+                 keyframe_every=args.keyframe_every, log_max_mb=args.log_max_mb, log_max_age_min=args.log_max_age_min,
+                 compress=args.compress)
     # after monitoring, consolidate
-    ts = datetime.now().strftime('%Y%m%d_%H%M%S')
-    summary_path = os.path.join(args.out_dir, f'monitor_summary_{ts}.csv')
-    consolidate_snapshots(args.out_dir, summary_path)
+    if summary_path is None:
+        ts = datetime.now().strftime('%Y%m%d_%H%M%S')
+        summary_path = os.path.join(args.out_dir, f'monitor_summary_{ts}.csv')
+    consolidate_snapshots(args.out_dir, summary_path, incremental=incremental)
 
 
 if __name__ == '__main__':
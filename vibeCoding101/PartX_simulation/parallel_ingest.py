@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+parallel_ingest.py
+
+Shared parallel stage for scripts that parse and normalize many ETA files one
+after another (merge_all_eta_data, aggregate_peak_offpeak,
+analyze_monitoring_dates, extract_all_etas_two_stops).
+
+`map_files(func, items, workers)` runs `func(item)` for each item (usually a
+file path) in a process pool and yields `(item, result, error)` in input
+order, so callers merge results exactly as their sequential loop did. At most
+`2 * workers` files are in flight, which keeps memory bounded while results
+stream back. A worker exception is returned as `error` (its message) for that
+item instead of stopping the run. With `workers=1` (or a single item) it runs
+in-process without a pool.
+
+`func` must be a module-level function (or a functools.partial of one) and
+results must be picklable. Scripts using it need an `if __name__ == '__main__'`
+guard, since the pool may re-import them.
+
+Usage:
+    for path, rows, err in map_files(load_rows, paths, workers=args.workers):
+        if err:
+            print('failed', path, err)
+        else:
+            all_rows.extend(rows)
+"""
+from __future__ import annotations
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Any, Callable, Iterable, Iterator, Tuple
+
+DEFAULT_WORKERS = os.cpu_count() or 1
+
+
+def _run(func: Callable[[Any], Any], item: Any) -> Tuple[Any, str | None]:
+    try:
+        return func(item), None
+    except Exception as e:
+        return None, str(e) or type(e).__name__
+
+
+def resolve_workers(workers: int | None, n_items: int) -> int:
+    """Worker count to use: DEFAULT_WORKERS if None/0, never more than the number of items."""
+    return max(1, min(workers or DEFAULT_WORKERS, n_items))
+
+
+def map_files(func: Callable[[Any], Any], items: Iterable[Any], workers: int | None = None
+              ) -> Iterator[Tuple[Any, Any, str | None]]:
+    """Yield (item, func(item), error) in input order, computing up to `workers` items in parallel."""
+    items = list(items)
+    workers = resolve_workers(workers, len(items))
+    if workers == 1:
+        for item in items:
+            yield (item,) + _run(func, item)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        todo = iter(items)
+        pending = deque((item, pool.submit(_run, func, item)) for item in islice(todo, 2 * workers))
+        while pending:
+            item, fut = pending.popleft()
+            for nxt in islice(todo, 1):
+                pending.append((nxt, pool.submit(_run, func, nxt)))
+            yield (item,) + fut.result()
+
+
+def add_workers_arg(parser):
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f'Processes for parsing input files (default: {DEFAULT_WORKERS}, CPU count; 1 = sequential)')
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+poll_planner.py
+
+Request-minimizing poll plans for corridor monitoring. Given the (stop, route)
+pairs we care about, pick the fewest upstream calls that cover them, choosing
+between
+
+ - `stop-eta/{stop}`: every route at one stop (covers all target routes there)
+ - `route-eta/{route}/{service_type}`: every stop of one route variant (covers
+   that route at all target stops on it)
+
+The KMB route list and route-stop tables are read once when planning, to know
+which target stops each route variant serves and to map route-eta rows
+(`dir`, `seq`) back to stop ids. Selection is greedy weighted set cover: take
+the call covering the most still-uncovered pairs per unit cost, preferring
+stop-eta on ties (smaller payload). A route with several service types at the
+target stops costs one call per service type. Citybus has no route-eta
+endpoint here, so its plans are stop-eta only.
+
+The plan is a plain JSON-serializable dict; `execute_plan` runs it once per
+tick and returns {stop_id: rows} in stop-eta row format, filtered to the target
+routes, so callers can build the usual snapshot from it.
+
+Usage:
+    from poll_planner import build_plan, execute_plan, plan_summary
+    plan = build_plan(client, stop_ids, ['272A', '272X'])
+    print(plan_summary(plan))
+    rows_by_stop = execute_plan(client, plan)      # each tick
+"""
+from __future__ import annotations
+import asyncio
+from typing import Any, Dict, Iterable, List
+
+ROUTE_BOUNDS = {'O': 'outbound', 'I': 'inbound'}
+
+
+def _seq_key(bound: Any, seq: Any) -> str:
+    return f'{bound}|{int(seq)}'
+
+
+def route_variants(client, routes: Iterable[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """{route: [{'bound', 'service_type'}, ...]} for the target routes, from the route list."""
+    wanted = {r.upper() for r in routes}
+    out: Dict[str, List[Dict[str, Any]]] = {r: [] for r in wanted}
+    for row in client.get_json('route').get('data', []):
+        route = (row.get('route') or '').upper()
+        if route in wanted:
+            out[route].append({'bound': row.get('bound'), 'service_type': str(row.get('service_type'))})
+    return out
+
+
+def route_stop_seqs(client, route: str, bound: str, service_type: str) -> Dict[str, str]:
+    """{'bound|seq': stop_id} for one route variant."""
+    data = client.get_json('route-stop', route, ROUTE_BOUNDS[bound], service_type).get('data', [])
+    return {_seq_key(bound, r.get('seq')): r.get('stop') for r in data if r.get('stop')}
+
+
+def candidate_requests(client, stop_ids: List[str], routes: List[str], provider: str = 'kmb',
+                       stop_cost: float = 1.0, route_cost: float = 1.0) -> tuple:
+    """Every call that could be part of a plan, with its cost and the target pairs it covers.
+
+    Also returns {route: stops it serves among stop_ids} for routes found in the
+    route list, so pairs no bus will ever report can be dropped from the targets.
+    """
+    routes = [r.upper() for r in routes]
+    targets = {(sid, r) for sid in stop_ids for r in routes}
+    candidates = [
+        {'cost': stop_cost, 'covers': {(sid, r) for r in routes},
+         'requests': [{'kind': 'stop-eta', 'stop': sid}]}
+        for sid in stop_ids
+    ]
+    served: Dict[str, set] = {}
+    if provider != 'kmb':
+        return candidates, served
+    for route, variants in route_variants(client, routes).items():
+        if not variants:
+            continue
+        requests, covers = [], set()
+        for st in sorted({v['service_type'] for v in variants}):
+            seqs = {}
+            for v in variants:
+                if v['service_type'] == st and v['bound'] in ROUTE_BOUNDS:
+                    seqs.update(route_stop_seqs(client, route, v['bound'], st))
+            seqs = {k: sid for k, sid in seqs.items() if (sid, route) in targets}
+            served.setdefault(route, set()).update(seqs.values())
+            if seqs:
+                requests.append({'kind': 'route-eta', 'route': route, 'service_type': st, 'stops': seqs})
+                covers |= {(sid, route) for sid in seqs.values()}
+        if requests:
+            candidates.append({'cost': route_cost * len(requests), 'covers': covers, 'requests': requests})
+    return candidates, served
+
+
+def build_plan(client, stop_ids: List[str], routes: List[str], provider: str = 'kmb',
+               stop_cost: float = 1.0, route_cost: float = 1.0) -> Dict[str, Any]:
+    """Greedy set cover of stop_ids x routes; returns the plan dict executed by `execute_plan`.
+
+    `route_cost` > 1 biases towards stop-eta calls when bandwidth matters more
+    than request count (a route-eta response carries every stop of the route).
+    """
+    routes = [r.upper() for r in routes]
+    candidates, served = candidate_requests(client, stop_ids, routes, provider, stop_cost, route_cost)
+    uncovered = {(sid, r) for sid in stop_ids for r in routes if r not in served or sid in served[r]}
+    chosen = []
+    while uncovered:
+        best = max(candidates, key=lambda c: (len(c['covers'] & uncovered) / c['cost'],
+                                              c['requests'][0]['kind'] == 'stop-eta'))
+        gain = best['covers'] & uncovered
+        if not gain:
+            break
+        for req in best['requests']:
+            req = dict(req)
+            if req['kind'] == 'stop-eta':
+                req['routes'] = sorted(r for sid, r in gain if sid == req['stop'])
+            else:
+                req['stops'] = {k: sid for k, sid in req['stops'].items() if (sid, req['route']) in gain}
+                if not req['stops']:
+                    continue
+            chosen.append(req)
+        uncovered -= gain
+        candidates.remove(best)
+    return {'provider': provider, 'stop_ids': list(stop_ids), 'routes': routes, 'requests': chosen}
+
+
+def plan_summary(plan: Dict[str, Any]) -> str:
+    kinds = [r['kind'] for r in plan['requests']]
+    return (f"{len(kinds)} requests per tick ({kinds.count('stop-eta')} stop-eta, {kinds.count('route-eta')} route-eta) "
+            f"covering {len(plan['stop_ids'])} stops x {len(plan['routes'])} routes "
+            f"(stop-level polling: {len(plan['stop_ids'])})")
+
+
+def run_request(client, req: Dict[str, Any]) -> List[Dict[str, Any]]:
+    if req['kind'] == 'stop-eta':
+        return client.stop_eta(req['stop'])
+    return client.get_json('route-eta', req['route'], req['service_type']).get('data', [])
+
+
+def assign_rows(plan: Dict[str, Any], responses: List[List[Dict[str, Any]]]) -> Dict[str, List[Dict[str, Any]]]:
+    """Distribute the plan's responses into {stop_id: rows}, keeping only covered (stop, route) pairs."""
+    out = {sid: [] for sid in plan['stop_ids']}
+    for req, rows in zip(plan['requests'], responses):
+        if req['kind'] == 'stop-eta':
+            wanted = set(req['routes'])
+            out[req['stop']].extend(r for r in rows if (r.get('route') or '').upper() in wanted)
+            continue
+        for r in rows:
+            try:
+                sid = req['stops'].get(_seq_key(r.get('dir'), r.get('seq')))
+            except (TypeError, ValueError):
+                continue
+            if sid:
+                out[sid].append(dict(r, stop=sid))
+    for rows in out.values():
+        rows.sort(key=lambda r: ((r.get('route') or ''), r.get('dir') or '', r.get('eta_seq') or 0))
+    return out
+
+
+def execute_plan(client, plan: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+    """Run every request of the plan (a failed request contributes no rows)."""
+    responses = []
+    for req in plan['requests']:
+        try:
+            responses.append(run_request(client, req))
+        except Exception as e:
+            print(f"Error fetching {req['kind']} for {req.get('stop') or req.get('route')}: {e}")
+            responses.append([])
+    return assign_rows(plan, responses)
+
+
+async def execute_plan_async(client, semaphore: asyncio.Semaphore, plan: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+    """`execute_plan` with all requests in flight at once on the loop's default executor."""
+    loop = asyncio.get_running_loop()
+
+    async def one(req):
+        async with semaphore:
+            try:
+                return await loop.run_in_executor(None, run_request, client, req)
+            except Exception as e:
+                print(f"Error fetching {req['kind']} for {req.get('stop') or req.get('route')}: {e}")
+                return []
+
+    responses = await asyncio.gather(*[one(req) for req in plan['requests']])
+    return assign_rows(plan, list(responses))
@@ -2,7 +2,8 @@
 """Animate bus arrivals for current vs two merged scenarios.
 
 Reads a monitor CSV (with columns including `queried_stop_id` and `eta`),
-builds schedules for two selected stops and produces a 2-hour animation
+builds schedules for two selected stops (compiled once into a memory-mapped
+store, see ../../schedule_store.py) and produces a 2-hour animation
 comparing: `pre` (current separate stops), `post1` (merged stop half/half),
 and `post2` (merged single stop). The animation approximates bus movement
 by showing approaching buses in a short approach window before ETA.
@@ -18,31 +19,21 @@ Usage (example):
 from __future__ import annotations
 import argparse
 import os
+import sys
 from datetime import timedelta
 from typing import List, Dict
 
 import matplotlib.pyplot as plt
 import matplotlib.animation as animation
 import numpy as np
-import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from schedule_store import ScheduleStore, load_schedules as load_compiled_schedules  # noqa: E402
 
 
 def load_schedules(csv_path: str, stop_ids: List[str], horizon_min: int = 120):
-    df = pd.read_csv(csv_path)
-    df = df[df['queried_stop_id'].isin(stop_ids)]
-    df = df.dropna(subset=['eta'])
-    df['eta_dt'] = pd.to_datetime(df['eta'])
-    min_eta = df['eta_dt'].min()
-    env_start = min_eta - pd.Timedelta(minutes=5)
-    horizon_dt = env_start + pd.Timedelta(minutes=horizon_min)
-    schedules: Dict[str, List[float]] = {}
-    for sid in stop_ids:
-        sub = df[df['queried_stop_id'] == sid]
-        etas = sorted(sub['eta_dt'].unique())
-        etas = [e.to_pydatetime() for e in etas if e.to_pydatetime() <= horizon_dt]
-        offsets = [float((e - env_start).total_seconds()) for e in etas if e >= env_start]
-        schedules[sid] = sorted(offsets)
-    return env_start.to_pydatetime(), schedules
+    # compiled once per input into a memory-mapped store (../../schedule_store.py), rebuilt when the input changes
+    return load_compiled_schedules(csv_path, stop_ids, horizon_min=horizon_min)
 
 
 def build_events_for_scenarios(schedules: Dict[str, List[float]]):
@@ -164,7 +155,7 @@ def main():
     p.add_argument('--out', default=os.path.join(os.path.dirname(__file__), 'bus_movement_2h.mp4'))
     args = p.parse_args()
 
-    env_start, schedules = load_schedules(args.input, args.stops if args.stops else list(pd.read_csv(args.input)['queried_stop_id'].unique())[:2], horizon_min=args.horizon)
+    env_start, schedules = load_schedules(args.input, args.stops if args.stops else ScheduleStore(args.input).stops[:2], horizon_min=args.horizon)
     print('Loaded schedules for stops:', list(schedules.keys()))
     events = build_events_for_scenarios(schedules)
     horizon_s = args.horizon * 60
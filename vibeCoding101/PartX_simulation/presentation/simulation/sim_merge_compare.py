@@ -7,7 +7,9 @@ Scenarios:
 - post2: "merge to single stop" (post-merge 2) — all passengers walk same walk_time
 
 This reads a consolidated monitor CSV (with columns including
-`queried_stop_id` and `eta`) to build bus arrival schedules, then
+`queried_stop_id` and `eta`), or an eta_dataset directory (Parquet/Arrow,
+see ../../eta_dataset.py), to build bus arrival schedules (compiled once
+into a memory-mapped store, see ../../schedule_store.py), then
 simulates passenger arrivals as Poisson processes and bus boarding as
 capacity-limited FIFO. Outputs CSV/JSON summaries and simple PNG plots.
 """
@@ -18,36 +20,21 @@ import math
 import os
 import random
 import statistics
+import sys
 from collections import deque
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone
 from typing import List, Dict, Any
 
 import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from schedule_store import ScheduleStore, load_schedules  # noqa: E402
 
 
 def load_eta_schedules(csv_path: str, stop_ids: List[str], horizon_min: int = 120):
-    df = pd.read_csv(csv_path)
-    # ensure eta parsed
-    df = df[df['queried_stop_id'].isin(stop_ids)]
-    df = df.dropna(subset=['eta'])
-    df['eta_dt'] = pd.to_datetime(df['eta'])
-    # choose reference start as min eta minus 5 minutes to allow passenger arrivals
-    min_eta = df['eta_dt'].min()
-    env_start = (min_eta - pd.Timedelta(minutes=5)).to_pydatetime()
-    horizon_dt = env_start + timedelta(minutes=horizon_min)
-    schedules = {}
-    for sid in stop_ids:
-        sub = df[df['queried_stop_id'] == sid]
-        # keep unique ETAs
-        etas = sorted(sub['eta_dt'].unique())
-        # filter by horizon
-        etas = [e.to_pydatetime() for e in etas if e.to_pydatetime() <= horizon_dt]
-        # convert to seconds offset relative to env_start
-        offsets = [int((e - env_start).total_seconds()) for e in etas if e >= env_start]
-        schedules[sid] = sorted(offsets)
-    return env_start, schedules
+    # compiled once per input into a memory-mapped store (../../schedule_store.py), rebuilt when the input changes
+    return load_schedules(csv_path, stop_ids, horizon_min=horizon_min, integer=True)
 
 
 def generate_passenger_arrivals(rate_per_min: float, horizon_seconds: int, rng: np.random.Generator):
@@ -216,9 +203,8 @@ def main():
     p.add_argument('--out-dir', default=os.path.join(os.path.dirname(__file__), '..', 'simulation_results'))
     args = p.parse_args()
 
-    df_all = pd.read_csv(args.input_csv)
     # default stop ids: pick top two unique queried_stop_id
-    stops = args.stop_ids if args.stop_ids else list(df_all['queried_stop_id'].unique())[:2]
+    stops = args.stop_ids if args.stop_ids else ScheduleStore(args.input_csv).stops[:2]
     print('Using stop ids:', stops)
 
     env_start, schedules = load_eta_schedules(args.input_csv, stops, horizon_min=args.horizon_min)
@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+"""
+replay_server.py
+
+Local record/replay stand-in for the KMB and MTR open-data APIs, for offline
+load testing of `monitor_two_stations.py`, `tools/run_monitor_window.py` and
+`MTRAPIClient` (Part2APIaccessGovOpenData/MTRexamples/mtr_api_test.py).
+
+Serves, from archived data:
+ - `/v1/transport/kmb/stop-eta/{stop}` from monitor snapshot folders
+   (`snapshot_*.json`, plain or `--compress`ed `.json.gz`/`.json.zst`, and
+   `snapshot_deltas_*.jsonl`, and `eta_log_*.jsonl[.gz]` segments from
+   `--storage log`), replaying them in time order
+ - `/v1/transport/kmb/stop` and `/stop/{stop}` from the stop catalogue cache
+   (`.cache/kmb_stops.json`, see stop_catalogue.py), else a placeholder record
+ - `/v1/transport/mtr/getSchedule.php?line=..&sta=..` from `mtr_api_output.json`
+ - anything captured earlier with `--record` (JSON Lines of path/query/body)
+
+A replay clock runs `--speed` times faster than real time from the first
+recording of each endpoint (wrapping at its last one, so archives from
+different days line up). Each request gets the latest recording at or before
+that clock, with its time fields (`eta`, `data_timestamp`,
+MTR `time`/`curr_time`/`sys_time`) shifted so they are as far from the real
+now as they were from the replay clock (divided by `--speed`), so horizon
+filters and adaptive polling behave as they would live.
+
+Load-shaping knobs: `--latency-ms` + exponential `--jitter-ms`, `--error-rate`
+(HTTP 503), `--hang-rate` / `--hang-sec` (slow responses that trip client
+timeouts). `GET /__stats` returns counters.
+
+`--record FILE` turns it into a recording proxy: requests are forwarded to the
+real hosts and every JSON response is appended to FILE for later replay.
+
+Usage:
+    python3 replay_server.py --snapshots monitor_outputs_1hr \
+        --mtr ../Part2APIaccessGovOpenData/MTRexamples/mtr_api_output.json \
+        --port 8000 --latency-ms 80 --jitter-ms 40 --error-rate 0.02 --speed 10
+    python3 monitor_two_stations.py --stop-ids 3F24CFF9046300D9 B34F59A0270AEDA4 \
+        --base-url http://127.0.0.1:8000 --interval-sec 5 --duration-min 1
+"""
+from __future__ import annotations
+import argparse
+import bisect
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+from urllib.parse import parse_qsl, urlsplit
+
+import requests
+
+from compressed_io import has_data_suffix, open_text
+from delta_snapshots import iter_snapshots, list_delta_files
+from snapshot_log import iter_segment, list_segments
+from stop_catalogue import cache_path
+from timestamps import HK_TZ, parse_ts
+
+KMB_PREFIX = '/v1/transport/kmb'
+MTR_PATH = '/v1/transport/mtr/getSchedule.php'
+UPSTREAMS = {KMB_PREFIX: 'https://data.etabus.gov.hk', '/v1/transport/': 'https://rt.data.gov.hk'}
+
+# fields holding timestamps that are shifted onto the real clock when served
+SHIFT_KEYS = {'eta', 'data_timestamp', 'generated_timestamp', 'time', 'curr_time', 'sys_time'}
+# query parameters that do not select a different recording
+IGNORED_PARAMS = {'lang'}
+
+
+def request_key(path: str, query: str = '') -> str:
+    """Archive key: path plus sorted query parameters (minus IGNORED_PARAMS)."""
+    params = sorted((k, v) for k, v in parse_qsl(query) if k not in IGNORED_PARAMS)
+    return path + ('?' + '&'.join(f'{k}={v}' for k, v in params) if params else '')
+
+
+def to_datetime(value) -> datetime | None:
+    """timestamps.parse_ts of value (naive = Hong Kong time); None if it is not a timestamp."""
+    if not isinstance(value, str):
+        return None
+    try:
+        return parse_ts(value, HK_TZ)
+    except ValueError:
+        return None
+
+
+class ReplayArchive:
+    def __init__(self):
+        self._times: Dict[str, List[float]] = {}
+        self._bodies: Dict[str, List[Any]] = {}
+
+    def add(self, key: str, when: datetime, body: Any):
+        t = when.timestamp()
+        times = self._times.setdefault(key, [])
+        bodies = self._bodies.setdefault(key, [])
+        i = bisect.bisect_right(times, t)
+        times.insert(i, t)
+        bodies.insert(i, body)
+
+    def span(self, key: str) -> tuple | None:
+        """(first, last) recording time of key, or None."""
+        times = self._times.get(key)
+        return (times[0], times[-1]) if times else None
+
+    def lookup(self, key: str, at: float):
+        """Latest body recorded at or before `at` (the earliest one if `at` precedes them all)."""
+        times = self._times.get(key)
+        if not times:
+            return None
+        i = bisect.bisect_right(times, at) - 1
+        return self._bodies[key][max(i, 0)]
+
+    def keys(self) -> List[str]:
+        return sorted(self._times)
+
+    def stop_ids(self) -> List[str]:
+        prefix = KMB_PREFIX + '/stop-eta/'
+        return [k[len(prefix):] for k in self.keys() if k.startswith(prefix)]
+
+
+def iter_log_snapshots(out_dir: str):
+    """Snapshots rebuilt from the `eta_log_*.jsonl[.gz]` segments in out_dir (`--storage log`).
+
+    snapshot_rows wrote one record per ETA row, in snapshot order; consecutive records with the same
+    snapshot_ts are grouped back into one snapshot with per-stop rows in the stop-eta API's field names.
+    Stops that had no rows in a tick do not appear in the log and so are not in the rebuilt snapshot."""
+    current = None
+    for path in list_segments(out_dir):
+        for rec in iter_segment(path):
+            if current is None or rec.get('snapshot_ts') != current['timestamp']:
+                if current is not None:
+                    yield {'timestamp': current['timestamp'],
+                           'stops': [{'stop_id': sid, 'rows': rows} for sid, rows in current['stops'].items()]}
+                current = {'timestamp': rec.get('snapshot_ts'), 'stops': {}}
+            current['stops'].setdefault(rec.get('queried_stop_id'), []).append({
+                'route': rec.get('route'),
+                'dir': rec.get('direction'),
+                'eta_seq': rec.get('eta_seq'),
+                'eta': rec.get('eta'),
+                'data_timestamp': rec.get('data_timestamp'),
+            })
+    if current is not None:
+        yield {'timestamp': current['timestamp'],
+               'stops': [{'stop_id': sid, 'rows': rows} for sid, rows in current['stops'].items()]}
+
+
+def load_snapshot_dir(archive: ReplayArchive, out_dir: str) -> int:
+    """Add every stop of every snapshot (JSON files, delta logs and log segments) in out_dir as a stop-eta recording."""
+    def snapshots():
+        for fn in sorted(os.listdir(out_dir)):
+            if fn.startswith('snapshot_') and has_data_suffix(fn, '.json'):
+                try:
+                    with open_text(os.path.join(out_dir, fn)) as f:
+                        yield json.load(f)
+                except Exception:
+                    continue
+        for fp in list_delta_files(out_dir):
+            yield from iter_snapshots(fp)
+        yield from iter_log_snapshots(out_dir)
+
+    n = 0
+    for snap in snapshots():
+        when = to_datetime(snap.get('timestamp'))
+        if when is None:
+            continue
+        for stop in snap.get('stops', []):
+            rows = [{k: v for k, v in r.items() if not k.startswith('_')} for r in stop.get('rows', [])]
+            body = {'type': 'StopETA', 'version': '1.0', 'generated_timestamp': when.isoformat(), 'data': rows}
+            archive.add(f"{KMB_PREFIX}/stop-eta/{stop['stop_id']}", when, body)
+        n += 1
+    return n
+
+
+def load_mtr_output(archive: ReplayArchive, path: str) -> int:
+    """Add the responses saved by mtr_api_test.py (`results[].data`) as getSchedule.php recordings."""
+    with open(path, 'r', encoding='utf-8') as f:
+        doc = json.load(f)
+    n = 0
+    for r in doc.get('results', []):
+        body = r.get('data') or {}
+        when = to_datetime(body.get('curr_time') or doc.get('test_timestamp'))
+        if when is None or not r.get('line') or not r.get('station'):
+            continue
+        archive.add(request_key(MTR_PATH, f"line={r['line']}&sta={r['station']}"), when, body)
+        n += 1
+    return n
+
+
+def load_recordings(archive: ReplayArchive, path: str) -> int:
+    n = 0
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            when = to_datetime(rec.get('t'))
+            if when is not None and rec.get('status') == 200:
+                archive.add(request_key(rec['path'], rec.get('query', '')), when, rec['body'])
+                n += 1
+    return n
+
+
+def load_stop_cache(path: str) -> Dict[str, Dict[str, Any]]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return {s.get('stop'): s for s in json.load(f).get('data', [])}
+
+
+def shift_times(obj: Any, fn) -> Any:
+    """Copy of obj with every SHIFT_KEYS timestamp string passed through fn(datetime) -> datetime."""
+    if isinstance(obj, list):
+        return [shift_times(v, fn) for v in obj]
+    if not isinstance(obj, dict):
+        return obj
+    out = {}
+    for k, v in obj.items():
+        if k in SHIFT_KEYS and isinstance(v, str) and v:
+            dt = to_datetime(v)
+            if dt is not None:
+                new = fn(dt).astimezone(dt.tzinfo).replace(microsecond=0)
+                v = new.isoformat() if 'T' in v else new.strftime('%Y-%m-%d %H:%M:%S')
+        elif isinstance(v, (dict, list)):
+            v = shift_times(v, fn)
+        out[k] = v
+    return out
+
+
+class ReplayServer:
+    def __init__(self, archive: ReplayArchive, host: str = '127.0.0.1', port: int = 8000,
+                 latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0,
+                 hang_rate: float = 0.0, hang_sec: float = 30.0, speed: float = 1.0, loop: bool = True,
+                 shift: bool = True, stops: Dict[str, Dict[str, Any]] | None = None,
+                 record_path: str | None = None, seed: int | None = None):
+        self.archive = archive
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.hang_rate = hang_rate
+        self.hang_sec = hang_sec
+        self.speed = speed
+        self.loop = loop
+        self.shift = shift
+        self.stops = stops or {}
+        self.record_path = record_path
+        self.random = random.Random(seed)
+        self.counts = {'requests': 0, 'served': 0, 'missing': 0, 'errors_injected': 0, 'hangs_injected': 0}
+        self._lock = threading.Lock()
+        self._record_lock = threading.Lock()
+        self._started = time.time()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def replay_clock(self, key: str, now: float) -> float:
+        """Archive time of `key` that corresponds to real time `now`."""
+        start, end = self.archive.span(key)
+        t = start + (now - self._started) * self.speed
+        if self.loop and end > start and t > end:
+            t = start + (t - start) % (end - start)
+        return t
+
+    def _count(self, key: str):
+        with self._lock:
+            self.counts[key] += 1
+
+    def resolve(self, path: str, query: str):
+        """Return (status, body) for a request path, from the archive or the stop catalogue."""
+        now = time.time()
+        key = request_key(path, query)
+        if self.archive.span(key) is not None:
+            virtual = self.replay_clock(key, now)
+            body = self.archive.lookup(key, virtual)
+            if self.shift:
+                real = datetime.fromtimestamp(now).astimezone()
+                body = shift_times(body, lambda dt: real + timedelta(seconds=(dt.timestamp() - virtual) / self.speed))
+            return 200, body
+        if path == KMB_PREFIX + '/stop':
+            return 200, {'type': 'StopList', 'version': '1.0', 'data': list(self.stops.values())}
+        if path.startswith(KMB_PREFIX + '/stop/'):
+            sid = path.rsplit('/', 1)[-1]
+            return 200, {'type': 'Stop', 'version': '1.0',
+                         'data': self.stops.get(sid) or {'stop': sid, 'name_en': sid, 'name_tc': sid, 'name_sc': sid}}
+        if path.startswith(KMB_PREFIX + '/stop-eta/'):
+            return 200, {'type': 'StopETA', 'version': '1.0', 'data': []}
+        if path == MTR_PATH:
+            return 200, {'status': 0, 'message': 'No recording for this line/station', 'data': {}}
+        return 404, {'error': f'no recording for {path}'}
+
+    def proxy(self, path: str, query: str):
+        """Forward to the real API host and append the JSON response to the recording file."""
+        base = next(host for prefix, host in UPSTREAMS.items() if path.startswith(prefix))
+        resp = requests.get(base + path + ('?' + query if query else ''), timeout=30)
+        try:
+            body = resp.json()
+        except ValueError:
+            return resp.status_code, {'error': 'non-JSON upstream response'}
+        rec = {'t': datetime.now().astimezone().isoformat(), 'path': path, 'query': query,
+               'status': resp.status_code, 'body': body}
+        with self._record_lock, open(self.record_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(rec, ensure_ascii=False) + '\n')
+        return resp.status_code, body
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def _send(self, status: int, body: Any):
+                data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                if parts.path == '/__stats':
+                    with server._lock:
+                        stats = dict(server.counts)
+                    stats['replay_elapsed_s'] = round((time.time() - server._started) * server.speed, 1)
+                    return self._send(200, stats)
+                server._count('requests')
+                delay = server.latency_ms / 1000.0
+                if server.jitter_ms:
+                    delay += server.random.expovariate(1000.0 / server.jitter_ms)
+                if server.hang_rate and server.random.random() < server.hang_rate:
+                    server._count('hangs_injected')
+                    delay += server.hang_sec
+                if delay:
+                    time.sleep(delay)
+                if server.error_rate and server.random.random() < server.error_rate:
+                    server._count('errors_injected')
+                    return self._send(503, {'error': 'injected failure'})
+                try:
+                    if server.record_path:
+                        status, body = server.proxy(parts.path, parts.query)
+                    else:
+                        status, body = server.resolve(parts.path, parts.query)
+                except Exception as e:
+                    status, body = 502, {'error': str(e)}
+                server._count('served' if status == 200 else 'missing')
+                self._send(status, body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> 'ReplayServer':
+        """Serve on a background thread (for benchmarks); returns self."""
+        self._started = time.time()
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._started = time.time()
+        self.httpd.serve_forever()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def build_archive(snapshot_dirs=(), mtr_files=(), recordings=()) -> ReplayArchive:
+    archive = ReplayArchive()
+    for d in snapshot_dirs:
+        print(f'Loaded {load_snapshot_dir(archive, d)} snapshots from {d}')
+    for p in mtr_files:
+        print(f'Loaded {load_mtr_output(archive, p)} MTR responses from {p}')
+    for p in recordings:
+        print(f'Loaded {load_recordings(archive, p)} recorded responses from {p}')
+    return archive
+
+
+def add_server_args(p: argparse.ArgumentParser):
+    """Replay/load-shaping options shared with tools/bench_replay.py."""
+    p.add_argument('--snapshots', nargs='*', default=[], help='Monitor output folders to replay stop-eta from')
+    p.add_argument('--mtr', nargs='*', default=[], help='mtr_api_output.json files to replay getSchedule.php from')
+    p.add_argument('--recordings', nargs='*', default=[], help='JSON Lines files written by --record')
+    p.add_argument('--stop-cache', default=cache_path('kmb'), help='Stop list cache used for /stop responses')
+    p.add_argument('--latency-ms', type=float, default=0.0, help='Fixed latency added to every response')
+    p.add_argument('--jitter-ms', type=float, default=0.0, help='Mean of extra exponentially distributed latency')
+    p.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with HTTP 503')
+    p.add_argument('--hang-rate', type=float, default=0.0, help='Fraction of requests delayed by --hang-sec')
+    p.add_argument('--hang-sec', type=float, default=30.0)
+    p.add_argument('--speed', type=float, default=1.0, help='Replay clock speed relative to real time')
+    p.add_argument('--no-loop', action='store_true', help='Keep serving the last snapshot instead of wrapping around')
+    p.add_argument('--no-shift', action='store_true', help='Serve recorded timestamps unchanged')
+    p.add_argument('--seed', type=int, default=None)
+
+
+def server_from_args(args, host: str = '127.0.0.1', port: int = 0, record_path: str | None = None) -> ReplayServer:
+    archive = build_archive(args.snapshots, args.mtr, args.recordings)
+    return ReplayServer(archive, host=host, port=port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                        error_rate=args.error_rate, hang_rate=args.hang_rate, hang_sec=args.hang_sec,
+                        speed=args.speed, loop=not args.no_loop, shift=not args.no_shift,
+                        stops=load_stop_cache(args.stop_cache), record_path=record_path, seed=args.seed)
+
+
+def main():
+    p = argparse.ArgumentParser(description='Replay archived KMB/MTR API responses on a local HTTP server.')
+    add_server_args(p)
+    p.add_argument('--host', default='127.0.0.1')
+    p.add_argument('--port', type=int, default=8000)
+    p.add_argument('--record', default=None, help='Proxy to the real APIs and append responses to this JSON Lines file')
+    args = p.parse_args()
+    server = server_from_args(args, host=args.host, port=args.port, record_path=args.record)
+    print(f'Serving {len(server.archive.keys())} recorded endpoints on {server.url} '
+          f'(speed x{args.speed}, latency {args.latency_ms}+~{args.jitter_ms} ms, error rate {args.error_rate})')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+schedule_store.py
+
+Compiled, memory-mapped bus arrival schedules for the simulations
+(presentation/simulation/sim_merge_compare.py, animate_bus_movements.py), so
+they no longer re-parse the whole consolidated CSV and rebuild Python lists
+of datetimes on every run.
+
+A source (a monitor CSV or an eta_dataset directory) is compiled once into
+`.cache/schedules/<key>.npy`: a structured array of (stop, eta_us) records,
+the unique ETAs of each queried stop as UTC epoch microseconds, grouped by
+stop (in order of first appearance in the source) and sorted by time. A
+`<key>.json` sidecar holds the source's size/mtime signature, its UTC offset
+and each stop's slice. The store is rebuilt when the source changes.
+
+The array is opened with `np.load(mmap_mode='r')`: starting a simulation only
+maps the file, a time window is two binary searches in a stop's slice, and
+the views returned by `window()` are pages of the shared file, so any number
+of worker processes read the same physical copy.
+
+`load_schedules` gives what the simulations used to compute from the CSV:
+env_start (earliest ETA of the stops minus `lead_min`) and, per stop, the
+sorted ETA offsets in seconds from env_start up to `horizon_min`.
+
+Usage:
+    python3 schedule_store.py monitor_outputs_1hr/monitor_summary_both_20251105_070549.csv --horizon-min 120
+
+    env_start, schedules = load_schedules(csv_path, ['3F24CFF9046300D9', 'B34F59A0270AEDA4'], horizon_min=120)
+    store = ScheduleStore(csv_path)
+    start_us, etas = store.window(store.stops[:2], horizon_min=120)  # zero-copy views
+"""
+from __future__ import annotations
+import argparse
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from eta_dataset import is_dataset, read_dataset
+
+DEFAULT_STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'schedules')
+STORE_VERSION = 1
+US = 1_000_000
+
+
+def source_signature(source: str) -> List:
+    """(relative path, size, mtime_ns) of the source file, or of every file in a dataset directory."""
+    if os.path.isdir(source):
+        files = []
+        for root, _, names in os.walk(source):
+            files.extend(os.path.join(root, n) for n in names)
+    else:
+        files = [source]
+    sig = []
+    for f in sorted(files):
+        st = os.stat(f)
+        sig.append([os.path.relpath(f, source) if f != source else '', st.st_size, st.st_mtime_ns])
+    return sig
+
+
+def read_etas(source: str) -> pd.DataFrame:
+    """queried_stop_id (str) and parsed eta of every row of a CSV or eta_dataset directory."""
+    if is_dataset(source):
+        df = read_dataset(source, columns=['queried_stop_id', 'eta'])
+        df['queried_stop_id'] = df['queried_stop_id'].astype(str)
+    else:
+        df = pd.read_csv(source, usecols=['queried_stop_id', 'eta'], dtype=str)
+    df['eta'] = pd.to_datetime(df['eta'])
+    return df
+
+
+def compile_schedules(df: pd.DataFrame) -> Tuple[np.ndarray, Dict]:
+    """Structured (stop, eta_us) array and its index (stop order, slices, UTC offset) from read_etas output."""
+    stops = [str(s) for s in pd.unique(df['queried_stop_id'].dropna())]
+    df = df.dropna(subset=['queried_stop_id', 'eta'])
+    eta = df['eta']
+    if eta.dt.tz is not None:
+        offset = int(eta.min().utcoffset().total_seconds()) if len(eta) else 0
+        epoch = pd.Timestamp(0, tz='UTC')
+    else:
+        offset = None
+        epoch = pd.Timestamp(0)
+    eta_us = ((eta - epoch) // pd.Timedelta(microseconds=1)).to_numpy(np.int64)
+    stop_idx = pd.Categorical(df['queried_stop_id'], categories=stops).codes.astype(np.int32)
+    order = np.lexsort((eta_us, stop_idx))
+    stop_idx, eta_us = stop_idx[order], eta_us[order]
+    keep = np.ones(len(eta_us), dtype=bool)
+    keep[1:] = (stop_idx[1:] != stop_idx[:-1]) | (eta_us[1:] != eta_us[:-1])
+    stop_idx, eta_us = stop_idx[keep], eta_us[keep]
+
+    width = max([len(s) for s in stops] + [1])
+    arr = np.empty(len(eta_us), dtype=[('stop', f'U{width}'), ('eta_us', '<i8')])
+    arr['stop'] = np.array(stops, dtype=f'U{width}')[stop_idx] if len(stops) else ''
+    arr['eta_us'] = eta_us
+    bounds = np.searchsorted(stop_idx, np.arange(len(stops) + 1))
+    index = {
+        'stops': stops,
+        'slices': {s: [int(bounds[i]), int(bounds[i + 1])] for i, s in enumerate(stops)},
+        'utc_offset': offset,
+    }
+    return arr, index
+
+
+class ScheduleStore:
+    def __init__(self, source: str, store_dir: str = DEFAULT_STORE_DIR):
+        self.source = os.path.abspath(source)
+        key = hashlib.sha1(self.source.encode('utf-8')).hexdigest()[:16]
+        self.npy_path = os.path.join(store_dir, key + '.npy')
+        self.meta_path = os.path.join(store_dir, key + '.json')
+        self.rebuilt = False
+        meta = self._load_meta()
+        if meta is None:
+            meta = self.build()
+        self.meta = meta
+        self.stops: List[str] = meta['stops']
+        self.records = np.load(self.npy_path, mmap_mode='r')
+
+    def _load_meta(self) -> Dict | None:
+        if not (os.path.exists(self.meta_path) and os.path.exists(self.npy_path)):
+            return None
+        try:
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get('version') != STORE_VERSION or meta.get('signature') != source_signature(self.source):
+            return None
+        return meta
+
+    def build(self) -> Dict:
+        """(Re)compile the source into the store files."""
+        signature = source_signature(self.source)
+        arr, index = compile_schedules(read_etas(self.source))
+        meta = {'version': STORE_VERSION, 'source': self.source, 'signature': signature, **index}
+        os.makedirs(os.path.dirname(self.npy_path), exist_ok=True)
+        tmp = self.npy_path + '.tmp.npy'
+        np.save(tmp, arr)
+        os.replace(tmp, self.npy_path)
+        tmp = self.meta_path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp, self.meta_path)
+        self.rebuilt = True
+        return meta
+
+    def etas(self, stop_id: str) -> np.ndarray:
+        """All unique ETAs of a stop (UTC epoch microseconds, sorted); a read-only view of the mapped file."""
+        lo, hi = self.meta['slices'].get(str(stop_id), (0, 0))
+        return self.records['eta_us'][lo:hi]
+
+    def to_datetime(self, us: int) -> datetime:
+        """Epoch microseconds as a datetime in the source's UTC offset (naive if the source was)."""
+        offset = self.meta['utc_offset']
+        if offset is None:
+            return datetime(1970, 1, 1) + timedelta(microseconds=int(us))
+        tz = timezone(timedelta(seconds=offset))
+        return (datetime(1970, 1, 1, tzinfo=timezone.utc) + timedelta(microseconds=int(us))).astimezone(tz)
+
+    def window(self, stop_ids: List[str], horizon_min: int = 120, lead_min: int = 5
+               ) -> Tuple[int, Dict[str, np.ndarray]]:
+        """(start_us, {stop: ETA view}) for start = earliest ETA of the stops - lead_min, up to start + horizon_min."""
+        all_etas = {sid: self.etas(sid) for sid in stop_ids}
+        firsts = [int(e[0]) for e in all_etas.values() if len(e)]
+        if not firsts:
+            raise ValueError(f'No ETAs for stops {list(stop_ids)} in {self.source}')
+        start_us = min(firsts) - lead_min * 60 * US
+        end_us = start_us + horizon_min * 60 * US
+        return start_us, {sid: e[np.searchsorted(e, start_us, 'left'):np.searchsorted(e, end_us, 'right')]
+                          for sid, e in all_etas.items()}
+
+
+def load_schedules(source: str, stop_ids: List[str], horizon_min: int = 120, integer: bool = False,
+                   store_dir: str = DEFAULT_STORE_DIR):
+    """(env_start datetime, {stop: sorted offsets in seconds}) from the compiled store.
+
+    integer=True truncates offsets to whole seconds (sim_merge_compare), otherwise they are floats."""
+    store = ScheduleStore(source, store_dir)
+    start_us, etas = store.window(stop_ids, horizon_min)
+    schedules = {}
+    for sid, e in etas.items():
+        delta = e - start_us
+        schedules[sid] = (delta // US).tolist() if integer else (delta / US).tolist()
+    return store.to_datetime(start_us), schedules
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description='Compile ETA schedules into a memory-mapped store and show a window')
+    p.add_argument('source', help='Monitor CSV or eta_dataset directory')
+    p.add_argument('--stop-ids', nargs='+', help='Stops to show (default: all)')
+    p.add_argument('--horizon-min', type=int, default=120)
+    p.add_argument('--store-dir', default=DEFAULT_STORE_DIR, help='Store directory (default: .cache/schedules)')
+    args = p.parse_args(argv)
+
+    store = ScheduleStore(args.source, args.store_dir)
+    print(f"{'Compiled' if store.rebuilt else 'Up to date'}: {store.npy_path} "
+          f'({len(store.records)} ETAs, {len(store.stops)} stops)')
+    start_us, etas = store.window(args.stop_ids or store.stops, args.horizon_min)
+    print('Env start at', store.to_datetime(start_us).isoformat())
+    for sid, e in etas.items():
+        print(f'  {sid}: {len(e)} arrivals in {args.horizon_min} min')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+schema_registry.py
+
+Per-file cache of CSV column layouts, for scripts that scan many ETA CSVs with
+differing headers (monitor summaries, merged exports, csv_collection copies)
+and only need a few columns of each.
+
+An entry is keyed by absolute path and records the file's size and mtime, its
+header, and the mapping from canonical names (stop_id, route, eta,
+snapshot_ts) to the file's own column names, resolved with the same candidate
+lists the extract scripts used. While size and mtime are unchanged the entry
+is reused without opening the file; otherwise only the header line is read
+again. Callers can attach their own per-file state to an entry (`annotate`),
+which is dropped automatically when the file changes.
+
+Usage:
+    reg = SchemaRegistry('.cache/schema_registry.json')
+    entry = reg.lookup(path)
+    cols = entry['mapping']            # {'stop_id': 'queried_stop_id', 'eta': 'eta', ...}
+    df = pd.read_csv(path, usecols=list(cols.values()), chunksize=100_000)
+    reg.save()
+"""
+from __future__ import annotations
+import csv
+import json
+import os
+from typing import Any, Dict, Iterable, List
+
+from compressed_io import open_text
+
+COLUMN_CANDIDATES = {
+    'stop_id': ['queried_stop_id', 'stop_id', 'stopid', 'queried_stopid'],
+    'route': ['route', 'route_name', 'route_no'],
+    'eta': ['eta', 'eta_local', 'eta_ts', 'eta_time'],
+    'snapshot_ts': ['snapshot_ts', 'snapshot', 'snapshot_local', 'data_timestamp'],
+}
+REGISTRY_VERSION = 1
+
+
+def resolve_columns(columns: Iterable[str], candidates: Dict[str, List[str]] = COLUMN_CANDIDATES) -> Dict[str, str]:
+    """{canonical name: column} using the first candidate present (case-insensitive); missing names are left out."""
+    by_lower = {}
+    for c in columns:
+        by_lower.setdefault(c.lower(), c)
+    mapping = {}
+    for name, cands in candidates.items():
+        for cand in cands:
+            if cand in by_lower:
+                mapping[name] = by_lower[cand]
+                break
+    return mapping
+
+
+def read_header(path: str) -> List[str]:
+    """Column names from the first line of a (possibly compressed) CSV."""
+    with open_text(path, newline='') as f:
+        return next(csv.reader(f), [])
+
+
+class SchemaRegistry:
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('version') == REGISTRY_VERSION:
+                    self.entries = data.get('files', {})
+            except (OSError, ValueError):
+                pass
+
+    def is_current(self, path: str) -> bool:
+        entry = self.entries.get(os.path.abspath(path))
+        if entry is None:
+            return False
+        st = os.stat(path)
+        return entry['size'] == st.st_size and entry['mtime'] == st.st_mtime
+
+    def lookup(self, path: str) -> Dict[str, Any]:
+        """The file's entry, re-reading its header only if it is new or changed since it was recorded."""
+        key = os.path.abspath(path)
+        if self.is_current(path):
+            self.hits += 1
+            return self.entries[key]
+        st = os.stat(path)
+        columns = read_header(path)
+        entry = {'size': st.st_size, 'mtime': st.st_mtime, 'columns': columns, 'mapping': resolve_columns(columns)}
+        self.entries[key] = entry
+        self.misses += 1
+        self._dirty = True
+        return entry
+
+    def annotate(self, path: str, **state):
+        """Attach caller state to the file's current entry (cleared when the file changes)."""
+        self.lookup(path).update(state)
+        self._dirty = True
+
+    def prune(self) -> int:
+        """Forget files that no longer exist; returns how many were dropped."""
+        gone = [p for p in self.entries if not os.path.exists(p)]
+        for p in gone:
+            del self.entries[p]
+        self._dirty = self._dirty or bool(gone)
+        return len(gone)
+
+    def save(self):
+        if not self._dirty:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'version': REGISTRY_VERSION, 'files': self.entries}, f)
+        os.replace(tmp, self.path)
+        self._dirty = False
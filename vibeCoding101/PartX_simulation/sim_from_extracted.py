@@ -13,10 +13,11 @@ import argparse
 import json
 import os
 import datetime
-from dateutil import parser as dateparser
 import simpy
 import numpy as np
 
+from timestamps import parse_ts
+
 # reuse StopSimulation and build_schedule_from_eta logic by copying the
 # minimal required implementation here to avoid import coupling.
 
@@ -29,7 +30,7 @@ def build_schedule_from_rows(rows, now: datetime.datetime, horizon_min: int = 12
         if not eta:
             continue
         try:
-            eta_dt = dateparser.parse(eta)
+            eta_dt = parse_ts(eta)
         except Exception:
             continue
         if eta_dt < now:
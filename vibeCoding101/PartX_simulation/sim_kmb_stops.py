@@ -11,65 +11,33 @@ Outputs a short summary of average wait times and boardings.
 """
 from __future__ import annotations
 import argparse
-import requests
 import datetime
 import time
-from dateutil import parser as dateparser
 import simpy
 import numpy as np
 import pandas as pd
 from typing import List, Dict, Any
 
-BASES = {
-    'kmb': 'https://data.etabus.gov.hk',
-    'citybus': 'https://rt.data.gov.hk'
-}
+from stop_catalogue import get_index
+from timestamps import parse_ts
+from transit_client import get_client
 
 def fetch_stop_list(provider: str = 'kmb') -> List[Dict[str, Any]]:
-    if provider == 'kmb':
-        url = BASES['kmb'] + '/v1/transport/kmb/stop'
-    else:
-        url = BASES['citybus'] + '/v1/transport/citybus-nwfb/stop'
-    r = requests.get(url, timeout=20)
-    r.raise_for_status()
-    j = r.json()
-    # j['data'] expected
-    return j.get('data', [])
-
-def find_stops_by_name(names: List[str], provider: str = 'kmb') -> Dict[str, List[Dict[str,Any]]]:
-    stops = fetch_stop_list(provider=provider)
-    out = {n: [] for n in names}
-    for s in stops:
-        name_en = (s.get('name_en') or '').lower()
-        name_tc = (s.get('name_tc') or '').lower()
-        name_sc = (s.get('name_sc') or '').lower()
-        for n in names:
-            key = n.lower()
-            if key in name_en or key in name_tc or key in name_sc:
-                out[n].append(s)
-    return out
+    return get_client(provider).stop_list()
+
+def find_stops_by_name(names: List[str], provider: str = 'kmb', fuzzy: bool = False,
+                       refresh: bool = False) -> Dict[str, List[Dict[str,Any]]]:
+    """Look names up in the cached stop catalogue index (see stop_catalogue.py)."""
+    index = get_index(provider, refresh=refresh)
+    return {n: index.search(n, fuzzy=fuzzy) for n in names}
 
 def fetch_stop_eta(stop_id: str, provider: str = 'kmb') -> List[Dict[str,Any]]:
-    if provider == 'kmb':
-        url = f"{BASES['kmb']}/v1/transport/kmb/stop-eta/{stop_id}"
-    else:
-        url = f"{BASES['citybus']}/v1/transport/citybus-nwfb/stop-eta/{stop_id}"
-    r = requests.get(url, timeout=20)
-    r.raise_for_status()
-    j = r.json()
-    return j.get('data', [])
+    return get_client(provider).stop_eta(stop_id)
 
 
 def fetch_stop_by_id(stop_id: str, provider: str = 'kmb') -> Dict[str,Any]:
     """Fetch stop metadata by stop id."""
-    if provider == 'kmb':
-        url = f"{BASES['kmb']}/v1/transport/kmb/stop/{stop_id}"
-    else:
-        url = f"{BASES['citybus']}/v1/transport/citybus-nwfb/stop/{stop_id}"
-    r = requests.get(url, timeout=20)
-    r.raise_for_status()
-    j = r.json()
-    return j.get('data')
+    return get_client(provider).stop(stop_id)
 
 def build_schedule_from_eta(eta_rows: List[Dict[str,Any]], now: datetime.datetime, horizon_min: int=120) -> List[Dict[str,Any]]:
     schedule = []
@@ -79,7 +47,7 @@ def build_schedule_from_eta(eta_rows: List[Dict[str,Any]], now: datetime.datetim
         if not eta:
             continue
         try:
-            eta_dt = dateparser.parse(eta)
+            eta_dt = parse_ts(eta)
         except Exception:
             continue
         if eta_dt < now:
@@ -160,6 +128,8 @@ def main():
     p.add_argument('--stops', nargs='+', help='Stop names to search (e.g. "St. Martin Road" "Chong San Road")')
     p.add_argument('--stop-ids', nargs='*', help='Stop IDs to use directly (bypass name search)')
     p.add_argument('--provider', choices=['kmb','citybus'], default='kmb', help='API provider to use (kmb or citybus)')
+    p.add_argument('--fuzzy', action='store_true', help='Allow approximate (typo-tolerant) stop name matches')
+    p.add_argument('--refresh-stops', action='store_true', help='Revalidate the cached stop list even if it is fresh')
     p.add_argument('--horizon', type=int, default=120, help='Simulation horizon in minutes')
     p.add_argument('--rate', type=float, default=0.5, help='Passenger arrival rate (per minute)')
     p.add_argument('--capacity', type=int, default=70, help='Bus capacity')
@@ -186,7 +156,7 @@ def main():
             print('Please provide --stops or --stop-ids')
             return
         try:
-            matches = find_stops_by_name(args.stops)
+            matches = find_stops_by_name(args.stops, provider=args.provider, fuzzy=args.fuzzy, refresh=args.refresh_stops)
         except Exception as e:
             print('Failed to fetch stop list from API:', e)
             print('If network is blocked, obtain stop IDs manually and run simulation with --stop-ids option.')
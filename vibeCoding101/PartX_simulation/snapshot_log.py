@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+snapshot_log.py
+
+Append-only ETA log for the monitor. Every snapshot is flattened into one JSON
+line per ETA row (the same columns as `monitor_summary_*.csv`) and appended to
+the active segment `eta_log_{YYYYMMDD_HHMMSS}.jsonl`, which stays open between
+ticks. A segment is closed once it exceeds `max_bytes` or `max_age_sec`, then
+gzip-compressed to `.jsonl.gz`.
+
+Consolidation becomes a sequential scan over a few large segments
+(`iter_log_records`) instead of `os.listdir` + `json.load` over thousands of
+per-tick files.
+
+Usage:
+    log = SnapshotLogWriter(out_dir, max_bytes=64 * 1024 * 1024, max_age_sec=3600)
+    log.write(snapshot)          # snapshot dict as built by monitor_two_stations
+    log.close()                  # compresses the last segment
+    for rec in iter_log_records(out_dir): ...
+"""
+from __future__ import annotations
+import gzip
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterator, List
+
+from transit_client import normalize_eta_row
+
+LOG_PREFIX = 'eta_log_'
+
+SUMMARY_FIELDS = ['snapshot_ts', 'tick_ts', 'queried_stop_id', 'route', 'direction', 'eta', 'eta_seq', 'data_timestamp']
+
+
+def snapshot_rows(snapshot: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Flatten one snapshot dict into SUMMARY_FIELDS rows."""
+    snap_ts = snapshot.get('timestamp')
+    tick_ts = snapshot.get('tick_ts')
+    out = []
+    for stop in snapshot.get('stops', []):
+        sid = stop.get('stop_id')
+        for r in stop.get('rows', []):
+            row = normalize_eta_row(r, sid)
+            out.append({
+                'snapshot_ts': snap_ts,
+                'tick_ts': tick_ts,
+                'queried_stop_id': sid,
+                'route': row['route'],
+                'direction': row['direction'],
+                'eta': row['eta'],
+                'eta_seq': row['eta_seq'],
+                'data_timestamp': row['data_timestamp']
+            })
+    return out
+
+
+def compress_segment(path: str) -> str:
+    """Gzip a closed segment to `path + '.gz'` and remove the plain file."""
+    gz_path = path + '.gz'
+    with open(path, 'rb') as src, gzip.open(gz_path + '.tmp', 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    os.replace(gz_path + '.tmp', gz_path)
+    os.remove(path)
+    return gz_path
+
+
+class SnapshotLogWriter:
+    def __init__(self, out_dir: str, max_bytes: int = 64 * 1024 * 1024, max_age_sec: float | None = 3600,
+                 compress: bool = True):
+        self.out_dir = out_dir
+        self.max_bytes = max_bytes
+        self.max_age_sec = max_age_sec
+        self.compress = compress
+        self._fh = None
+        self._path = None
+        self._opened_at = 0.0
+        self.closed_segments: List[str] = []
+
+    def _open_segment(self):
+        os.makedirs(self.out_dir, exist_ok=True)
+        stem = os.path.join(self.out_dir, f"{LOG_PREFIX}{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+        path, n = stem + '.jsonl', 0
+        while os.path.exists(path) or os.path.exists(path + '.gz'):
+            n += 1
+            path = f"{stem}_{n}.jsonl"
+        self._path = path
+        self._fh = open(self._path, 'a', encoding='utf-8')
+        self._opened_at = time.monotonic()
+
+    def _should_rotate(self) -> bool:
+        if self._fh.tell() >= self.max_bytes:
+            return True
+        return self.max_age_sec is not None and time.monotonic() - self._opened_at >= self.max_age_sec
+
+    def rotate(self):
+        """Close the active segment (compressing it) so the next write opens a new one."""
+        if self._fh is None:
+            return
+        self._fh.close()
+        path = compress_segment(self._path) if self.compress else self._path
+        self.closed_segments.append(path)
+        self._fh = None
+        self._path = None
+
+    def write(self, snapshot: Dict[str, Any]) -> str:
+        """Append one line per ETA row of `snapshot`; return the active segment path."""
+        if self._fh is not None and self._should_rotate():
+            self.rotate()
+        if self._fh is None:
+            self._open_segment()
+        lines = [json.dumps(r, ensure_ascii=False, separators=(',', ':')) for r in snapshot_rows(snapshot)]
+        if lines:
+            self._fh.write('\n'.join(lines) + '\n')
+            self._fh.flush()
+        return self._path
+
+    def close(self):
+        self.rotate()
+
+
+def list_segments(out_dir: str) -> List[str]:
+    """Segments in write order (the timestamped names sort chronologically)."""
+    return sorted(
+        os.path.join(out_dir, f) for f in os.listdir(out_dir)
+        if f.startswith(LOG_PREFIX) and (f.endswith('.jsonl') or f.endswith('.jsonl.gz'))
+    )
+
+
+def iter_segment(path: str) -> Iterator[Dict[str, Any]]:
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # a torn last line from an interrupted writer
+                continue
+
+
+def segment_key(path: str) -> str:
+    """Stable name of a segment across compression (`eta_log_x.jsonl` for `.jsonl` and `.jsonl.gz`)."""
+    name = os.path.basename(path)
+    return name[:-3] if name.endswith('.gz') else name
+
+
+def iter_segment_from(path: str, consumed: int = 0) -> Iterator[tuple]:
+    """Yield (end_offset, record) for complete lines after byte `consumed` of the uncompressed stream.
+
+    Offsets are in uncompressed bytes, so a position recorded while the segment
+    was still plain `.jsonl` stays valid after it is gzip-compressed.
+    """
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rb') as f:
+        f.seek(consumed)
+        pos = consumed
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            pos += len(line)
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield pos, json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def iter_log_records(out_dir: str) -> Iterator[Dict[str, Any]]:
+    """Stream every ETA row record from all segments in out_dir, oldest first."""
+    for path in list_segments(out_dir):
+        yield from iter_segment(path)
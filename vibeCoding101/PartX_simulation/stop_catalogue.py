@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+stop_catalogue.py
+
+Cached, indexed KMB / Citybus stop catalogue for name lookups
+(`sim_kmb_stops.find_stops_by_name`).
+
+ - The full stop list is cached on disk (`.cache/{provider}_stops.json` next to
+   this file) with the response's ETag / Last-Modified. Within `ttl_sec` the
+   cache is used as is; after that it is revalidated with a conditional GET
+   (a 304 only refreshes the timestamp). If the network is unavailable a stale
+   cache is still used, so lookups work offline.
+ - `StopIndex` tokenizes EN / TC / SC names (words for English, single
+   characters for Chinese) into an inverted index with a sorted vocabulary, so
+   a query is a few bisects and set intersections instead of a scan over every
+   stop x every name x three languages.
+
+Usage:
+    from stop_catalogue import get_index
+    idx = get_index('kmb')
+    idx.search('St. Martin')               # word-prefix match (falls back to substring)
+    idx.search('Chnog San Road', fuzzy=True)  # tolerate typos
+"""
+from __future__ import annotations
+import bisect
+import difflib
+import json
+import os
+import re
+import time
+from typing import Any, Dict, List, Set
+
+from transit_client import get_client
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache')
+DEFAULT_TTL_SEC = 24 * 3600
+NAME_FIELDS = ('name_en', 'name_tc', 'name_sc')
+
+_WORD_RE = re.compile(r'[a-z0-9]+')
+_CJK_RE = re.compile(r'[㐀-鿿豈-﫿]')
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase English words / digits plus individual CJK characters."""
+    text = (text or '').lower()
+    return _WORD_RE.findall(text) + _CJK_RE.findall(text)
+
+
+def cache_path(provider: str) -> str:
+    return os.path.join(CACHE_DIR, f'{provider}_stops.json')
+
+
+def load_stop_list(provider: str = 'kmb', ttl_sec: float = DEFAULT_TTL_SEC, path: str | None = None,
+                   refresh: bool = False) -> List[Dict[str, Any]]:
+    """Return the stop list from the disk cache, revalidating with the API once the TTL has passed."""
+    path = path or cache_path(provider)
+    cached = None
+    if os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+        except Exception:
+            cached = None
+    if cached and not refresh and time.time() - cached.get('fetched_at', 0) < ttl_sec:
+        return cached['data']
+
+    client = get_client(provider)
+    headers = {}
+    if cached:
+        if cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+        if cached.get('last_modified'):
+            headers['If-Modified-Since'] = cached['last_modified']
+    try:
+        resp = client.get(client.endpoint_url('stop'), endpoint='stop', headers=headers)
+        if resp.status_code == 304 and cached:
+            cached['fetched_at'] = time.time()
+        else:
+            resp.raise_for_status()
+            cached = {
+                'fetched_at': time.time(),
+                'etag': resp.headers.get('ETag'),
+                'last_modified': resp.headers.get('Last-Modified'),
+                'data': resp.json().get('data', []),
+            }
+    except Exception as e:
+        if cached:
+            print(f'Stop list refresh failed ({e}); using cached copy from {path}')
+            return cached['data']
+        raise
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(cached, f, ensure_ascii=False)
+    os.replace(tmp, path)
+    return cached['data']
+
+
+class StopIndex:
+    def __init__(self, stops: List[Dict[str, Any]]):
+        self.stops = stops
+        self._names = [' '.join((s.get(k) or '').lower() for k in NAME_FIELDS) for s in stops]
+        postings: Dict[str, Set[int]] = {}
+        for i, s in enumerate(stops):
+            for k in NAME_FIELDS:
+                for tok in tokenize(s.get(k)):
+                    postings.setdefault(tok, set()).add(i)
+        self._postings = postings
+        self._vocab = sorted(postings)
+
+    def _prefix_ids(self, prefix: str) -> Set[int]:
+        out: Set[int] = set()
+        i = bisect.bisect_left(self._vocab, prefix)
+        while i < len(self._vocab) and self._vocab[i].startswith(prefix):
+            out |= self._postings[self._vocab[i]]
+            i += 1
+        return out
+
+    def _fuzzy_ids(self, token: str, cutoff: float) -> Set[int]:
+        out: Set[int] = set()
+        for tok in difflib.get_close_matches(token, self._vocab, n=5, cutoff=cutoff):
+            out |= self._postings[tok]
+        return out
+
+    def search(self, query: str, fuzzy: bool = False, cutoff: float = 0.75) -> List[Dict[str, Any]]:
+        """Stops whose names contain every query token as a word prefix.
+
+        Chinese queries are additionally checked as contiguous substrings. When
+        nothing matches, falls back to the old plain substring scan, then (with
+        `fuzzy`) to close matches of each token in the vocabulary.
+        """
+        tokens = tokenize(query)
+        key = (query or '').lower()
+        if not tokens:
+            return []
+        ids = None
+        for tok in tokens:
+            found = self._prefix_ids(tok)
+            ids = found if ids is None else ids & found
+            if not ids:
+                break
+        cjk = ''.join(_CJK_RE.findall(key))
+        if ids and cjk:
+            ids = {i for i in ids if cjk in self._names[i]}
+        if not ids:
+            ids = {i for i, name in enumerate(self._names) if key in name}
+        if not ids and fuzzy:
+            for tok in tokens:
+                found = self._prefix_ids(tok) or self._fuzzy_ids(tok, cutoff)
+                ids = found if ids is None or not ids else ids & found
+                if not ids:
+                    break
+        return [self.stops[i] for i in sorted(ids or ())]
+
+
+_indexes: Dict[str, StopIndex] = {}
+
+
+def get_index(provider: str = 'kmb', ttl_sec: float = DEFAULT_TTL_SEC, refresh: bool = False) -> StopIndex:
+    """Return the in-memory index for `provider`, loading the (cached) stop list on first use."""
+    if refresh or provider not in _indexes:
+        _indexes[provider] = StopIndex(load_stop_list(provider, ttl_sec=ttl_sec, refresh=refresh))
+    return _indexes[provider]
@@ -0,0 +1,29 @@
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from adaptive_schedule import AdaptivePollSchedule  # noqa: E402
+
+
+class FakeClock:
+    def __init__(self):
+        self.t = 0.0
+
+    def __call__(self):
+        return self.t
+
+
+def test_imminent_stop_polled_every_tick():
+    clock = FakeClock()
+    sched = AdaptivePollSchedule(['A'], min_interval_sec=10, max_interval_sec=120, clock=clock)
+    now = datetime(2025, 11, 24, 7, 0, tzinfo=timezone(timedelta(hours=8)))
+    rows = [{'eta_seq': 1, 'eta': (now + timedelta(seconds=60)).isoformat()}]
+    polled = []
+    for tick in range(11):
+        clock.t = tick * 10.0
+        for sid in sched.due():
+            clock.t += 0.05  # the fetch takes a moment
+            sched.update(sid, rows, now)
+            polled.append(tick)
+    assert polled == list(range(11))
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+tick_scheduler.py
+
+Drift-free tick scheduling for the monitors (`monitor_two_stations.monitor_loop`,
+`tools/run_monitor_window.run_monitor_window`).
+
+Sleeping a fixed interval after each fetch shifts every later snapshot by the
+fetch latency. Here tick k is due at `start + k * interval` on the monotonic
+clock, so latency never accumulates. A tick that fires after its boundary
+records its lateness; when a fetch overruns one or more whole boundaries the
+overdue ticks are either skipped (wait for the next boundary) or coalesced
+(fire once immediately, stamped with the latest overdue boundary).
+
+Every fired tick carries a `tick_ts` wall-clock stamp on the exact grid, which
+downstream per-minute aggregation (`monitor_analysis.py`) can bucket on.
+
+Usage:
+    sched = TickScheduler(30, duration_sec=3600)
+    for tick in sched.ticks():
+        fetch_something(tick)      # fetch_s is measured when the loop resumes
+    sched.write_log('tick_log.csv')
+"""
+from __future__ import annotations
+import asyncio
+import csv
+import os
+import time
+from datetime import datetime, timedelta
+
+LATE_POLICIES = ('skip', 'coalesce')
+
+# `breaker` is filled in by callers that fetch over transit_client (upstream circuit breaker state)
+TICK_LOG_FIELDS = ['tick', 'tick_ts', 'fired_ts', 'lateness_s', 'fetch_s', 'skipped', 'breaker']
+
+
+class TickScheduler:
+    def __init__(self, interval_sec: float, duration_sec: float | None = None, late_policy: str = 'skip',
+                 max_lateness_sec: float | None = None, align: bool = False,
+                 clock=time.monotonic, sleep=time.sleep):
+        """
+        interval_sec: spacing of tick boundaries.
+        duration_sec: stop once the next boundary is at or beyond start + duration (None = forever).
+        late_policy: 'skip' drops overdue ticks, 'coalesce' fires one catch-up tick for them.
+        max_lateness_sec: with 'skip', a tick later than this is also dropped (default: half an interval).
+        align: start on a wall-clock multiple of the interval (e.g. :00/:30 for 30 s) instead of now.
+        """
+        if interval_sec <= 0:
+            raise ValueError('interval_sec must be positive')
+        if late_policy not in LATE_POLICIES:
+            raise ValueError(f'late_policy must be one of {LATE_POLICIES}')
+        self.interval = float(interval_sec)
+        self.duration = duration_sec
+        self.late_policy = late_policy
+        self.max_lateness = self.interval / 2 if max_lateness_sec is None else max_lateness_sec
+        self.align = align
+        self.clock = clock
+        self.sleep = sleep
+        self.records = []
+        self._start_mono = None
+        self._start_wall = None
+        self._end_mono = None
+        self._k = 0
+        self._pending_skips = 0
+
+    def _begin(self):
+        now_mono = self.clock()
+        now_wall = datetime.now().astimezone()
+        offset = 0.0
+        if self.align:
+            offset = (-now_wall.timestamp()) % self.interval
+        self._start_mono = now_mono + offset
+        self._start_wall = now_wall + timedelta(seconds=offset)
+        self._end_mono = None if self.duration is None else now_mono + self.duration
+        self._k = 0
+        self._pending_skips = 0
+
+    def _due(self, k: int) -> float:
+        return self._start_mono + k * self.interval
+
+    def _next_wait(self):
+        """Return seconds to wait before the next tick, or None when the window is over."""
+        target = self._due(self._k)
+        if self._end_mono is not None and target >= self._end_mono:
+            return None
+        return max(0.0, target - self.clock())
+
+    def _fire(self):
+        """Resolve lateness for the current boundary; return (tick, fired_mono) or None if skipped."""
+        now = self.clock()
+        lateness = now - self._due(self._k)
+        skipped = 0
+        if lateness >= self.interval:
+            # one or more whole boundaries were overrun: jump to the latest overdue one
+            missed = int(lateness // self.interval)
+            self._k += missed
+            skipped += missed
+            lateness = now - self._due(self._k)
+        if self.late_policy == 'skip' and lateness > self.max_lateness:
+            self._k += 1
+            self._pending_skips += skipped + 1
+            return None
+        skipped += self._pending_skips
+        self._pending_skips = 0
+        tick = {
+            'tick': self._k,
+            'tick_ts': (self._start_wall + timedelta(seconds=self._k * self.interval)).isoformat(),
+            'fired_ts': datetime.now().astimezone().isoformat(),
+            'lateness_s': round(lateness, 4),
+            'fetch_s': None,
+            'skipped': skipped,
+            'breaker': None,
+        }
+        self._k += 1
+        return tick, now
+
+    def _complete(self, tick, fired_mono):
+        tick['fetch_s'] = round(self.clock() - fired_mono, 4)
+        self.records.append(tick)
+
+    def ticks(self):
+        """Yield tick dicts on the absolute grid; blocking sleeps between them."""
+        self._begin()
+        while True:
+            wait = self._next_wait()
+            if wait is None:
+                return
+            if wait > 0:
+                self.sleep(wait)
+            fired = self._fire()
+            if fired is None:
+                continue
+            tick, fired_mono = fired
+            yield tick
+            self._complete(tick, fired_mono)
+
+    async def aticks(self):
+        """Async-generator variant of `ticks` using `asyncio.sleep`."""
+        self._begin()
+        while True:
+            wait = self._next_wait()
+            if wait is None:
+                return
+            if wait > 0:
+                await asyncio.sleep(wait)
+            fired = self._fire()
+            if fired is None:
+                continue
+            tick, fired_mono = fired
+            yield tick
+            self._complete(tick, fired_mono)
+
+    def write_log(self, path: str):
+        """Append the recorded ticks to a CSV (header written when the file is new)."""
+        if not self.records:
+            return None
+        new_file = not os.path.exists(path)
+        with open(path, 'a', encoding='utf-8', newline='') as f:
+            w = csv.DictWriter(f, fieldnames=TICK_LOG_FIELDS)
+            if new_file:
+                w.writeheader()
+            w.writerows(self.records)
+        return path
+
+    def summary(self) -> dict:
+        """Return tick count, total skipped ticks and mean/max lateness and fetch time."""
+        if not self.records:
+            return {'ticks': 0, 'skipped': 0}
+        lat = [r['lateness_s'] for r in self.records]
+        fetch = [r['fetch_s'] for r in self.records if r['fetch_s'] is not None]
+        return {
+            'ticks': len(self.records),
+            'skipped': sum(r['skipped'] for r in self.records),
+            'lateness_mean_s': round(sum(lat) / len(lat), 4),
+            'lateness_max_s': round(max(lat), 4),
+            'fetch_mean_s': round(sum(fetch) / len(fetch), 4) if fetch else None,
+            'fetch_max_s': round(max(fetch), 4) if fetch else None,
+        }
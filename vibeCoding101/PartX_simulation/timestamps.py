@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+timestamps.py
+
+Shared timestamp parsing for the pollers and the analysis tools.
+
+ETA files repeat the same few strings over and over (every row of a snapshot
+carries the same `snapshot_ts`, and an ETA stays unchanged across many ticks),
+and nearly all of them are plain ISO-8601. So:
+
+ - `parse_ts(s)` tries `datetime.fromisoformat` first (C fast path, handles
+   `+08:00` offsets, fractional seconds and `Z`), falls back to a short list of
+   `strptime` formats, and memoizes results in an LRU cache.
+ - `TimestampParser` is meant for one CSV column: the first value's format is
+   sniffed and locked in, so later rows go straight to that format (it is
+   re-sniffed only if a value stops matching), with its own memo of repeated
+   strings (failures included). A column whose first `give_up_after` values
+   all fail is treated as not holding timestamps and rejected without parsing.
+   `column_parsers()` hands out one parser per column name. datetime values
+   (from typed sources such as eta_dataset) pass through unchanged.
+
+Both raise ValueError for unparseable input. `default_tz` is attached to naive
+results (e.g. HK time for files written without an offset).
+
+Usage:
+    eta_dt = parse_ts('2025-11-24T07:03:12+08:00')
+    ts = column_parsers(default_tz=HK_TZ)
+    for row in rows:
+        snap = ts['snapshot_ts'](row['snapshot_ts'])
+"""
+from __future__ import annotations
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone, tzinfo
+from functools import lru_cache
+
+HK_TZ = timezone(timedelta(hours=8))
+ISO = 'iso'
+FALLBACK_FORMATS = [
+    '%Y-%m-%dT%H:%M:%S%z',
+    '%Y-%m-%dT%H:%M:%S.%f%z',
+    '%Y-%m-%d %H:%M:%S%z',
+    '%Y-%m-%d %H:%M:%S.%f%z',
+    '%Y-%m-%d %H:%M:%S',
+    '%Y/%m/%d %H:%M:%S',
+    '%Y%m%d_%H%M%S',
+    '%Y-%m-%d',
+]
+
+
+def parse_with(fmt: str, s: str) -> datetime:
+    return datetime.fromisoformat(s) if fmt == ISO else datetime.strptime(s, fmt)
+
+
+def sniff_format(s: str) -> str | None:
+    """The first format (ISO, then FALLBACK_FORMATS) that parses s, or None."""
+    for fmt in [ISO] + FALLBACK_FORMATS:
+        try:
+            parse_with(fmt, s)
+            return fmt
+        except ValueError:
+            continue
+    return None
+
+
+@lru_cache(maxsize=1 << 16)
+def parse_ts(s: str, default_tz: tzinfo | None = None) -> datetime:
+    """Parse one timestamp string (memoized); raises ValueError if no known format matches."""
+    text = s.strip() if isinstance(s, str) else ''  # None, NaN and numbers from pandas are not timestamps
+    fmt = sniff_format(text) if text else None
+    if fmt is None:
+        raise ValueError(f'unrecognized timestamp: {s!r}')
+    dt = parse_with(fmt, text)
+    if default_tz is not None and dt.tzinfo is None:
+        dt = dt.replace(tzinfo=default_tz)
+    return dt
+
+
+_FAILED = object()
+
+
+class TimestampParser:
+    def __init__(self, default_tz: tzinfo | None = None, cache_size: int = 1 << 16, give_up_after: int = 50):
+        self.default_tz = default_tz
+        self.cache_size = cache_size
+        self.give_up_after = give_up_after
+        self.fmt: str | None = None
+        self._cache = {}
+        self.parsed = 0
+        self.failed = 0
+        self.sniffs = 0
+        self.hits = 0
+
+    def __call__(self, s: str) -> datetime:
+        if isinstance(s, datetime):
+            # already typed (e.g. rows read from eta_dataset): only the default zone applies
+            return s if s.tzinfo is not None or self.default_tz is None else s.replace(tzinfo=self.default_tz)
+        dt = self._cache.get(s)
+        if dt is None:
+            if self.parsed == 0 and self.failed >= self.give_up_after:
+                raise ValueError('column holds no recognized timestamps')
+            try:
+                dt = self._parse(s.strip() if isinstance(s, str) else '')
+                if dt.tzinfo is None and self.default_tz is not None:
+                    dt = dt.replace(tzinfo=self.default_tz)
+                self.parsed += 1
+            except ValueError:
+                dt = _FAILED
+                self.failed += 1
+            if len(self._cache) >= self.cache_size:
+                self._cache.clear()
+            self._cache[s] = dt
+        else:
+            self.hits += 1
+        if dt is _FAILED:
+            raise ValueError(f'unrecognized timestamp: {s!r}')
+        return dt
+
+    def _parse(self, s: str) -> datetime:
+        if self.fmt is not None:
+            try:
+                return parse_with(self.fmt, s)
+            except ValueError:
+                pass
+        fmt = sniff_format(s) if s else None
+        if fmt is None:
+            raise ValueError(f'unrecognized timestamp: {s!r}')
+        self.fmt = fmt
+        self.sniffs += 1
+        return parse_with(fmt, s)
+
+
+def column_parsers(default_tz: tzinfo | None = None) -> defaultdict:
+    """{column name: TimestampParser}, created on first use."""
+    return defaultdict(lambda: TimestampParser(default_tz=default_tz))
@@ -6,6 +6,7 @@ Usage:
 
 Options:
   --peak-ranges  Comma-separated time ranges (HH:MM-HH:MM) to treat as peak. Default: 07:00-09:00,17:00-19:00
+  --workers      Processes used to parse the CSVs (default: CPU count; 1 = sequential)
 """
 import argparse
 import sys
@@ -13,6 +14,10 @@ from pathlib import Path
 import pandas as pd
 import numpy as np
 from datetime import datetime, time
+from functools import partial
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from parallel_ingest import add_workers_arg, map_files  # noqa: E402
 
 
 def parse_peak_ranges(s: str):
@@ -49,61 +54,70 @@ def try_parse_datetime(col):
         return pd.to_datetime(col, errors='coerce')
 
 
-def aggregate(input_dir: Path, out_agg: Path, peak_ranges):
-    files = collect_csv_files(input_dir)
+def aggregate_file(f: Path, input_dir: Path, peak_ranges):
+    """Aggregation records for one CSV (runs in a worker process); [] if it cannot be read."""
     rows = []
-    for f in files:
-        try:
-            df = pd.read_csv(f)
-        except Exception:
-            continue
-        source = str(f.relative_to(input_dir))
-
-        # find any datetime-like column (prefer 'eta' or 'datetime' or 'time')
-        dt_cols = [c for c in df.columns if c.lower() in ('eta','datetime','time','timestamp')]
-        if not dt_cols:
-            # attempt to find any column with datetime-like values
-            for c in df.columns:
-                parsed = try_parse_datetime(df[c])
-                if parsed.notna().any():
-                    dt_cols = [c]
-                    break
-        if dt_cols:
-            dtcol = dt_cols[0]
-            dts = try_parse_datetime(df[dtcol])
-            for i,dt in enumerate(dts):
-                if pd.isna(dt):
-                    continue
-                tag = 'peak' if is_peak(dt.to_pydatetime(), peak_ranges) else 'off-peak'
-                date = dt.date()
-                time_s = dt.time()
-                # collect row: keep original columns as JSON-friendly strings where necessary
-                rec = {
-                    'source_file': source,
-                    'row_index': i,
-                    'datetime': dt.isoformat(),
-                    'date': date.isoformat(),
-                    'time': time_s.strftime('%H:%M:%S'),
-                    'peak_or_offpeak': tag,
-                }
-                # attach some commonly useful columns if present
-                for col in ('queried_stop_id','stop_id','route','routes','avg_waiting_time','avg_queue_time'):
-                    if col in df.columns:
-                        val = df.at[i, col] if i < len(df) else np.nan
-                        rec[col] = val
-                rows.append(rec)
-        else:
-            # no datetime found; write a summary row with file-level stats
+    try:
+        df = pd.read_csv(f)
+    except Exception:
+        return rows
+    source = str(f.relative_to(input_dir))
+
+    # find any datetime-like column (prefer 'eta' or 'datetime' or 'time')
+    dt_cols = [c for c in df.columns if c.lower() in ('eta','datetime','time','timestamp')]
+    if not dt_cols:
+        # attempt to find any column with datetime-like values
+        for c in df.columns:
+            parsed = try_parse_datetime(df[c])
+            if parsed.notna().any():
+                dt_cols = [c]
+                break
+    if dt_cols:
+        dtcol = dt_cols[0]
+        dts = try_parse_datetime(df[dtcol])
+        for i,dt in enumerate(dts):
+            if pd.isna(dt):
+                continue
+            tag = 'peak' if is_peak(dt.to_pydatetime(), peak_ranges) else 'off-peak'
+            date = dt.date()
+            time_s = dt.time()
+            # collect row: keep original columns as JSON-friendly strings where necessary
             rec = {
                 'source_file': source,
-                'row_index': -1,
-                'datetime': None,
-                'date': None,
-                'time': None,
-                'peak_or_offpeak': 'unknown',
-                'note': 'no datetime-like column'
+                'row_index': i,
+                'datetime': dt.isoformat(),
+                'date': date.isoformat(),
+                'time': time_s.strftime('%H:%M:%S'),
+                'peak_or_offpeak': tag,
             }
+            # attach some commonly useful columns if present
+            for col in ('queried_stop_id','stop_id','route','routes','avg_waiting_time','avg_queue_time'):
+                if col in df.columns:
+                    val = df.at[i, col] if i < len(df) else np.nan
+                    rec[col] = val
             rows.append(rec)
+    else:
+        # no datetime found; write a summary row with file-level stats
+        rec = {
+            'source_file': source,
+            'row_index': -1,
+            'datetime': None,
+            'date': None,
+            'time': None,
+            'peak_or_offpeak': 'unknown',
+            'note': 'no datetime-like column'
+        }
+        rows.append(rec)
+    return rows
+
+
+def aggregate(input_dir: Path, out_agg: Path, peak_ranges, workers=None):
+    files = collect_csv_files(input_dir)
+    rows = []
+    # files are parsed in a process pool; records come back in file order
+    for _, file_rows, _ in map_files(partial(aggregate_file, input_dir=input_dir, peak_ranges=peak_ranges), files,
+                                     workers=workers):
+        rows.extend(file_rows or [])
 
     if rows:
         outdf = pd.DataFrame(rows)
@@ -151,6 +165,7 @@ def main():
     p.add_argument('--out-agg', type=str, default='aggregated_by_date_peak_offpeak.csv')
     p.add_argument('--out-alloc', type=str, default='route_allocation_summary.csv')
     p.add_argument('--peak-ranges', type=str, default='07:00-09:00,17:00-19:00')
+    add_workers_arg(p)
     args = p.parse_args()
 
     input_dir = Path(args.input_dir)
@@ -162,7 +177,7 @@ def main():
         print('Input dir not found:', input_dir)
         sys.exit(2)
 
-    aggregate(input_dir, out_agg, peak_ranges)
+    aggregate(input_dir, out_agg, peak_ranges, workers=args.workers)
     route_allocation_summary(input_dir, out_alloc)
 
 
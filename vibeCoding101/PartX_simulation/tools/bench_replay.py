@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Benchmark the pollers against the local replay server (`replay_server.py` in the parent folder)
+instead of the real government APIs.
+
+Starts a replay server in-process with the given archive and load-shaping options, then runs
+each selected poller for `--ticks` back-to-back rounds and reports throughput and latency
+percentiles:
+
+  serial  - monitor_two_stations' sequential per-stop fetch (shared TransitClient)
+  fanout  - monitor_two_stations' asyncio fan-out (`--concurrency` requests in flight)
+  window  - run_monitor_window.take_snapshot in http mode over the stop-eta URLs (per snapshot,
+            `--concurrency` URLs in parallel)
+  mtr     - MTRAPIClient.get_next_train for every recorded line/station
+
+Example:
+
+python tools/bench_replay.py --snapshots monitor_outputs_1hr \
+  --mtr ../Part2APIaccessGovOpenData/MTRexamples/mtr_api_output.json \
+  --latency-ms 50 --jitter-ms 30 --error-rate 0.01 --stop-count 40 --ticks 5 --concurrency 16
+"""
+
+from __future__ import annotations
+import argparse
+import asyncio
+import csv
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+from urllib.parse import urlsplit
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "Part2APIaccessGovOpenData" / "MTRexamples"))
+from replay_server import MTR_PATH, add_server_args, server_from_args  # noqa: E402
+from transit_client import TransitClient, configure_host  # noqa: E402
+import run_monitor_window  # noqa: E402
+from event_log import EventLogWriter  # noqa: E402
+
+RESULT_FIELDS = ["mode", "unit", "n", "errors", "elapsed_s", "per_sec", "p50_ms", "p95_ms", "p99_ms", "max_ms"]
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return float("nan")
+    i = min(len(sorted_values) - 1, max(0, int(round(q / 100.0 * (len(sorted_values) - 1)))))
+    return sorted_values[i]
+
+
+def summarize(mode: str, unit: str, latencies: List[float], errors: int, elapsed: float) -> Dict:
+    lat = sorted(latencies)
+    return {
+        "mode": mode,
+        "unit": unit,
+        "n": len(lat),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "per_sec": round(len(lat) / elapsed, 1) if elapsed > 0 else None,
+        "p50_ms": round(percentile(lat, 50) * 1000, 1),
+        "p95_ms": round(percentile(lat, 95) * 1000, 1),
+        "p99_ms": round(percentile(lat, 99) * 1000, 1),
+        "max_ms": round(lat[-1] * 1000, 1) if lat else None,
+    }
+
+
+def timed(fn, *args):
+    """Run fn(*args); return (seconds, ok)."""
+    t0 = time.perf_counter()
+    try:
+        fn(*args)
+        ok = True
+    except Exception:
+        ok = False
+    return time.perf_counter() - t0, ok
+
+
+def bench_serial(base_url: str, stop_ids: List[str], ticks: int) -> Dict:
+    client = TransitClient("kmb", base_url=base_url)
+    lat, errors = [], 0
+    t0 = time.perf_counter()
+    for _ in range(ticks):
+        for sid in stop_ids:
+            dt, ok = timed(client.stop_eta, sid)
+            lat.append(dt)
+            errors += not ok
+    out = summarize("serial", "request", lat, errors, time.perf_counter() - t0)
+    client.close()
+    return out
+
+
+def bench_fanout(base_url: str, stop_ids: List[str], ticks: int, concurrency: int) -> Dict:
+    async def run():
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=concurrency))
+        semaphore = asyncio.Semaphore(concurrency)
+        lat, errors = [], 0
+        with TransitClient("kmb", base_url=base_url, pool_size=concurrency) as client:
+            async def one(sid):
+                async with semaphore:
+                    return await loop.run_in_executor(None, timed, client.stop_eta, sid)
+
+            t0 = time.perf_counter()
+            for _ in range(ticks):
+                for dt, ok in await asyncio.gather(*[one(sid) for sid in stop_ids]):
+                    lat.append(dt)
+                    errors += not ok
+            return summarize(f"fanout x{concurrency}", "request", lat, errors, time.perf_counter() - t0)
+
+    return asyncio.run(run())
+
+
+def bench_window(base_url: str, stop_ids: List[str], ticks: int, concurrency: int) -> Dict:
+    urls = [f"{base_url}/v1/transport/kmb/stop-eta/{sid}" for sid in stop_ids]
+    run_monitor_window.get_client(pool_size=run_monitor_window.pool_size([concurrency]))
+    out_dir = Path(tempfile.mkdtemp(prefix="bench_window_"))
+    try:
+        log_file = out_dir / "monitor_log.csv"
+        lat = []
+        t0 = time.perf_counter()
+        with EventLogWriter(log_file, fields=run_monitor_window.MONITOR_LOG_FIELDS) as log:
+            for idx in range(ticks):
+                t1 = time.perf_counter()
+                run_monitor_window.take_snapshot("http", urls, None, out_dir, log, str(idx), idx, 30, concurrency)
+                lat.append(time.perf_counter() - t1)
+        elapsed = time.perf_counter() - t0
+        with log_file.open("r", encoding="utf8", newline="") as f:
+            errors = sum(1 for row in csv.DictReader(f) if row["status"] in ("ERROR", "CIRCUIT_OPEN"))
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+    return summarize(f"window x{concurrency}", "snapshot", lat, errors, elapsed)
+
+
+def bench_mtr(base_url: str, stations: List[tuple], ticks: int) -> Dict:
+    from mtr_api_test import MTRAPIClient
+
+    client = MTRAPIClient(base_url=base_url + MTR_PATH)
+    lat, errors = [], 0
+    t0 = time.perf_counter()
+    for _ in range(ticks):
+        for line, sta in stations:
+            t1 = time.perf_counter()
+            data = client.get_next_train(line, sta)
+            lat.append(time.perf_counter() - t1)
+            errors += data.get("status") != 1
+    return summarize("mtr", "request", lat, errors, time.perf_counter() - t0)
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Benchmark pollers against the local replay server.")
+    add_server_args(p)
+    p.add_argument("--modes", nargs="+", default=["serial", "fanout", "window", "mtr"],
+                   choices=("serial", "fanout", "window", "mtr"))
+    p.add_argument("--ticks", type=int, default=3, help="Rounds per mode")
+    p.add_argument("--stop-count", type=int, default=None,
+                   help="Stops per round (cycles through the archived stop ids; default: all of them)")
+    p.add_argument("--concurrency", type=int, default=16, help="In-flight requests for the fanout and window modes")
+    p.add_argument("--rate-per-sec", type=float, default=None,
+                   help="Client-side per-host rate limit during the run (default: unlimited)")
+    p.add_argument("--out", default=None, help="Also write the results table to this CSV")
+    args = p.parse_args(argv)
+
+    server = server_from_args(args).start()
+    configure_host(urlsplit(server.url).netloc, rate_per_sec=args.rate_per_sec)
+    archive_stops = server.archive.stop_ids()
+    n = args.stop_count or len(archive_stops)
+    stop_ids = [archive_stops[i % len(archive_stops)] for i in range(n)] if archive_stops else []
+    stations = []
+    for key in server.archive.keys():
+        if key.startswith(MTR_PATH + "?"):
+            params = dict(kv.split("=", 1) for kv in key.split("?", 1)[1].split("&"))
+            stations.append((params.get("line"), params.get("sta")))
+    print(f"Replay server on {server.url}: {len(archive_stops)} stops, {len(stations)} MTR stations")
+
+    results = []
+    try:
+        for mode in args.modes:
+            if mode in ("serial", "fanout", "window") and not stop_ids:
+                print(f"Skipping {mode}: no stop-eta recordings (pass --snapshots)")
+                continue
+            if mode == "mtr" and not stations:
+                print("Skipping mtr: no MTR recordings (pass --mtr)")
+                continue
+            if mode == "serial":
+                results.append(bench_serial(server.url, stop_ids, args.ticks))
+            elif mode == "fanout":
+                results.append(bench_fanout(server.url, stop_ids, args.ticks, args.concurrency))
+            elif mode == "window":
+                results.append(bench_window(server.url, stop_ids, args.ticks, args.concurrency))
+            elif mode == "mtr":
+                results.append(bench_mtr(server.url, stations, args.ticks))
+            print(results[-1])
+    finally:
+        stats = dict(server.counts)
+        server.stop()
+
+    print()
+    print("  ".join(f"{f:>12}" for f in RESULT_FIELDS))
+    for r in results:
+        print("  ".join(f"{str(r[f]):>12}" for f in RESULT_FIELDS))
+    print(f"Server counters: {stats}")
+    if args.out and results:
+        with open(args.out, "w", encoding="utf8", newline="") as f:
+            w = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+            w.writeheader()
+            w.writerows(results)
+        print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,15 +4,11 @@ import argparse
 from datetime import datetime, time
 from pathlib import Path
 import csv
+import sys
 
-
-def parse_iso_ts(s: str) -> datetime:
-    try:
-        return datetime.fromisoformat(s)
-    except Exception:
-        if "+" in s:
-            s = s.split("+")[0]
-        return datetime.fromisoformat(s)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from compressed_io import iter_records  # noqa: E402
+from timestamps import column_parsers  # noqa: E402
 
 
 def is_peak(dt: datetime, peak_ranges: list[tuple[time, time]]) -> bool | None:
@@ -50,19 +46,19 @@ def parse_peak_ranges(s: str) -> list[tuple[time, time]]:
 
 
 def load_rows(csv_path: Path):
-    with csv_path.open("r", encoding="utf8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            yield row
+    """Stream rows from a CSV or JSONL input, optionally .gz/.zst-compressed."""
+    yield from iter_records(csv_path)
 
 
 def analyze(input_csv: Path, stop1: str, stop2: str, peak_ranges: list[tuple[time, time]], offpeak_ranges: list[tuple[time, time]], out_csv: Path, out_md: Path):
     # Build per snapshot+route map for quick pairing
     # key: (snapshot_ts, route) -> {stop_id: {seq: eta_dt}}
     data = {}
+    # one format-locked, memoizing parser per column (snapshot_ts repeats on every row of a snapshot)
+    ts = column_parsers()
     for row in load_rows(input_csv):
         try:
-            snap = parse_iso_ts(row.get("snapshot_ts", ""))
+            snap = ts["snapshot_ts"](row.get("snapshot_ts", ""))
         except Exception:
             continue
         # Filter: only include times within analysis windows
@@ -79,7 +75,7 @@ def analyze(input_csv: Path, stop1: str, stop2: str, peak_ranges: list[tuple[tim
         if not eta_str:
             continue
         try:
-            eta = parse_iso_ts(eta_str)
+            eta = ts["eta"](eta_str)
         except Exception:
             continue
         try:
@@ -1,10 +1,66 @@
 #!/usr/bin/env python3
 """
 Merge all historical ETA data from multiple sources into a unified CSV for analysis.
+
+Inputs may be plain or compressed (`.csv.gz`, `.csv.zst`, `.jsonl.gz`, ...); they are
+decompressed on the fly while reading.
+
+Input files with identical content (copies of the same monitor CSV, or
+content_store views of one object) are detected by size and sha256 and only the
+first is read; the merged output is the same, since a copy's rows are all
+duplicates.
+
+Input files are read, normalized and hashed in a process pool (`--workers`,
+default one per CPU; `parallel_ingest.py`) and merged back in input order.
+Duplicates are detected with 64-bit hashes of the dedup key (`dedup_keys.py`),
+checked a file at a time against a sorted array of the hashes seen so far.
+
+With `--warehouse DB` the inputs are ingested into the SQLite ETA warehouse
+(`eta_warehouse.py` in the parent folder; files unchanged since the last run are
+skipped) and the merged CSV is exported from it, with timestamps in the
+warehouse's canonical +08:00 form.
+
+With `--external` the merge runs in bounded memory: rows are streamed into
+sorted runs of `--run-rows` rows spilled to temporary files, then k-way merged
+(at most `--fan-in` runs at a time) with duplicates dropped as they meet. Rows
+with the same snapshot_ts come out ordered by stop, route, eta_seq and eta, and
+the first occurrence of a duplicate (in input order) is kept, as in the
+in-memory merge.
 """
 from pathlib import Path
+import argparse
 import csv
+import heapq
+import os
+import shutil
 import sys
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from compressed_io import COMPRESSED_SUFFIXES, iter_records  # noqa: E402
+from content_store import distinct_files  # noqa: E402
+from dedup_keys import KeySet, key_hash  # noqa: E402
+from parallel_ingest import add_workers_arg, map_files  # noqa: E402
+import eta_warehouse  # noqa: E402
+
+MERGED_FIELDS = ['snapshot_ts', 'queried_stop_id', 'route', 'direction', 'eta', 'eta_seq', 'data_timestamp', 'source_file']
+
+# on-disk run layout: sort key (dedup key + input position), then the remaining columns
+RUN_FIELDS = ['snapshot_ts', 'queried_stop_id', 'route', 'eta_seq', 'eta', 'seq_no', 'direction', 'data_timestamp',
+              'source_file']
+
+DATA_SUFFIXES = [s + c for s in ('.csv', '.jsonl') for c in ('',) + COMPRESSED_SUFFIXES]
+
+
+def data_files(folder, name_glob='*', suffixes=DATA_SUFFIXES, recursive=False):
+    """Files in folder matching name_glob with one of the (possibly compressed) data suffixes."""
+    found = []
+    for suffix in suffixes:
+        pattern = name_glob + suffix
+        found.extend(folder.rglob(pattern) if recursive else folder.glob(pattern))
+    return sorted(set(found))
 
 def normalize_row(row, source_file):
     """Normalize different CSV formats to common schema"""
@@ -26,32 +82,27 @@ def normalize_row(row, source_file):
         return normalized
     return None
 
-def merge_csv_files(input_files, output_file):
+def load_normalized(input_file):
+    """Normalized rows of one input file and the 64-bit hashes of their dedup keys (runs in a worker process)"""
+    rows = [n for n in (normalize_row(row, str(input_file)) for row in iter_records(input_file)) if n]
+    hashes = np.fromiter(
+        (key_hash(n['snapshot_ts'], n['queried_stop_id'], n['route'], n['eta_seq'], n['eta']) for n in rows),
+        dtype=np.uint64, count=len(rows))
+    return rows, hashes
+
+def merge_csv_files(input_files, output_file, workers=None):
     """Merge multiple CSV files with normalization"""
     all_rows = []
-    seen = set()  # deduplicate by (snapshot_ts, stop_id, route, eta_seq, eta)
+    seen = KeySet()  # 64-bit hashes of (snapshot_ts, stop_id, route, eta_seq, eta)
     
-    for input_file in input_files:
-        try:
-            with open(input_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    normalized = normalize_row(row, str(input_file))
-                    if normalized:
-                        # Create dedup key
-                        key = (
-                            normalized['snapshot_ts'],
-                            normalized['queried_stop_id'],
-                            normalized['route'],
-                            normalized['eta_seq'],
-                            normalized['eta']
-                        )
-                        if key not in seen:
-                            seen.add(key)
-                            all_rows.append(normalized)
-            print(f"✓ Processed: {input_file} ({len(all_rows)} total rows so far)")
-        except Exception as e:
-            print(f"✗ Error reading {input_file}: {e}", file=sys.stderr)
+    # files are parsed in parallel but merged in input order, so the first occurrence of a row wins as before
+    for input_file, loaded, error in map_files(load_normalized, input_files, workers=workers):
+        if error:
+            print(f"✗ Error reading {input_file}: {error}", file=sys.stderr)
+            continue
+        rows, hashes = loaded
+        all_rows.extend(n for n, new in zip(rows, seen.add_many(hashes)) if new)
+        print(f"✓ Processed: {input_file} ({len(all_rows)} total rows so far)")
     
     # Sort by snapshot_ts
     all_rows.sort(key=lambda x: x['snapshot_ts'])
@@ -59,15 +110,115 @@ def merge_csv_files(input_files, output_file):
     # Write output
     output_file.parent.mkdir(parents=True, exist_ok=True)
     with open(output_file, 'w', encoding='utf-8', newline='') as f:
-        fieldnames = ['snapshot_ts', 'queried_stop_id', 'route', 'direction', 'eta', 'eta_seq', 'data_timestamp', 'source_file']
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer = csv.DictWriter(f, fieldnames=MERGED_FIELDS)
         writer.writeheader()
         writer.writerows(all_rows)
     
     print(f"\n✓ Merged {len(all_rows)} unique rows into: {output_file}")
     print(f"  Deduplicated: {len(seen)} unique records")
 
+def run_sort_key(rec):
+    """Sort key of a run record; the first five fields are the dedup key, seq_no keeps the first occurrence first"""
+    return (rec[0], rec[1], rec[2], rec[3], rec[4], int(rec[5]))
+
+def spill_run(records, tmp_dir):
+    """Sort records, drop duplicates and write them to a temporary run file; returns its path"""
+    records.sort(key=run_sort_key)
+    fd, path = tempfile.mkstemp(prefix='eta_run_', suffix='.csv', dir=tmp_dir)
+    with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerows(dedup_sorted(records))
+    return path
+
+def read_run(path):
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        yield from csv.reader(f)
+
+def dedup_sorted(records):
+    """Drop records whose dedup key equals the previous one (input must be sorted by run_sort_key)"""
+    last = None
+    for rec in records:
+        key = rec[:5]
+        if key != last:
+            last = key
+            yield rec
+
+def merge_runs(paths, tmp_dir):
+    """k-way merge of sorted runs into one new run file"""
+    fd, out = tempfile.mkstemp(prefix='eta_run_', suffix='.csv', dir=tmp_dir)
+    with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f:
+        csv.writer(f).writerows(dedup_sorted(heapq.merge(*[read_run(p) for p in paths], key=run_sort_key)))
+    for p in paths:
+        os.remove(p)
+    return out
+
+def merge_csv_files_external(input_files, output_file, run_rows=200_000, fan_in=64, tmp_dir=None):
+    """Merge like merge_csv_files, but with memory bounded by run_rows instead of the input size"""
+    tmp = tempfile.mkdtemp(prefix='eta_merge_', dir=tmp_dir)
+    runs, buf, seq_no = [], [], 0
+    try:
+        for input_file in input_files:
+            try:
+                for row in iter_records(input_file):
+                    n = normalize_row(row, str(input_file))
+                    if not n:
+                        continue
+                    buf.append([n['snapshot_ts'], n['queried_stop_id'], n['route'], str(n['eta_seq']), n['eta'],
+                                seq_no, n['direction'], n['data_timestamp'], n['source_file']])
+                    seq_no += 1
+                    if len(buf) >= run_rows:
+                        runs.append(spill_run(buf, tmp))
+                        buf = []
+                print(f"✓ Processed: {input_file} ({seq_no} rows read, {len(runs)} runs spilled)")
+            except Exception as e:
+                print(f"✗ Error reading {input_file}: {e}", file=sys.stderr)
+        if buf:
+            runs.append(spill_run(buf, tmp))
+            buf = []
+        # merge passes until one pass can take every remaining run
+        while len(runs) > fan_in:
+            runs = [merge_runs(runs[i:i + fan_in], tmp) for i in range(0, len(runs), fan_in)]
+
+        output_file.parent.mkdir(parents=True, exist_ok=True)
+        written = 0
+        with open(output_file, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(MERGED_FIELDS)
+            for rec in dedup_sorted(heapq.merge(*[read_run(p) for p in runs], key=run_sort_key)):
+                # back to MERGED_FIELDS order
+                writer.writerow([rec[0], rec[1], rec[2], rec[6], rec[4], rec[3], rec[7], rec[8]])
+                written += 1
+    finally:
+        # also removes partial runs from a spill or merge pass that failed, without masking its error
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print(f"\n✓ Merged {written} unique rows into: {output_file}")
+    print(f"  Read {seq_no} rows in {max(1, -(-seq_no // run_rows))} sorted runs")
+
+def merge_via_warehouse(input_files, output_file, db_path):
+    """Ingest input_files into the warehouse at db_path, then export every row to output_file"""
+    with eta_warehouse.connect(str(db_path)) as db:
+        counts = eta_warehouse.ingest(db, [str(f) for f in input_files], verbose=False)
+        print(f"✓ Warehouse ingest: {counts}")
+        rows = eta_warehouse.query(db, with_source=True)
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_file, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=MERGED_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"\n✓ Exported {len(rows)} unique rows from {db_path} into: {output_file}")
+
 def main():
+    ap = argparse.ArgumentParser(description='Merge all historical ETA CSVs into one file')
+    ap.add_argument('--warehouse', nargs='?', const=eta_warehouse.DEFAULT_DB, default=None,
+                    help='Ingest into this SQLite warehouse and export from it (default file if no path given)')
+    ap.add_argument('--external', action='store_true',
+                    help='Bounded-memory merge: spill sorted runs to disk and k-way merge them')
+    ap.add_argument('--run-rows', type=int, default=200_000, help='External merge: rows held in memory per sorted run')
+    ap.add_argument('--fan-in', type=int, default=64, help='External merge: runs merged at once')
+    ap.add_argument('--tmp-dir', default=None, help='External merge: where to spill runs (default: system temp)')
+    add_workers_arg(ap)
+    args = ap.parse_args()
     base = Path('/workspaces/GCAP3226AIagents')
     
     # Collect all relevant CSV files
@@ -75,33 +226,42 @@ def main():
     
     # 1. Main Newdata monitoring
     newdata = base / 'Newdata'
-    if (newdata / 'realtime_monitoring.csv').exists():
-        input_files.append(newdata / 'realtime_monitoring.csv')
+    input_files.extend(data_files(newdata, 'realtime_monitoring'))
     
     # 2. presentation/simulation
     pres_sim = base / 'presentation' / 'simulation'
-    for csv_file in pres_sim.glob('*.csv'):
+    for csv_file in data_files(pres_sim):
         if 'stop' in csv_file.name or 'eta' in csv_file.name.lower():
             input_files.append(csv_file)
     
     # 3. vibeCoding101/PartX_simulation monitor outputs
     part_sim = base / 'vibeCoding101' / 'PartX_simulation'
     for monitor_dir in part_sim.glob('monitor_outputs_*'):
-        for csv_file in monitor_dir.rglob('*.csv'):
-            if 'monitor' in csv_file.name or 'summary' in csv_file.name:
+        for csv_file in data_files(monitor_dir, recursive=True):
+            if 'monitor' in csv_file.name or 'summary' in csv_file.name or csv_file.name.startswith('eta_log_'):
                 input_files.append(csv_file)
     
     # 4. vibeCoding101 root level monitoring CSVs
-    for csv_file in part_sim.glob('*.csv'):
+    for csv_file in data_files(part_sim):
         if 'monitor' in csv_file.name or 'route_pair' in csv_file.name:
             input_files.append(csv_file)
     
-    print(f"Found {len(input_files)} CSV files to merge:")
+    # identical copies (same bytes under another name or folder, content_store views) are read only once
+    input_files, duplicates = distinct_files(input_files, workers=args.workers)
+    print(f"Found {len(input_files)} CSV files to merge ({len(duplicates)} identical copies skipped):")
     for f in input_files:
         print(f"  - {f.relative_to(base)}")
+    for f, same in duplicates:
+        print(f"  = {f.relative_to(base)} (same as {same.relative_to(base)})")
     
     output_file = base / 'Newdata' / 'all_historical_eta_merged.csv'
-    merge_csv_files(input_files, output_file)
+    if args.warehouse:
+        merge_via_warehouse(input_files, output_file, args.warehouse)
+    elif args.external:
+        merge_csv_files_external(input_files, output_file, run_rows=args.run_rows, fan_in=args.fan_in,
+                                 tmp_dir=args.tmp_dir)
+    else:
+        merge_csv_files(input_files, output_file, workers=args.workers)
 
 if __name__ == '__main__':
     main()
@@ -4,33 +4,27 @@ import argparse
 from datetime import datetime
 from pathlib import Path
 import csv
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from compressed_io import iter_records  # noqa: E402
+from eta_dataset import is_dataset, iter_rows  # noqa: E402
+from timestamps import HK_TZ, column_parsers, parse_ts  # noqa: E402
 
 
 def parse_iso_ts(s: str) -> datetime:
-    # Normalize to offset-aware (+08:00) if missing timezone
-    dt = None
-    try:
-        dt = datetime.fromisoformat(s)
-    except Exception:
-        # Fallback: strip trailing timezone then parse
-        if "+" in s:
-            s = s.split("+")[0]
-        dt = datetime.fromisoformat(s)
-    # If naive, assume Asia/Hong_Kong (+08:00) by adding offset
-    if dt.tzinfo is None:
-        # append +08:00 by re-parsing with suffix
-        try:
-            dt = datetime.fromisoformat(s + "+08:00")
-        except Exception:
-            pass
-    return dt
+    # Naive timestamps are taken as Asia/Hong_Kong (+08:00)
+    return parse_ts(s, HK_TZ)
+
 
+def load_rows(csv_path: Path, start: datetime | None = None, end: datetime | None = None):
+    """Stream rows from a CSV or JSONL input, optionally .gz/.zst-compressed, or from an eta_dataset directory.
 
-def load_rows(csv_path: Path):
-    with csv_path.open("r", encoding="utf8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            yield row
+    For a dataset only the partitions and rows within start..end are read (timestamps come back as datetimes)."""
+    if is_dataset(csv_path):
+        yield from iter_rows(str(csv_path), start=start, end=end)
+        return
+    yield from iter_records(csv_path)
 
 
 def within_window(ts: datetime, start: datetime, end: datetime) -> bool:
@@ -52,10 +46,12 @@ def summarize(input_csv: Path, out_csv: Path, out_md: Path, start_ts: str, end_t
 
     # Aggregations keyed by (stop_id, route)
     agg = {}
+    # one format-locked, memoizing parser per column (snapshot_ts repeats on every row of a snapshot)
+    ts = column_parsers(default_tz=HK_TZ)
 
-    for row in load_rows(input_csv):
+    for row in load_rows(input_csv, start, end):
         try:
-            snapshot_ts = parse_iso_ts(row.get("snapshot_ts", ""))
+            snapshot_ts = ts["snapshot_ts"](row.get("snapshot_ts", ""))
         except Exception:
             continue
         if not within_window(snapshot_ts, start, end):
@@ -72,7 +68,7 @@ def summarize(input_csv: Path, out_csv: Path, out_md: Path, start_ts: str, end_t
         if not eta_str:
             continue
         try:
-            eta = parse_iso_ts(eta_str)
+            eta = ts["eta"](eta_str)
         except Exception:
             continue
 
@@ -208,7 +204,8 @@ def summarize(input_csv: Path, out_csv: Path, out_md: Path, start_ts: str, end_t
 
 def main():
     ap = argparse.ArgumentParser(description="Generate peak hour summary from realtime_monitoring.csv")
-    ap.add_argument("--input", type=str, default="/workspaces/GCAP3226AIagents/Newdata/realtime_monitoring.csv")
+    ap.add_argument("--input", type=str, default="/workspaces/GCAP3226AIagents/Newdata/realtime_monitoring.csv",
+                    help="CSV/JSONL file (optionally .gz/.zst) or an eta_dataset directory (needs pyarrow)")
     ap.add_argument("--start", type=str, default="2025-11-24T06:30:00+08:00")
     ap.add_argument("--end", type=str, default="2025-11-24T08:30:00+08:00")
     ap.add_argument("--out-csv", type=str, default="/workspaces/GCAP3226AIagents/Newdata/peak_summary_20251124_0630_0830.csv")
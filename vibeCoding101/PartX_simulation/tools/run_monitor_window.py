@@ -18,6 +18,51 @@ python tools/run_monitor_window.py --date 2025-11-24 --start 06:30 --end 08:30 \
 
 The script will wait until the start time if invoked earlier, or run immediately if current time
 is within the window. Uses system timezone awareness via `zoneinfo` (Python 3.9+).
+
+Snapshots fire on absolute tick boundaries (see `tick_scheduler.py` in the parent folder),
+so slow fetches do not drift later samples; per-tick lateness and fetch duration are
+appended to `tick_log.csv` next to `monitor_log.csv`.
+
+HTTP mode goes through the shared transit client, so a degraded host trips its circuit
+breaker and later URLs on it are skipped immediately (status CIRCUIT_OPEN) instead of
+each waiting for a timeout; the `breaker` column of `monitor_log.csv` records the
+host's breaker state after every request.
+
+All URLs of a tick are fetched concurrently (`--concurrency`, default 8) so a snapshot
+reflects one instant: their files share the tick's timestamp, and `monitor_log.csv`
+records the common tick id plus each response's own `received_ts`.
+
+`monitor_log.csv` is written through the buffered `event_log.EventLogWriter` (parent
+folder): the file stays open for the whole window and is flushed every second or every
+64 KiB rather than reopened per row. Rows are properly CSV-quoted and carry the request's
+`latency_ms` next to its status. A log with an older header is moved aside on start.
+
+`--compress gzip` (or `zstd`, needs the `zstandard` package) stores HTTP snapshots as
+`http_{ts}_{i}.json.gz` etc.; the analysis tools in this folder read them directly.
+
+Daemon mode (`--schedule FILE`) keeps one process running and launches every recurring
+window from a JSON schedule as it comes due, in its own thread but sharing one HTTP pool
+(sized at startup for the largest `concurrency` in the schedule or on the command line):
+
+python tools/run_monitor_window.py --schedule tools/monitor_schedule.example.json --out-base .
+
+  {
+    "tz": "Asia/Hong_Kong",
+    "holidays": ["2025-12-25", "2025-12-26"],
+    "holidays_file": "hk_holidays.txt",
+    "windows": [
+      {"name": "am_peak", "days": ["mon", "tue", "wed", "thu", "fri"], "start": "06:30", "end": "08:30",
+       "interval": 30, "stop_ids": ["3F24CFF9046300D9", "B34F59A0270AEDA4"]},
+      {"name": "pm_peak", "start": "17:00", "end": "19:30", "interval": 60, "urls": ["https://..."]}
+    ]
+  }
+
+`days` defaults to weekdays; windows are skipped on listed holidays (one date per line in
+`holidays_file`) unless `"holidays": true` is set on the window. `stop_ids` are polled via the
+KMB stop-eta endpoint; `mode`, `urls`, `file_path`, `interval`, `timeout`, `late_policy` and `compress`
+default to the command-line values. Output rotates per day and window:
+`monitor_outputs_{date}/{name}/`. The schedule file is re-read whenever it changes; if the new
+version cannot be read or is invalid, the error is logged and the previous schedule stays in use.
 """
 
 from __future__ import annotations
@@ -26,11 +71,23 @@ from datetime import datetime, date, time, timedelta
 from zoneinfo import ZoneInfo
 import time as time_module
 from pathlib import Path
+import os
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import requests
 import shutil
 import json
-from typing import List
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from compressed_io import COMPRESS_CHOICES, compressed_path, open_text, write_bytes  # noqa: E402
+from event_log import EventLogWriter  # noqa: E402
+from tick_scheduler import TickScheduler  # noqa: E402
+from transit_client import CircuitOpenError, breaker_state, get_client  # noqa: E402
+
+MONITOR_LOG_FIELDS = ["snapshot_ts", "tick", "mode", "item", "filepath", "status", "notes", "breaker",
+                      "received_ts", "latency_ms"]
 
 
 def parse_hhmm(s: str) -> time:
@@ -52,20 +109,23 @@ def ensure_out_dir(base: Path, dt: date) -> Path:
     return out
 
 
-def save_response(resp: requests.Response, out_dir: Path, prefix: str, idx: int) -> Path:
+def save_response(resp: requests.Response, out_dir: Path, prefix: str, idx: int, ts: str | None = None,
+                  compress: str | None = None) -> Path:
+    """Save one response as .json/.csv/.txt; `compress` ('gzip'/'zstd') appends .gz/.zst and compresses."""
     content_type = resp.headers.get("Content-Type", "")
-    ts = datetime.now().astimezone().isoformat().replace(':', '-')
+    ts = (ts or datetime.now().astimezone().isoformat()).replace(':', '-')
     if "json" in content_type:
-        p = out_dir / f"{prefix}_{ts}_{idx}.json"
-        with p.open("w", encoding="utf8") as f:
+        p = compressed_path(out_dir / f"{prefix}_{ts}_{idx}.json", compress)
+        with open_text(p, "w", encoding="utf8") as f:
             json.dump(resp.json(), f, ensure_ascii=False, indent=2)
     elif "csv" in content_type or resp.text.startswith("stop_id"):
-        p = out_dir / f"{prefix}_{ts}_{idx}.csv"
-        p.write_text(resp.text, encoding="utf8")
+        p = compressed_path(out_dir / f"{prefix}_{ts}_{idx}.csv", compress)
+        with open_text(p, "w", encoding="utf8", newline="") as f:
+            f.write(resp.text)
     else:
         # default to raw
-        p = out_dir / f"{prefix}_{ts}_{idx}.txt"
-        p.write_bytes(resp.content)
+        p = compressed_path(out_dir / f"{prefix}_{ts}_{idx}.txt", compress)
+        write_bytes(p, resp.content)
     return p
 
 
@@ -76,6 +136,77 @@ def copy_file_snapshot(src: Path, out_dir: Path, prefix: str, idx: int) -> Path:
     return dst
 
 
+def fetch_url(client, url: str, timeout: int):
+    """GET one URL; returns (response or None, receive time ISO string, latency ms, exception or None)."""
+    t0 = time_module.perf_counter()
+    try:
+        resp = client.get(url, timeout=timeout)
+        err = None
+    except Exception as e:
+        resp, err = None, e
+    latency_ms = round((time_module.perf_counter() - t0) * 1000, 1)
+    return resp, datetime.now().astimezone().isoformat(), latency_ms, err
+
+
+def take_snapshot(mode: str, urls: List[str], file_path: str | None, out_dir: Path, log: EventLogWriter,
+                  snapshot_ts: str, idx: int, timeout: int, concurrency: int = 8,
+                  compress: str | None = None) -> List[Path]:
+    """Take one snapshot in the given mode, logging each item to the monitor log writer.
+
+    In http mode all URLs are in flight at once (up to `concurrency`); responses are
+    saved and logged in URL order once the whole tick has arrived.
+    """
+    saved_paths = []
+    if mode == "http":
+        if not urls:
+            print("No URLs provided for http mode; skipping this iteration.")
+        else:
+            client = get_client()
+            workers = max(1, min(concurrency, len(urls)))
+            if workers == 1:
+                results = [fetch_url(client, u, timeout) for u in urls]
+            else:
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    results = list(pool.map(lambda u: fetch_url(client, u, timeout), urls))
+            for i, (u, (resp, received_ts, latency_ms, err)) in enumerate(zip(urls, results)):
+                row = {"snapshot_ts": snapshot_ts, "tick": idx, "mode": "http", "item": u,
+                       "received_ts": received_ts, "latency_ms": latency_ms}
+                if err is None:
+                    try:
+                        p = save_response(resp, out_dir, prefix="http", idx=i, ts=snapshot_ts, compress=compress)
+                        saved_paths.append(p)
+                        log.write({**row, "filepath": p, "status": resp.status_code, "notes": "OK",
+                                   "breaker": breaker_state(u)})
+                        continue
+                    except Exception as e:
+                        err = e
+                status = "CIRCUIT_OPEN" if isinstance(err, CircuitOpenError) else "ERROR"
+                log.write({**row, "status": status, "notes": str(err), "breaker": breaker_state(u)})
+                print(f"{'Skipped' if status == 'CIRCUIT_OPEN' else 'Failed to GET'} {u}: {err}")
+    elif mode == "file":
+        if not file_path:
+            print("No --file-path provided for file mode; skipping.")
+        else:
+            src = Path(file_path)
+            row = {"snapshot_ts": snapshot_ts, "tick": idx, "mode": "file", "item": src}
+            if not src.exists():
+                print(f"Source file does not exist: {src}; skipping.")
+                log.write({**row, "status": "ERROR", "notes": "not_found"})
+            else:
+                t0 = time_module.perf_counter()
+                try:
+                    p = copy_file_snapshot(src, out_dir, prefix="file", idx=idx)
+                    saved_paths.append(p)
+                    log.write({**row, "filepath": p, "status": "OK", "notes": "copied",
+                               "latency_ms": round((time_module.perf_counter() - t0) * 1000, 1)})
+                except Exception as e:
+                    log.write({**row, "status": "ERROR", "notes": str(e)})
+                    print(f"Failed to copy {src}: {e}")
+    else:
+        print(f"Unknown mode: {mode}; supported: http, file")
+    return saved_paths
+
+
 def run_monitor_window(
     target_date: date,
     start_time: time,
@@ -87,8 +218,15 @@ def run_monitor_window(
     file_path: str | None,
     out_base: Path,
     timeout: int,
+    late_policy: str = "skip",
+    subdir: str | None = None,
+    stop_event: threading.Event | None = None,
+    concurrency: int = 8,
+    compress: str | None = None,
 ):
+    """Monitor one window; `subdir` nests outputs under the day folder, `stop_event` ends it early."""
     tz = ZoneInfo(tz_name)
+    sleep = stop_event.wait if stop_event is not None else time_module.sleep
     # build start/end datetimes in tz
     start_dt = datetime.combine(target_date, start_time).replace(tzinfo=tz)
     end_dt = datetime.combine(target_date, end_time).replace(tzinfo=tz)
@@ -98,9 +236,10 @@ def run_monitor_window(
         raise SystemExit("End time must be after start time")
 
     out_dir = ensure_out_dir(out_base, target_date)
-    log_file = out_dir / "monitor_log.csv"
-    if not log_file.exists():
-        log_file.write_text("snapshot_ts,mode,item,filepath,status,notes\n", encoding="utf8")
+    if subdir:
+        out_dir = out_dir / subdir
+        out_dir.mkdir(parents=True, exist_ok=True)
+    log = EventLogWriter(out_dir / "monitor_log.csv", fields=MONITOR_LOG_FIELDS)
 
     print(f"Monitoring window: {start_dt.isoformat()} -> {end_dt.isoformat()} ({tz_name})")
     # wait until start if necessary
@@ -108,80 +247,202 @@ def run_monitor_window(
         wait_secs = (start_dt - now).total_seconds()
         print(f"Current time {now.isoformat()} before start; sleeping {int(wait_secs)} seconds until start.")
         try:
-            time_module.sleep(wait_secs)
+            sleep(wait_secs)
         except KeyboardInterrupt:
             print("Interrupted while waiting for start; exiting.")
+            log.close()
             return
 
-    # run until end
-    idx = 0
-    while True:
-        now = now_tz(tz)
-        if now >= end_dt:
-            print("Reached end of window; exiting.")
-            break
-
-        snapshot_ts = now.isoformat()
-        print(f"[{snapshot_ts}] Taking snapshot (mode={mode}) idx={idx}")
-        saved_paths = []
-        if mode == "http":
-            if not urls:
-                print("No URLs provided for http mode; skipping this iteration.")
-            else:
-                for i, u in enumerate(urls):
-                    try:
-                        resp = requests.get(u, timeout=timeout)
-                        p = save_response(resp, out_dir, prefix="http", idx=i)
-                        saved_paths.append(p)
-                        log_file.write_text(f"{snapshot_ts},http,{u},{p},{resp.status_code},OK\n", encoding="utf8", append=False) if False else None
-                        # append to file
-                        with log_file.open("a", encoding="utf8") as lf:
-                            lf.write(f"{snapshot_ts},http,{u},{p},{resp.status_code},OK\n")
-                    except Exception as e:
-                        with log_file.open("a", encoding="utf8") as lf:
-                            lf.write(f"{snapshot_ts},http,{u},,ERROR,{str(e)}\n")
-                        print(f"Failed to GET {u}: {e}")
-        elif mode == "file":
-            if not file_path:
-                print("No --file-path provided for file mode; skipping.")
-            else:
-                src = Path(file_path)
-                if not src.exists():
-                    print(f"Source file does not exist: {src}; skipping.")
-                    with log_file.open("a", encoding="utf8") as lf:
-                        lf.write(f"{snapshot_ts},file,{src},,ERROR,not_found\n")
-                else:
-                    try:
-                        p = copy_file_snapshot(src, out_dir, prefix="file", idx=idx)
-                        saved_paths.append(p)
-                        with log_file.open("a", encoding="utf8") as lf:
-                            lf.write(f"{snapshot_ts},file,{src},{p},OK,copied\n")
-                    except Exception as e:
-                        with log_file.open("a", encoding="utf8") as lf:
-                            lf.write(f"{snapshot_ts},file,{src},,ERROR,{str(e)}\n")
-                        print(f"Failed to copy {src}: {e}")
-        else:
-            print(f"Unknown mode: {mode}; supported: http, file")
-
-        idx += 1
-        # compute sleep until next interval but ensure we don't overshoot end_dt
-        now = now_tz(tz)
-        next_time = now + timedelta(seconds=interval)
-        if next_time > end_dt:
-            # sleep only until end
-            sleep_secs = max(0, (end_dt - now).total_seconds())
-        else:
-            sleep_secs = interval
-        if sleep_secs > 0:
-            try:
-                time_module.sleep(sleep_secs)
-            except KeyboardInterrupt:
-                print("Interrupted by user; exiting.")
+    # run until end on a drift-free tick grid
+    remaining = (end_dt - now_tz(tz)).total_seconds()
+    if remaining <= 0:
+        print("Reached end of window; exiting.")
+        log.close()
+        return
+    scheduler = TickScheduler(interval, duration_sec=remaining, late_policy=late_policy, sleep=sleep)
+    try:
+        for tick in scheduler.ticks():
+            if stop_event is not None and stop_event.is_set():
+                print("Stop requested; ending window.")
                 break
+            idx = tick["tick"]
+            snapshot_ts = now_tz(tz).isoformat()
+            print(f"[{snapshot_ts}] Taking snapshot (mode={mode}) idx={idx} late={tick['lateness_s']}s")
+            take_snapshot(mode, urls, file_path, out_dir, log, snapshot_ts, idx, timeout, concurrency, compress)
+            if mode == "http":
+                tick["breaker"] = ";".join(sorted({breaker_state(u) for u in urls}))
+    except KeyboardInterrupt:
+        print("Interrupted by user; exiting.")
+    finally:
+        log.close()
+        scheduler.write_log(str(out_dir / "tick_log.csv"))
+        print(f"Tick summary: {scheduler.summary()}")
+        if mode == "http":
+            print(f"HTTP client stats: {get_client().stats()}")
 
     print(f"Monitoring completed. Outputs in: {out_dir}")
 
 
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+
+# expected JSON types of the optional schedule/window fields
+SCHEDULE_FIELD_TYPES = {"tz": str, "holidays": list, "holidays_file": str, "windows": list}
+WINDOW_FIELD_TYPES = {"name": str, "days": list, "start": str, "end": str, "mode": str, "urls": list,
+                      "stop_ids": list, "file_path": str, "interval": int, "timeout": int, "late_policy": str,
+                      "concurrency": int, "compress": str}
+
+
+def check_types(obj, types: Dict[str, type], where: str):
+    """Raise ValueError unless obj is a JSON object whose fields (when present) have the expected types."""
+    if not isinstance(obj, dict):
+        raise ValueError(f"{where}: expected an object, got {type(obj).__name__}")
+    for key, typ in types.items():
+        value = obj.get(key)
+        if value is None:
+            continue
+        if not isinstance(value, typ) or (typ is int and isinstance(value, bool)):
+            raise ValueError(f"{where}: {key} must be {typ.__name__}, got {type(value).__name__}")
+        if typ is list and key != "windows" and not all(isinstance(v, str) for v in value):
+            raise ValueError(f"{where}: {key} must be a list of strings")
+
+
+def load_schedule(path: Path) -> Dict:
+    """Read a daemon schedule (see module docstring), resolving holidays into a set of dates."""
+    with path.open("r", encoding="utf8") as f:
+        schedule = json.load(f)
+    check_types(schedule, SCHEDULE_FIELD_TYPES, str(path))
+    for i, w in enumerate(schedule.get("windows", [])):
+        check_types(w, WINDOW_FIELD_TYPES, f"{path} window {i + 1}")
+        if not isinstance(w.get("holidays", False), bool):
+            raise ValueError(f"{path} window {i + 1}: holidays must be true or false")
+    holidays = set()
+    for d in schedule.get("holidays", []):
+        holidays.add(date.fromisoformat(d))
+    if schedule.get("holidays_file"):
+        hf = (path.parent / schedule["holidays_file"]).resolve()
+        for line in hf.read_text(encoding="utf8").splitlines():
+            line = line.split("#", 1)[0].strip()
+            if line:
+                holidays.add(date.fromisoformat(line))
+    schedule["holidays"] = holidays
+    for i, w in enumerate(schedule.get("windows", [])):
+        w.setdefault("name", f"window{i + 1}")
+        w["days"] = [d.lower()[:3] for d in w.get("days", WEEKDAYS[:5])]
+        w["start"] = parse_hhmm(w["start"])
+        w["end"] = parse_hhmm(w["end"])
+        if w["end"] <= w["start"]:
+            raise ValueError(f"Window {w['name']}: end must be after start (windows cannot cross midnight)")
+    return schedule
+
+
+def window_runs_on(window: Dict, day: date, holidays) -> bool:
+    if WEEKDAYS[day.weekday()] not in window["days"]:
+        return False
+    return window.get("holidays") is True or day not in holidays
+
+
+def next_window_start(window: Dict, now: datetime, holidays, horizon_days: int = 14) -> datetime | None:
+    """Start of the window's current or next occurrence (None if none within horizon_days)."""
+    for offset in range(horizon_days + 1):
+        day = now.date() + timedelta(days=offset)
+        if not window_runs_on(window, day, holidays):
+            continue
+        start = datetime.combine(day, window["start"]).replace(tzinfo=now.tzinfo)
+        end = datetime.combine(day, window["end"]).replace(tzinfo=now.tzinfo)
+        if end > now:
+            return start
+    return None
+
+
+def pool_size(concurrencies: List[int]) -> int:
+    """Connections to keep per host so the widest tick's parallel requests all reuse one."""
+    return max([10] + list(concurrencies))
+
+
+def window_urls(window: Dict, default_urls: List[str]) -> List[str]:
+    urls = list(window.get("urls") or [])
+    if window.get("stop_ids"):
+        client = get_client()
+        urls += [client.endpoint_url("stop-eta", sid) for sid in window["stop_ids"]]
+    return urls or list(default_urls)
+
+
+def run_daemon(schedule_path: Path, defaults: argparse.Namespace, lead_sec: float = 5.0, max_sleep_sec: float = 60.0):
+    """Launch every scheduled window occurrence in its own thread until interrupted."""
+    schedule, mtime = None, None
+    launched: Dict[tuple, threading.Thread] = {}
+    stop_event = threading.Event()
+    print(f"Daemon started with schedule {schedule_path}")
+    try:
+        while True:
+            try:
+                current = os.path.getmtime(schedule_path)
+                if current != mtime:
+                    mtime = current
+                    loaded = load_schedule(schedule_path)
+                    if schedule is None:
+                        # the shared pool is sized once, for the largest concurrency in the first schedule
+                        get_client(pool_size=pool_size(
+                            [defaults.concurrency] + [w.get("concurrency", 0) for w in loaded.get("windows", [])]))
+                    schedule = loaded
+                    print(f"Loaded {len(schedule.get('windows', []))} windows from {schedule_path}")
+            except (OSError, ValueError, TypeError, KeyError, argparse.ArgumentTypeError) as e:
+                # a bad edit must not stop the windows already scheduled; it is retried once the file changes again
+                if schedule is None:
+                    raise SystemExit(f"Cannot load schedule {schedule_path}: {e}")
+                print(f"Cannot reload schedule {schedule_path}: {e}; keeping the previous schedule.")
+            tz_name = schedule.get("tz", defaults.tz)
+            now = now_tz(ZoneInfo(tz_name))
+            wait = max_sleep_sec
+            for w in schedule.get("windows", []):
+                start = next_window_start(w, now, schedule["holidays"])
+                if start is None:
+                    continue
+                key = (w["name"], start.date())
+                if key in launched:
+                    continue
+                until = (start - now).total_seconds() - lead_sec
+                if until > 0:
+                    wait = min(wait, until)
+                    continue
+                mode = w.get("mode") or ("http" if (w.get("urls") or w.get("stop_ids")) else defaults.mode)
+                t = threading.Thread(
+                    target=run_monitor_window,
+                    name=f"{w['name']}_{start.date()}",
+                    kwargs=dict(
+                        target_date=start.date(),
+                        start_time=w["start"],
+                        end_time=w["end"],
+                        tz_name=tz_name,
+                        interval=w.get("interval", defaults.interval),
+                        mode=mode,
+                        urls=window_urls(w, defaults.url or []),
+                        file_path=w.get("file_path", defaults.file_path),
+                        out_base=Path(defaults.out_base),
+                        timeout=w.get("timeout", defaults.timeout),
+                        late_policy=w.get("late_policy", defaults.late_policy),
+                        subdir=w["name"],
+                        stop_event=stop_event,
+                        concurrency=w.get("concurrency", defaults.concurrency),
+                        compress=w.get("compress", defaults.compress),
+                    ),
+                    daemon=True,
+                )
+                print(f"Launching window {w['name']} for {start.date()} ({w['start']:%H:%M}-{w['end']:%H:%M}, mode={mode})")
+                t.start()
+                launched[key] = t
+            # forget occurrences from earlier days once they have finished
+            for key in [k for k, t in launched.items() if k[1] < now.date() and not t.is_alive()]:
+                del launched[key]
+            stop_event.wait(max(1.0, wait))
+    except KeyboardInterrupt:
+        print("Daemon interrupted; stopping running windows.")
+        stop_event.set()
+        for t in launched.values():
+            t.join(timeout=max_sleep_sec)
+
+
 def main(argv=None):
     p = argparse.ArgumentParser(description="Run monitoring between start/end time in local TZ and save snapshots.")
     p.add_argument("--date", type=str, default=None, help="Target date YYYY-MM-DD (default: tomorrow)")
@@ -194,9 +455,23 @@ def main(argv=None):
     p.add_argument("--file-path", type=str, help="Local file to copy for file-mode snapshots (used for testing)")
     p.add_argument("--out-base", type=str, default=".", help="Base folder to write monitor_outputs_{date}")
     p.add_argument("--timeout", type=int, default=30, help="HTTP timeout in seconds")
+    p.add_argument("--late-policy", choices=("skip", "coalesce"), default="skip",
+                   help="Ticks overrun by a slow snapshot: skip them or fire one catch-up tick")
+    p.add_argument("--concurrency", type=int, default=8, help="HTTP mode: URLs fetched in parallel per tick (1 = serial)")
+    p.add_argument("--compress", choices=COMPRESS_CHOICES, default="none",
+                   help="HTTP mode: store snapshots gzip- (.gz) or zstd-compressed (.zst, needs zstandard)")
+    p.add_argument("--schedule", type=str, default=None,
+                   help="Daemon mode: run the recurring windows in this JSON schedule until interrupted")
 
     args = p.parse_args(argv)
 
+    if args.schedule:
+        run_daemon(Path(args.schedule), args)
+        return
+
+    if args.mode == "http":
+        get_client(pool_size=pool_size([args.concurrency]))
+
     if args.date is None:
         # default to tomorrow in local tz
         tz = ZoneInfo(args.tz)
@@ -218,6 +493,9 @@ def main(argv=None):
         file_path=args.file_path,
         out_base=out_base,
         timeout=args.timeout,
+        late_policy=args.late_policy,
+        concurrency=args.concurrency,
+        compress=args.compress,
     )
 
 
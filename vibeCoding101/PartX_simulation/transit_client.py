@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+transit_client.py
+
+One pooled HTTP client for the KMB / Citybus open-data endpoints, shared by
+every script that used to carry its own `fetch_stop_eta` / `fetch_stop_by_id`
+(`sim_kmb_stops.py`, `monitor_two_stations.py`, `fetch_route_pair_eta.py`,
+`use_notebook_data.py`, `tools/run_monitor_window.py`).
+
+ - a persistent `requests.Session` with a keep-alive pool, so repeated calls
+   reuse the same TCP+TLS connection instead of a new handshake per request
+ - per-endpoint timeouts (the full stop list is large, stop-eta is small)
+ - retry with jittered exponential backoff on connection errors, timeouts,
+   HTTP 429 and 5xx
+ - `normalize_eta_row` mapping raw ETA rows onto one column schema
+ - `stats()` reporting requests sent vs connections opened, so reuse is measurable
+ - a per-host token bucket (`rate_per_sec`, `burst`) and circuit breaker shared
+   by every client in the process: after `breaker_threshold` consecutive
+   failures (connection errors, timeouts, 429/5xx) calls to that host fail
+   immediately with `CircuitOpenError` for `breaker_reset_sec`, then a single
+   half-open probe decides whether to close it again. Hosts use the DEFAULT_*
+   settings unless `configure_host` is called once at startup, before the
+   first request to that host; reconfiguring a host with other values raises
+   ValueError
+
+Usage:
+    from transit_client import get_client, normalize_eta_row
+    configure_host('data.etabus.gov.hk', rate_per_sec=5)   # optional, once at startup
+    client = get_client('kmb')
+    rows = [normalize_eta_row(r, sid) for r in client.stop_eta(sid)]
+    print(client.stats())
+"""
+from __future__ import annotations
+import random
+import threading
+import time
+from typing import Any, Dict, List
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+BASES = {
+    'kmb': 'https://data.etabus.gov.hk',
+    'citybus': 'https://rt.data.gov.hk'
+}
+
+PATH_PREFIXES = {
+    'kmb': '/v1/transport/kmb',
+    'citybus': '/v1/transport/citybus-nwfb',
+}
+
+# seconds, keyed by endpoint name (first path segment after the provider prefix)
+DEFAULT_TIMEOUTS = {
+    'stop': 20,
+    'route': 20,
+    'route-stop': 20,
+    'stop-eta': 10,
+    'route-eta': 10,
+    'eta': 10,
+    'url': 30,
+}
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+DEFAULT_RATE_PER_SEC = 20.0
+DEFAULT_BREAKER_THRESHOLD = 5
+DEFAULT_BREAKER_RESET_SEC = 30.0
+
+# Normalized ETA row schema shared by all writers
+ETA_ROW_FIELDS = ['queried_stop_id', 'route', 'direction', 'service_type', 'eta_seq', 'eta', 'data_timestamp']
+
+
+def normalize_eta_row(row: Dict[str, Any], queried_stop_id: str | None = None) -> Dict[str, Any]:
+    """Map one raw stop-eta / route-eta row onto ETA_ROW_FIELDS."""
+    return {
+        'queried_stop_id': queried_stop_id or row.get('stop') or row.get('stop_id'),
+        'route': row.get('route'),
+        'direction': row.get('dir') or row.get('direction') or row.get('bound'),
+        'service_type': row.get('service_type'),
+        'eta_seq': row.get('eta_seq'),
+        'eta': row.get('eta'),
+        'data_timestamp': row.get('data_timestamp'),
+    }
+
+
+class CircuitOpenError(requests.RequestException):
+    """Raised without touching the network while a host's circuit breaker is open."""
+
+
+class TokenBucket:
+    def __init__(self, rate_per_sec: float, burst: float | None = None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = float(rate_per_sec)
+        self.capacity = float(burst if burst is not None else max(1.0, rate_per_sec))
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Take one token, sleeping until it is available; returns the time waited."""
+        with self._lock:
+            now = self.clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self._last) * self.rate)
+            self._last = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait > 0:
+            self.sleep(wait)
+        return wait
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold: int = DEFAULT_BREAKER_THRESHOLD,
+                 reset_timeout: float = DEFAULT_BREAKER_RESET_SEC, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a call may go out now; an expired open breaker lets exactly one probe through."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and self.clock() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = self.clock()
+
+
+_host_guards: Dict[str, tuple] = {}
+_host_guard_opts: Dict[str, Dict[str, Any]] = {}
+_host_guards_lock = threading.Lock()
+
+
+def configure_host(host: str, rate_per_sec: float | None = DEFAULT_RATE_PER_SEC, burst: float | None = None,
+                   breaker_threshold: int = DEFAULT_BREAKER_THRESHOLD,
+                   breaker_reset_sec: float = DEFAULT_BREAKER_RESET_SEC) -> tuple:
+    """Set up the process-wide (TokenBucket or None, CircuitBreaker) for host (rate_per_sec=None: unlimited).
+
+    Call once at startup, before any request to host. Calling again with the same settings returns the
+    existing guard; other settings raise ValueError, since clients may already share the old ones."""
+    opts = {'rate_per_sec': rate_per_sec, 'burst': burst,
+            'breaker_threshold': breaker_threshold, 'breaker_reset_sec': breaker_reset_sec}
+    with _host_guards_lock:
+        guard = _host_guards.get(host)
+        if guard is None:
+            limiter = TokenBucket(rate_per_sec, burst) if rate_per_sec else None
+            guard = (limiter, CircuitBreaker(breaker_threshold, breaker_reset_sec))
+            _host_guards[host] = guard
+            _host_guard_opts[host] = opts
+        elif opts != _host_guard_opts[host]:
+            current = _host_guard_opts[host]
+            diff = ', '.join(f'{k}={opts[k]} (in use: {current[k]})' for k in opts if opts[k] != current[k])
+            raise ValueError(f'rate limit/breaker for {host} already set up; cannot change {diff}')
+        return guard
+
+
+def host_guard(host: str) -> tuple:
+    """Return the (TokenBucket or None, CircuitBreaker) for host, set up with the defaults if not configured."""
+    guard = _host_guards.get(host)
+    return guard if guard is not None else configure_host(host)
+
+
+def breaker_state(url_or_host: str) -> str:
+    """Breaker state ('closed', 'open', 'half_open') for a URL's host; 'closed' if never used."""
+    host = urlparse(url_or_host).netloc or url_or_host
+    guard = _host_guards.get(host)
+    return guard[1].state if guard else CircuitBreaker.CLOSED
+
+
+class TransitClient:
+    def __init__(self, provider: str = 'kmb', base_url: str | None = None, pool_size: int = 10,
+                 timeouts: Dict[str, float] | None = None, retries: int = 3,
+                 backoff_base: float = 0.5, backoff_cap: float = 8.0):
+        if provider not in PATH_PREFIXES:
+            raise ValueError(f'Unknown provider: {provider}')
+        self.provider = provider
+        self.base_url = (base_url or BASES[provider]).rstrip('/')
+        self.timeouts = dict(DEFAULT_TIMEOUTS, **(timeouts or {}))
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._lock = threading.Lock()
+        self._counts = {'requests': 0, 'retries': 0, 'errors': 0, 'rejected': 0, 'throttled': 0}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def _count(self, key: str):
+        with self._lock:
+            self._counts[key] += 1
+
+    def _backoff(self, attempt: int) -> float:
+        # "full jitter": uniform in [0, min(cap, base * 2^attempt)]
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+
+    def endpoint_url(self, endpoint: str, *parts: str) -> str:
+        path = '/'.join([PATH_PREFIXES[self.provider], endpoint] + [str(p) for p in parts])
+        return self.base_url + path
+
+    def get(self, url: str, endpoint: str = 'url', timeout: float | None = None,
+            headers: Dict[str, str] | None = None) -> requests.Response:
+        """GET with retry; returns the final response (raises on the last connection error).
+
+        Raises CircuitOpenError immediately while the host's breaker is open.
+        """
+        timeout = timeout if timeout is not None else self.timeouts.get(endpoint, self.timeouts['url'])
+        host = urlparse(url).netloc
+        limiter, breaker = host_guard(host)
+        attempt = 0
+        while True:
+            if not breaker.allow():
+                self._count('rejected')
+                raise CircuitOpenError(f'circuit open for {host}')
+            if limiter is not None and limiter.acquire() > 0:
+                self._count('throttled')
+            self._count('requests')
+            try:
+                resp = self.session.get(url, timeout=timeout, headers=headers)
+            except (requests.ConnectionError, requests.Timeout):
+                breaker.record_failure()
+                if attempt >= self.retries:
+                    self._count('errors')
+                    raise
+            except Exception:
+                breaker.record_failure()
+                self._count('errors')
+                raise
+            else:
+                if resp.status_code in RETRY_STATUSES:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                if resp.status_code not in RETRY_STATUSES or attempt >= self.retries:
+                    if resp.status_code >= 400:
+                        self._count('errors')
+                    return resp
+            self._count('retries')
+            time.sleep(self._backoff(attempt))
+            attempt += 1
+
+    def get_json(self, endpoint: str, *parts: str) -> Dict[str, Any]:
+        """GET an API endpoint (e.g. 'stop-eta', stop_id) and return the decoded JSON body."""
+        resp = self.get(self.endpoint_url(endpoint, *parts), endpoint=endpoint)
+        resp.raise_for_status()
+        return resp.json()
+
+    def stop_list(self) -> List[Dict[str, Any]]:
+        return self.get_json('stop').get('data', [])
+
+    def stop(self, stop_id: str) -> Dict[str, Any]:
+        return self.get_json('stop', stop_id).get('data')
+
+    def stop_eta(self, stop_id: str) -> List[Dict[str, Any]]:
+        return self.get_json('stop-eta', stop_id).get('data', [])
+
+    def breaker_state(self) -> str:
+        """Circuit breaker state of this client's API host."""
+        return breaker_state(self.base_url)
+
+    def stats(self) -> Dict[str, Any]:
+        """Request/retry/error/rejected counts, connections opened and the breaker state."""
+        opened = 0
+        adapters = {id(a): a for a in self.session.adapters.values()}.values()
+        for adapter in adapters:
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools[key]
+                opened += getattr(pool, 'num_connections', 0)
+        with self._lock:
+            out = dict(self._counts)
+        out['connections_opened'] = opened
+        out['breaker'] = self.breaker_state()
+        return out
+
+
+_clients: Dict[tuple, TransitClient] = {}
+_client_opts: Dict[tuple, Dict[str, Any]] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(provider: str = 'kmb', base_url: str | None = None, **kwargs) -> TransitClient:
+    """Return the process-wide client for (provider, base_url), creating it on first use.
+
+    kwargs (pool_size, timeouts, ...) only apply when the client is created, so pass them from the first
+    call at startup; later calls without kwargs get the existing client, and with different ones raise
+    ValueError."""
+    key = (provider, base_url)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = TransitClient(provider, base_url=base_url, **kwargs)
+            _clients[key] = client
+            _client_opts[key] = kwargs
+        elif kwargs and kwargs != _client_opts[key]:
+            raise ValueError(f'{provider} client already created with {_client_opts[key] or "defaults"}; '
+                             f'cannot apply {kwargs}')
+        return client
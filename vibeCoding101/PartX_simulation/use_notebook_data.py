@@ -13,14 +13,13 @@ import os
 import sys
 import pandas as pd
 
+from transit_client import get_client, normalize_eta_row
+
 
 def get_kmb_data(stop_id):
-    url = f"https://data.etabus.gov.hk/v1/transport/kmb/stop-eta/{stop_id}"
     try:
         print(f"Fetching data for stop ID: {stop_id}")
-        r = requests.get(url, timeout=10)
-        r.raise_for_status()
-        return r.json()
+        return get_client('kmb').get_json('stop-eta', stop_id)
     except requests.RequestException as e:
         print(f"Request error for {stop_id}: {e}")
         return None
@@ -36,13 +35,14 @@ def process_data(data, stop_id):
     routes = data['data']
     out = []
     for route in routes:
+        row = normalize_eta_row(route, stop_id)
         out.append({
             'stop_id': stop_id,
-            'route': route.get('route'),
-            'direction': route.get('dir'),
-            'eta': route.get('eta'),
-            'eta_seq': route.get('eta_seq'),
-            'data_timestamp': route.get('data_timestamp')
+            'route': row['route'],
+            'direction': row['direction'],
+            'eta': row['eta'],
+            'eta_seq': row['eta_seq'],
+            'data_timestamp': row['data_timestamp']
         })
     return out
 